@@ -18,54 +18,70 @@ import json
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
+from synthetic_data import synthetic_covid_data, SAMPLE_COUNTRIES
+from byte_cache import ByteCache
+from covid_choropleth import COVIDChoroplethMap
+from data_sources import DataSourceError
 
 app = Flask(__name__)
 
+# Rendered chart images (base64 PNG) kept across requests
+RENDER_CACHE_BYTES = 32 * 1024 * 1024
+
 # Global data cache
 covid_data = None
+covid_data_fingerprint = (None, None)  # (covid_data, its fingerprint)
+render_cache = ByteCache(RENDER_CACHE_BYTES)
+data_loader = None  # COVIDChoroplethMap that /api/reload refreshes from JHU
 
 def get_covid_data():
     """Get COVID-19 data - use sample data for speed"""
     global covid_data
     if covid_data is None:
-        # Generate sample data for demonstration
-        countries = [
-            'United States of America', 'China', 'India', 'Brazil', 'Russia',
-            'United Kingdom', 'France', 'Germany', 'Italy', 'Spain',
-            'Canada', 'Australia', 'Japan', 'South Korea', 'Mexico',
-            'Argentina', 'Chile', 'Colombia', 'Peru', 'South Africa'
-        ]
-        
-        covid_data = {}
-        for country in countries:
-            cases = np.random.randint(100000, 10000000)
-            deaths = int(cases * np.random.uniform(0.01, 0.05))
-            recovered = int(cases * np.random.uniform(0.7, 0.9))
-            active = cases - deaths - recovered
-            
-            covid_data[country] = {
-                'cases': cases,
-                'deaths': deaths,
-                'recovered': recovered,
-                'active': max(0, active)
-            }
+        # Generate reproducible sample data for demonstration
+        covid_data = synthetic_covid_data(SAMPLE_COUNTRIES[:20])
     
     return covid_data
 
+def reload_covid_data():
+    """Refresh the dataset from JHU and drop every chart rendered from the previous one
+
+    The first reload parses the full JHU history; later ones only parse the
+    dates added since the previous reload. If JHU is unavailable the current
+    data is kept.
+    """
+    global covid_data, data_loader
+    if data_loader is None:
+        data_loader = COVIDChoroplethMap()
+    try:
+        covid_data = data_loader.refresh()
+    except DataSourceError as e:
+        print(f"Reload failed, keeping the current data: {e}")
+        return get_covid_data()
+    render_cache.clear()
+    return covid_data
+
+def data_version():
+    """Fingerprint of the current dataset, recomputed only when covid_data is replaced
+
+    Rendered charts are cached per version. Changes made to covid_data in
+    place are not detected: assign new data or reload instead.
+    """
+    global covid_data_fingerprint
+    data = get_covid_data()
+    cached, version = covid_data_fingerprint
+    if cached is not data:
+        version = data.fingerprint()
+        covid_data_fingerprint = (data, version)
+    return version
+
 def create_simple_chart(data_type, color_scheme, figsize=(12, 6)):
     """Create a simple bar chart for web deployment"""
     try:
         data = get_covid_data()
         
-        # Get data for top countries
-        country_data = []
-        for country, country_info in data.items():
-            if data_type in country_info and country_info[data_type] > 0:
-                country_data.append((country, country_info[data_type]))
-        
-        # Sort by value and take top 15 countries
-        country_data.sort(key=lambda x: x[1], reverse=True)
-        top_countries = country_data[:15]
+        # Top 15 countries with a positive value
+        top_countries = [(country, value) for country, value in data.top(data_type, 15) if value > 0]
         
         if not top_countries:
             fig, ax = plt.subplots(figsize=figsize)
@@ -131,6 +147,90 @@ def fig_to_base64(fig):
     plt.close(fig)  # Close figure to free memory
     return image_base64
 
+def create_multiple_views_chart():
+    """Create the 2x2 dashboard of top countries per data type"""
+    data_types = ['cases', 'deaths', 'recovered', 'active']
+    color_schemes = ['Reds', 'Blues', 'Greens', 'Oranges']
+    
+    fig, axes = plt.subplots(2, 2, figsize=(16, 10))
+    axes = axes.flatten()
+    
+    for i, (data_type, color_scheme) in enumerate(zip(data_types, color_schemes)):
+        ax = axes[i]
+        
+        # Get data for this type
+        data = get_covid_data()
+        top_countries = [(country, value) for country, value in data.top(data_type, 10) if value > 0]
+        
+        if top_countries:
+            countries = [country[:10] + '...' if len(country) > 10 else country for country, _ in top_countries]
+            values = [value for _, value in top_countries]
+            
+            cmap = getattr(plt.cm, color_scheme)
+            colors = cmap(np.linspace(0.3, 1.0, len(countries)))
+            
+            ax.bar(range(len(countries)), values, color=colors)
+            ax.set_title(f'{data_type.replace("_", " ").title()}', fontsize=12, fontweight='bold')
+            ax.set_xticks(range(len(countries)))
+            ax.set_xticklabels(countries, rotation=45, ha='right', fontsize=8)
+            
+            if max(values) > 1000000:
+                ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
+            elif max(values) > 1000:
+                ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e3:.1f}K'))
+        else:
+            ax.text(0.5, 0.5, f'No data for {data_type}', ha='center', va='center', transform=ax.transAxes)
+            ax.set_title(f'{data_type.replace("_", " ").title()}', fontsize=12, fontweight='bold')
+    
+    plt.suptitle('COVID-19 Multiple Views Dashboard', fontsize=16, fontweight='bold')
+    plt.tight_layout()
+    return fig
+
+def create_time_series_chart():
+    """Create the bar chart of the top 10 countries by cases"""
+    data = get_covid_data()
+    
+    # Top 10 countries by cases
+    top_countries = data.top('cases', 10)
+    
+    countries = [country[:15] + '...' if len(country) > 15 else country for country, _ in top_countries]
+    values = [value for _, value in top_countries]
+    
+    fig, ax = plt.subplots(figsize=(14, 8))
+    
+    bars = ax.bar(range(len(countries)), values, color=plt.cm.viridis(np.linspace(0, 1, len(countries))))
+    
+    ax.set_title('COVID-19 Cases by Country', fontsize=16, fontweight='bold')
+    ax.set_xlabel('Country', fontsize=12)
+    ax.set_ylabel('Total Cases', fontsize=12)
+    ax.set_xticks(range(len(countries)))
+    ax.set_xticklabels(countries, rotation=45, ha='right')
+    
+    # Format y-axis
+    if max(values) > 1000000:
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
+    elif max(values) > 1000:
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e3:.1f}K'))
+    
+    plt.tight_layout()
+    return fig
+
+def cached_image(endpoint, params, create_figure):
+    """Return the base64 PNG of an endpoint and its parameters, rendering it with create_figure() on a miss
+
+    Images are kept in an LRU cache under RENDER_CACHE_BYTES, keyed by
+    (endpoint, parameters, data version), so repeated dashboard loads skip
+    drawing and encoding until the dataset changes.
+    """
+    key = (endpoint, params, data_version())
+    image_base64 = render_cache.get(key)
+    if image_base64 is None:
+        # Charts of an earlier dataset can no longer be requested
+        render_cache.discard(lambda cached: cached[2] != key[2])
+        image_base64 = fig_to_base64(create_figure())
+        render_cache.put(key, image_base64)
+    return image_base64
+
 @app.route('/')
 def index():
     """Main dashboard page"""
@@ -141,15 +241,13 @@ def get_statistics():
     """Get global COVID-19 statistics"""
     data = get_covid_data()
     
-    total_cases = sum(country_data.get('cases', 0) for country_data in data.values())
-    total_deaths = sum(country_data.get('deaths', 0) for country_data in data.values())
-    total_recovered = sum(country_data.get('recovered', 0) for country_data in data.values())
-    total_active = sum(country_data.get('active', 0) for country_data in data.values())
+    total_cases = data.total('cases')
+    total_deaths = data.total('deaths')
+    total_recovered = data.total('recovered')
+    total_active = data.total('active')
     
     # Top 10 countries by cases
-    country_cases = [(country, country_data['cases']) for country, country_data in data.items()]
-    country_cases.sort(key=lambda x: x[1], reverse=True)
-    top_countries = country_cases[:10]
+    top_countries = data.top('cases', 10)
     
     stats = {
         'total_cases': total_cases,
@@ -181,8 +279,8 @@ def get_map(data_type):
         }
         
         # Create a simple bar chart
-        fig, ax = create_simple_chart(data_type, color_schemes[data_type])
-        image_base64 = fig_to_base64(fig)
+        image_base64 = cached_image('map', (data_type,),
+                                    lambda: create_simple_chart(data_type, color_schemes[data_type])[0])
         
         return jsonify({'image': image_base64})
     except Exception as e:
@@ -192,49 +290,7 @@ def get_map(data_type):
 def get_multiple_views():
     """Generate multiple views dashboard"""
     try:
-        data_types = ['cases', 'deaths', 'recovered', 'active']
-        color_schemes = ['Reds', 'Blues', 'Greens', 'Oranges']
-        
-        fig, axes = plt.subplots(2, 2, figsize=(16, 10))
-        axes = axes.flatten()
-        
-        for i, (data_type, color_scheme) in enumerate(zip(data_types, color_schemes)):
-            ax = axes[i]
-            
-            # Get data for this type
-            data = get_covid_data()
-            country_data = []
-            for country, country_info in data.items():
-                if data_type in country_info and country_info[data_type] > 0:
-                    country_data.append((country, country_info[data_type]))
-            
-            country_data.sort(key=lambda x: x[1], reverse=True)
-            top_countries = country_data[:10]
-            
-            if top_countries:
-                countries = [country[:10] + '...' if len(country) > 10 else country for country, _ in top_countries]
-                values = [value for _, value in top_countries]
-                
-                cmap = getattr(plt.cm, color_scheme)
-                colors = cmap(np.linspace(0.3, 1.0, len(countries)))
-                
-                ax.bar(range(len(countries)), values, color=colors)
-                ax.set_title(f'{data_type.replace("_", " ").title()}', fontsize=12, fontweight='bold')
-                ax.set_xticks(range(len(countries)))
-                ax.set_xticklabels(countries, rotation=45, ha='right', fontsize=8)
-                
-                if max(values) > 1000000:
-                    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
-                elif max(values) > 1000:
-                    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e3:.1f}K'))
-            else:
-                ax.text(0.5, 0.5, f'No data for {data_type}', ha='center', va='center', transform=ax.transAxes)
-                ax.set_title(f'{data_type.replace("_", " ").title()}', fontsize=12, fontweight='bold')
-        
-        plt.suptitle('COVID-19 Multiple Views Dashboard', fontsize=16, fontweight='bold')
-        plt.tight_layout()
-        
-        image_base64 = fig_to_base64(fig)
+        image_base64 = cached_image('multiple_views', (), create_multiple_views_chart)
         return jsonify({'image': image_base64})
         
     except Exception as e:
@@ -244,40 +300,24 @@ def get_multiple_views():
 def get_time_series():
     """Generate time series plot"""
     try:
-        data = get_covid_data()
-        
-        # Top 10 countries by cases
-        country_cases = [(country, country_data['cases']) for country, country_data in data.items()]
-        country_cases.sort(key=lambda x: x[1], reverse=True)
-        top_countries = country_cases[:10]
-        
-        countries = [country[:15] + '...' if len(country) > 15 else country for country, _ in top_countries]
-        values = [value for _, value in top_countries]
-        
-        fig, ax = plt.subplots(figsize=(14, 8))
-        
-        bars = ax.bar(range(len(countries)), values, color=plt.cm.viridis(np.linspace(0, 1, len(countries))))
-        
-        ax.set_title('COVID-19 Cases by Country', fontsize=16, fontweight='bold')
-        ax.set_xlabel('Country', fontsize=12)
-        ax.set_ylabel('Total Cases', fontsize=12)
-        ax.set_xticks(range(len(countries)))
-        ax.set_xticklabels(countries, rotation=45, ha='right')
-        
-        # Format y-axis
-        if max(values) > 1000000:
-            ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
-        elif max(values) > 1000:
-            ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e3:.1f}K'))
-        
-        plt.tight_layout()
-        
-        image_base64 = fig_to_base64(fig)
+        image_base64 = cached_image('time_series', (), create_time_series_chart)
         return jsonify({'image': image_base64})
         
     except Exception as e:
         return jsonify({'error': f'Failed to generate time series: {str(e)}'}), 500
 
+@app.route('/api/reload', methods=['POST'])
+def reload_data():
+    """Refresh the dataset from JHU and empty the render cache"""
+    reload_covid_data()
+    source = data_loader.data_source if data_loader is not None else None
+    return jsonify({'version': data_version(), 'source': source or 'sample', 'cache': render_cache.stats()})
+
+@app.route('/api/cache')
+def get_cache_stats():
+    """Render cache size and hit/miss counters"""
+    return jsonify({'version': data_version(), 'cache': render_cache.stats()})
+
 if __name__ == '__main__':
     # Create static directory if it doesn't exist
     static_dir = os.path.join(os.path.dirname(__file__), 'static')
@@ -3,12 +3,14 @@ Flask Web Application for COVID-19 Data Visualization
 Serves choropleth maps and interactive visualizations
 """
 
-from flask import Flask, render_template, jsonify, send_file
+from flask import Flask, render_template, jsonify, send_file, Response, request
 import os
 import io
 import base64
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 from covid_choropleth import COVIDChoroplethMap
+from map_tiles import valid_tile
+from classification import SCHEMES
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend for web serving
 
@@ -26,6 +28,11 @@ def get_visualizer():
         visualizer.world_data = visualizer.load_world_data()
     return visualizer
 
+def requested_classification():
+    """The ?classification= query parameter (one of classification.SCHEMES), None if absent or unknown"""
+    classification = request.args.get('classification')
+    return classification if classification in SCHEMES else None
+
 def fig_to_base64(fig):
     """Convert matplotlib figure to base64 string for web display"""
     buffer = io.BytesIO()
@@ -37,8 +44,8 @@ def fig_to_base64(fig):
 
 @app.route('/')
 def index():
-    """Main dashboard page"""
-    return render_template('index.html')
+    """Main dashboard page, with the map views this app serves"""
+    return render_template('index.html', classification=True, vector_maps=True, map_tiles=True)
 
 @app.route('/api/statistics')
 def get_statistics():
@@ -85,8 +92,10 @@ def get_map(data_type):
         'active': 'Oranges'
     }
     
-    fig, ax = viz.create_choropleth_map(data_type, color_schemes[data_type], (12, 8))
-    image_base64 = fig_to_base64(fig)
+    # Recolors a persistent figure instead of building a new one per request
+    image = viz.render_map(data_type, color_schemes[data_type], (12, 8), dpi=300,
+                           classification=requested_classification())
+    image_base64 = base64.b64encode(image).decode()
     
     return jsonify({'image': image_base64})
 
@@ -95,11 +104,58 @@ def get_multiple_views():
     """Generate multiple views dashboard"""
     viz = get_visualizer()
     
-    fig, axes = viz.create_multiple_views((16, 12))
-    image_base64 = fig_to_base64(fig)
+    image = viz.render_multiple_views((16, 12), dpi=300, classification=requested_classification())
+    image_base64 = base64.b64encode(image).decode()
     
     return jsonify({'image': image_base64})
 
+@app.route('/api/vector/geometry.svg')
+def get_vector_geometry():
+    """Country paths keyed by ID (data-id), styled by /api/vector/styles in the browser"""
+    viz = get_visualizer()
+    return Response(viz.get_vector_map().geometry_svg, mimetype='image/svg+xml')
+
+@app.route('/api/vector/geometry.geojson')
+def get_vector_geojson():
+    """Simplified country geometry as GeoJSON features keyed by ID"""
+    viz = get_visualizer()
+    return Response(viz.get_vector_map().geojson_document(), mimetype='application/geo+json')
+
+@app.route('/api/vector/styles/<data_type>')
+def get_vector_styles(data_type):
+    """Class colors, class breaks and country ID -> class of one metric"""
+    viz = get_visualizer()
+    
+    color_schemes = {
+        'cases': 'Reds',
+        'deaths': 'Reds',
+        'recovered': 'Greens',
+        'active': 'Oranges'
+    }
+    if data_type not in color_schemes:
+        return jsonify({'error': 'Invalid data type'}), 400
+    
+    return jsonify(viz.vector_styles(data_type, color_schemes[data_type], classification=requested_classification()))
+
+@app.route('/tiles/<data_type>/<int:z>/<int:x>/<int:y>.png')
+def get_tile(data_type, z, x, y):
+    """XYZ tile of a metric's choropleth, for slippy-map clients such as Leaflet"""
+    viz = get_visualizer()
+    
+    color_schemes = {
+        'cases': 'Reds',
+        'deaths': 'Reds',
+        'recovered': 'Greens',
+        'active': 'Oranges'
+    }
+    if data_type not in color_schemes:
+        return jsonify({'error': 'Invalid data type'}), 400
+    if not valid_tile(z, x, y):
+        return jsonify({'error': 'Tile not found'}), 404
+    
+    tile = viz.render_tile(data_type, z, x, y, color_schemes[data_type], requested_classification())
+    return Response(tile, mimetype='image/png')
+
 @app.route('/api/time_series')
 def get_time_series():
     """Generate time series plot"""
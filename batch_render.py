@@ -0,0 +1,72 @@
+"""
+Headless batch rendering of the standard output images
+Renders the maps and plots of main() in parallel worker processes that share the loaded data
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.pyplot as plt
+
+# (file name, visualizer method, arguments) of each output written by main()
+BATCH_OUTPUTS = [
+    ('covid_cases_map.png', 'create_choropleth_map', ('cases', 'Reds', (15, 10))),
+    ('covid_deaths_map.png', 'create_choropleth_map', ('deaths', 'Reds', (15, 10))),
+    ('covid_multiple_views.png', 'create_multiple_views', ((20, 15),)),
+    ('covid_time_series.png', 'create_time_series_plot', ())
+]
+
+# Visualizer used by render_output in worker processes, inherited from the parent at fork
+batch_visualizer = None
+
+def can_fork():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+def prepare(visualizer):
+    """Load world data and build the geometry caches once, before workers are forked"""
+    if visualizer.world_data is None:
+        visualizer.world_data = visualizer.load_world_data()
+    visualizer.get_geometry_index()
+    visualizer.get_world_paths()
+
+def render_output(output, output_dir='.', dpi=300, visualizer=None):
+    """Render one BATCH_OUTPUTS entry to a file and return (file name, seconds)"""
+    start = time.perf_counter()
+    filename, method, args = output
+    fig, _ = getattr(visualizer or batch_visualizer, method)(*args)
+    fig.savefig(os.path.join(output_dir, filename), dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return filename, time.perf_counter() - start
+
+def render_batch(visualizer, outputs=BATCH_OUTPUTS, workers=None, output_dir='.', dpi=300):
+    """Render outputs to files, in parallel worker processes when workers > 1
+
+    Workers are forked after the data and geometry caches are loaded, so they
+    share them copy-on-write instead of loading or pickling them again. Without
+    fork (e.g. on Windows) or with workers=1 the outputs are rendered serially.
+    Returns ([(file name, seconds), ...], wall seconds, workers used).
+    """
+    global batch_visualizer
+    workers = min(workers or os.cpu_count() or 1, len(outputs))
+    os.makedirs(output_dir, exist_ok=True)
+    prepare(visualizer)
+    start = time.perf_counter()
+    if workers <= 1 or not can_fork():
+        timings = [render_output(output, output_dir, dpi, visualizer) for output in outputs]
+        return timings, time.perf_counter() - start, 1
+    batch_visualizer = visualizer
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(render_output, output, output_dir, dpi) for output in outputs]
+            timings = [future.result() for future in futures]
+    finally:
+        batch_visualizer = None
+    return timings, time.perf_counter() - start, workers
+
+def print_report(timings, wall_time, workers):
+    """Print per-output render times and the total wall time"""
+    for filename, seconds in timings:
+        print(f"  {filename:<28} {seconds:6.2f} s")
+    print(f"Wall time with {workers} worker(s): {wall_time:.2f} s "
+          f"(per-output times sum to {sum(seconds for _, seconds in timings):.2f} s)")
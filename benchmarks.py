@@ -0,0 +1,855 @@
+"""
+Benchmarks for the COVID-19 data pipeline
+Compares optimized code paths against the previous implementations
+"""
+
+import io
+import gzip
+import json
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import matplotlib.pyplot as plt
+from fetch_cache import FetchCache
+from covid_choropleth import COVIDChoroplethMap, JHU_URLS, OWID_HISTORY_URL
+from timeseries_store import TimeSeriesStore, JHU_ID_COLUMNS, jhu_date_columns, read_owid_chunks
+import snapshot
+from country_table import CountryTable
+from synthetic_data import (synthetic_jhu_frames, synthetic_owid_history, synthetic_covid_data, country_names,
+                            synthetic_time_series, DEFAULT_SEED)
+from geometry_index import GeometryIndex, NAME_COLUMNS
+from country_codes import encode_names
+import map_render
+import raster_map
+from classification import classify, SCHEMES, DEFAULT_CLASS_COUNT
+import batch_render
+import app as dashboard
+
+def time_call(func, *args, repeat=5, **kwargs):
+    """Run func several times and return (best seconds, last result)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+class LocalCSVServer:
+    """Stand-in for the upstream CSV hosts that serves a directory with ETag and Last-Modified"""
+
+    def __init__(self, directory, delay=0.0):
+        self.directory = directory
+        self.delay = delay  # simulated round-trip latency in seconds
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.server = None
+        self.thread = None
+
+    def handler_class(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fixture.requests += 1
+                time.sleep(fixture.delay)
+                path = os.path.join(fixture.directory, os.path.basename(self.path))
+                if not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+
+                with open(path, 'rb') as f:
+                    body = f.read()
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                mtime = int(os.path.getmtime(path))
+                last_modified = formatdate(mtime, usegmt=True)
+
+                if_none_match = self.headers.get('If-None-Match')
+                if_modified_since = self.headers.get('If-Modified-Since')
+                if if_none_match is not None:
+                    unchanged = if_none_match == etag
+                elif if_modified_since is not None:
+                    unchanged = parsedate_to_datetime(if_modified_since).timestamp() >= mtime
+                else:
+                    unchanged = False
+
+                if unchanged:
+                    fixture.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                fixture.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def url_for(self, name):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/{name}"
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def save_jhu_csvs(data_dir):
+    """Download a copy of the JHU time-series CSVs into data_dir"""
+    os.makedirs(data_dir, exist_ok=True)
+    for name, url in JHU_URLS.items():
+        path = os.path.join(data_dir, os.path.basename(url))
+        pd.read_csv(url).to_csv(path, index=False)
+        print(f"Saved {name} data to {path}")
+
+def save_owid_history(data_dir):
+    """Download a copy of the OWID full history CSV into data_dir"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, os.path.basename(OWID_HISTORY_URL))
+    FetchCache().fetch(OWID_HISTORY_URL)
+    shutil.copy(FetchCache().path_for(OWID_HISTORY_URL, '.csv'), path)
+    print(f"Saved OWID history to {path}")
+
+def save_synthetic_csvs(data_dir, countries=200, provinces=0, counties=0, days=1100, seed=DEFAULT_SEED):
+    """Write synthetic JHU and OWID CSVs into data_dir in place of the upstream files"""
+    os.makedirs(data_dir, exist_ok=True)
+    frames = synthetic_jhu_frames(countries, provinces, counties, days, seed)
+    for (name, url), frame in zip(JHU_URLS.items(), frames):
+        path = os.path.join(data_dir, os.path.basename(url))
+        frame.to_csv(path, index=False)
+        print(f"Saved synthetic {name} data ({len(frame):,} rows x {days} days) to {path}")
+    path = os.path.join(data_dir, os.path.basename(OWID_HISTORY_URL))
+    history = synthetic_owid_history(countries, days, seed)
+    history.to_csv(path, index=False)
+    print(f"Saved synthetic OWID history ({len(history):,} rows) to {path}")
+
+def peak_memory(func, *args, **kwargs):
+    """Run func once and return (seconds, peak traced bytes, result)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+        return time.perf_counter() - start, tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+def load_jhu_csvs(data_dir):
+    """Load the saved JHU time-series CSVs from data_dir"""
+    return [pd.read_csv(os.path.join(data_dir, os.path.basename(url))) for url in JHU_URLS.values()]
+
+def legacy_process_jhu_frames(visualizer, confirmed_df, deaths_df, recovered_df):
+    """Row-by-row JHU aggregation as previously done in fetch_jhu_data"""
+    latest_date = confirmed_df.columns[-1]
+
+    covid_data = {}
+    for _, row in confirmed_df.iterrows():
+        country_std = visualizer.country_mapping.get(row['Country/Region'], row['Country/Region'])
+        if country_std not in covid_data:
+            covid_data[country_std] = {
+                'cases': 0,
+                'deaths': 0,
+                'recovered': 0,
+                'lat': row['Lat'],
+                'lon': row['Long'],
+                'population': 0
+            }
+        covid_data[country_std]['cases'] += row[latest_date]
+
+    for _, row in deaths_df.iterrows():
+        country_std = visualizer.country_mapping.get(row['Country/Region'], row['Country/Region'])
+        if country_std in covid_data:
+            covid_data[country_std]['deaths'] += row[latest_date]
+
+    for _, row in recovered_df.iterrows():
+        country_std = visualizer.country_mapping.get(row['Country/Region'], row['Country/Region'])
+        if country_std in covid_data:
+            covid_data[country_std]['recovered'] += row[latest_date]
+
+    for country in covid_data:
+        if covid_data[country]['recovered'] == 0 and covid_data[country]['cases'] > 0:
+            covid_data[country]['recovered'] = int(covid_data[country]['cases'] * 0.9)
+        covid_data[country]['active'] = max(0,
+            covid_data[country]['cases'] -
+            covid_data[country]['deaths'] -
+            covid_data[country]['recovered']
+        )
+    return covid_data
+
+def benchmark_jhu_ingestion(data_dir):
+    """Compare iterrows and groupby JHU aggregation on saved CSVs"""
+    visualizer = COVIDChoroplethMap()
+    frames = load_jhu_csvs(data_dir)
+    print(f"Rows: {', '.join(f'{name}={len(df)}' for name, df in zip(JHU_URLS, frames))}")
+
+    old_time, old_data = time_call(legacy_process_jhu_frames, visualizer, *frames, repeat=3)
+    new_time, new_data = time_call(visualizer.process_jhu_frames, *frames)
+
+    same = list(old_data) == list(new_data) and all(
+        old_data[country][key] == new_data[country][key] or
+        (pd.isna(old_data[country][key]) and pd.isna(new_data[country][key]))
+        for country in old_data for key in old_data[country]
+    )
+    print(f"iterrows: {old_time * 1000:8.1f} ms")
+    print(f"groupby:  {new_time * 1000:8.1f} ms  ({old_time / new_time:.1f}x faster)")
+    print(f"Outputs match: {same}")
+    return same
+
+def benchmark_fetch_cache(data_dir):
+    """Measure cold, revalidated and changed-upstream fetches against a local server"""
+    names = [os.path.basename(url) for url in JHU_URLS.values()]
+    serve_dir = tempfile.mkdtemp(prefix='covid_serve_')
+    cache_dir = tempfile.mkdtemp(prefix='covid_cache_')
+    try:
+        for name in names:
+            shutil.copy(os.path.join(data_dir, name), serve_dir)
+
+        with LocalCSVServer(serve_dir) as server:
+            urls = [server.url_for(name) for name in names]
+
+            def fetch_all(cache):
+                return [cache.read_csv(url) for url in urls]
+
+            cold_cache = FetchCache(cache_dir)
+            cold_time, _ = time_call(fetch_all, cold_cache, repeat=1)
+            cold_bytes = server.bytes_sent
+
+            # A new FetchCache per call simulates a process restart (no in-memory frames)
+            warm_time, _ = time_call(lambda: fetch_all(FetchCache(cache_dir)))
+            warm_bytes = server.bytes_sent - cold_bytes
+
+            cache = FetchCache(cache_dir)
+            memory_time, _ = time_call(fetch_all, cache)
+
+            # Change one file upstream: only that URL should be downloaded again
+            with open(os.path.join(serve_dir, names[0]), 'a') as f:
+                f.write('\n')
+            cache.stats.update(hits=0, misses=0)
+            fetch_all(cache)
+            changed_stats = dict(cache.stats)
+
+        print(f"cold (download + parse):       {cold_time * 1000:8.1f} ms  {cold_bytes:>12,} bytes")
+        print(f"revalidated, new process:      {warm_time * 1000:8.1f} ms  {warm_bytes:>12,} bytes")
+        print(f"revalidated, in-memory frames: {memory_time * 1000:8.1f} ms")
+        print(f"after one upstream change:     hits={changed_stats['hits']} misses={changed_stats['misses']}")
+        print(f"saved per warm refresh:        {(cold_time - warm_time) * 1000:8.1f} ms  {cold_bytes:>12,} bytes")
+        return warm_bytes == 0 and changed_stats['misses'] == 1 and changed_stats['hits'] == len(names) - 1
+    finally:
+        shutil.rmtree(serve_dir, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def benchmark_jhu_concurrent(data_dir, delay=0.2):
+    """Compare serial and concurrent cold fetches of the three JHU files"""
+    names = {name: os.path.basename(url) for name, url in JHU_URLS.items()}
+    serve_dir = tempfile.mkdtemp(prefix='covid_serve_')
+    cache_dir = tempfile.mkdtemp(prefix='covid_cache_')
+    try:
+        for name in names.values():
+            shutil.copy(os.path.join(data_dir, name), serve_dir)
+
+        with LocalCSVServer(serve_dir, delay=delay) as server:
+            urls = {name: server.url_for(filename) for name, filename in names.items()}
+            visualizer = COVIDChoroplethMap(cache_dir=cache_dir)
+
+            results = {}
+            for label, workers in [('serial', 1), ('concurrent', 3)]:
+                visualizer.fetch_cache.clear()
+                visualizer.fetch_jhu_frames(urls, max_workers=workers)
+                results[label] = dict(visualizer.fetch_timings)
+
+        print(f"Simulated latency per request: {delay * 1000:.0f} ms")
+        for label, timings in results.items():
+            per_file = ', '.join(f"{name} {timings[name] * 1000:.0f} ms" for name in names)
+            print(f"{label:<10} wall {timings['total'] * 1000:7.1f} ms  ({per_file})")
+        print(f"Speedup: {results['serial']['total'] / results['concurrent']['total']:.1f}x")
+        return True
+    finally:
+        shutil.rmtree(serve_dir, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def benchmark_jhu_incremental(data_dir):
+    """Compare a full time-series rebuild with appending the latest day to a copy of the store"""
+    visualizer = COVIDChoroplethMap()
+    frames = load_jhu_csvs(data_dir)
+    previous_day = [df[JHU_ID_COLUMNS + jhu_date_columns(df)[:-1]] for df in frames]
+
+    full_time, reference = time_call(TimeSeriesStore.from_jhu_frames, *frames,
+                                     standardize=visualizer.standardize_countries)
+
+    def append_latest():
+        store = TimeSeriesStore.from_jhu_frames(*previous_day, standardize=visualizer.standardize_countries)
+        start = time.perf_counter()
+        store = store.copy()  # refresh() never changes the loaded store
+        store.update_from_jhu_frames(*frames, standardize=visualizer.standardize_countries)
+        return time.perf_counter() - start, store
+
+    runs = [append_latest() for _ in range(5)]
+    update_time, store = min(runs, key=lambda run: run[0])
+
+    same = all((store.arrays[metric] == reference.arrays[metric]).all() for metric in reference.arrays)
+    print(f"full rebuild:          {full_time * 1000:8.1f} ms")
+    print(f"incremental (+1 day):  {update_time * 1000:8.1f} ms  ({full_time / update_time:.1f}x faster)")
+    print(f"Arrays match: {same}")
+    return same
+
+def benchmark_snapshot(data_dir):
+    """Compare starting from the saved CSVs with starting from a memory-mapped snapshot"""
+    snapshot_dir = tempfile.mkdtemp(prefix='covid_snapshot_')
+    try:
+        visualizer = COVIDChoroplethMap()
+
+        def start_from_csv():
+            frames = load_jhu_csvs(data_dir)
+            covid_data = visualizer.process_jhu_frames(*frames)
+            return covid_data, TimeSeriesStore.from_jhu_frames(*frames, standardize=visualizer.standardize_countries)
+
+        csv_time, (covid_data, time_series) = time_call(start_from_csv, repeat=3)
+        snapshot.save_snapshot(snapshot_dir, covid_data, time_series, source='jhu')
+        load_time, (loaded, loaded_series, _) = time_call(snapshot.load_snapshot, snapshot_dir)
+
+        same = list(loaded) == list(covid_data) and all(
+            (loaded_series.arrays[metric] == time_series.arrays[metric]).all() for metric in time_series.arrays)
+        print(f"parse CSVs + aggregate: {csv_time * 1000:8.1f} ms")
+        print(f"load snapshot (mmap):   {load_time * 1000:8.1f} ms  ({csv_time / load_time:.0f}x faster)")
+        print(f"Data matches: {same}")
+        return same
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+def benchmark_owid_streaming(data_dir):
+    """Compare peak memory of a full OWID history read with the chunked reader"""
+    path = os.path.join(data_dir, os.path.basename(OWID_HISTORY_URL))
+    visualizer = COVIDChoroplethMap()
+    print(f"File size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+    full_time, full_peak, _ = peak_memory(pd.read_csv, path)
+    print(f"pd.read_csv (all columns): {full_time * 1000:8.1f} ms  peak {full_peak / 1e6:8.1f} MB")
+
+    for chunksize in [10_000, 100_000]:
+        seconds, peak, store = peak_memory(
+            TimeSeriesStore.from_owid_chunks, read_owid_chunks(path, chunksize), visualizer.standardize_countries)
+        print(f"streaming, {chunksize:>7,} rows: {seconds * 1000:8.1f} ms  peak {peak / 1e6:8.1f} MB  "
+              f"-> {store.shape[0]} countries x {store.shape[1]} days")
+    return True
+
+def county_scale_data(count, seed=0):
+    """Return a dict-of-dicts covid_data with `count` synthetic county-sized entries"""
+    rng = np.random.default_rng(seed)
+    cases = rng.integers(0, 2_000_000, count)
+    deaths = (cases * rng.uniform(0.005, 0.03, count)).astype(int)
+    recovered = (cases * 0.9).astype(int)
+    population = rng.integers(1_000, 10_000_000, count)
+    covid_data = {}
+    for i in range(count):
+        covid_data[f'County {i:06d}'] = {
+            'cases': int(cases[i]),
+            'deaths': int(deaths[i]),
+            'recovered': int(recovered[i]),
+            'active': int(max(0, cases[i] - deaths[i] - recovered[i])),
+            'population': int(population[i])
+        }
+    return covid_data
+
+def legacy_table_ops(covid_data):
+    """Totals, top 10 and positive values the way the dict-of-dicts consumers computed them"""
+    totals = {key: sum(data.get(key, 0) for data in covid_data.values())
+              for key in ['cases', 'deaths', 'recovered', 'active']}
+    top = sorted(((country, data['cases']) for country, data in covid_data.items()),
+                 key=lambda x: x[1], reverse=True)[:10]
+    positive = [(country, data['deaths']) for country, data in covid_data.items() if data['deaths'] > 0]
+    return totals, top, len(positive)
+
+def table_ops(table):
+    totals = {key: table.total(key) for key in ['cases', 'deaths', 'recovered', 'active']}
+    top = table.top('cases', 10)
+    positive = table.positive('deaths')
+    return totals, top, len(positive[0])
+
+def benchmark_country_table(data_dir):
+    """Compare memory and aggregation time of the dict-of-dicts covid_data with CountryTable"""
+    same = True
+    for count in [3_000, 30_000]:
+        _, dict_bytes, covid_data = peak_memory(county_scale_data, count)
+        table = CountryTable.from_dict(covid_data)
+        table_bytes = table.nbytes + table.countries.memory_usage(deep=True)
+        legacy_time, expected = time_call(legacy_table_ops, covid_data)
+        table_time, result = time_call(table_ops, table)
+        same = same and result == expected
+
+        print(f"{count:,} entities:")
+        print(f"  dict of dicts:  {dict_bytes / 1e6:8.2f} MB  ops {legacy_time * 1000:8.2f} ms")
+        print(f"  CountryTable:   {table_bytes / 1e6:8.2f} MB  ops {table_time * 1000:8.2f} ms  "
+              f"({dict_bytes / table_bytes:.0f}x smaller, {legacy_time / table_time:.0f}x faster)")
+        print(f"  dtypes: {', '.join(f'{key}={values.dtype}' for key, values in table.columns.items())}")
+    print(f"Results match: {same}")
+    return same
+
+def legacy_geometry_join(world, names):
+    """Per-country masks over every name column, as create_choropleth_map did before the index"""
+    rows = []
+    for country in names:
+        found = None
+        for col in NAME_COLUMNS:
+            if col in world.columns:
+                matches = np.flatnonzero(world[col] == country)
+                if len(matches):
+                    found = matches
+                    break
+        if found is None:
+            for col in NAME_COLUMNS:
+                if col in world.columns:
+                    matches = np.flatnonzero(world[col].str.contains(country, case=False, na=False, regex=False))
+                    if len(matches):
+                        found = matches
+                        break
+        rows.append(found)
+    return rows
+
+# JHU spellings that differ from the world layer names
+JHU_STYLE_NAMES = [
+    'Korea, South', 'Taiwan*', 'Congo (Kinshasa)', 'Congo (Brazzaville)', 'Czechia', 'Burma',
+    'North Macedonia', 'Niger', "Cote d'Ivoire", 'Bahamas', 'Gambia', 'Timor-Leste', 'West Bank and Gaza',
+    'South Georgia', 'Korea'
+]
+
+# Names the resolver must match to one world feature, or to none (None), whatever the substring match did
+RESOLUTION_CHECKS = {
+    'Niger': 'Niger',
+    'Bahamas': 'The Bahamas',
+    'Korea, South': 'South Korea',
+    'South Georgia': None,  # not Georgia
+    'Korea': None,  # not North Korea
+}
+
+def benchmark_geometry_join(data_dir, world_path='world.geojson', countries=300, renders=4):
+    """Compare the per-render mask join with the geometry index and its persisted resolutions"""
+    world = gpd.read_file(world_path)
+    names = country_names(countries) + JHU_STYLE_NAMES
+    print(f"{len(names)} covid names x {len(world)} features, {renders} renders")
+    resolution_dir = tempfile.mkdtemp(prefix='covid_resolutions_')
+    resolution_path = os.path.join(resolution_dir, 'name_resolutions.json')
+    try:
+        legacy_time, expected = time_call(lambda: [legacy_geometry_join(world, names) for _ in range(renders)],
+                                          repeat=1)
+
+        def join(renders):
+            index = GeometryIndex(world, resolution_path)
+            return [index.resolve_many(names) for _ in range(renders)][0], index
+
+        cold_time, (result, index) = time_call(join, renders, repeat=1)
+        # A new process starts with an empty in-memory cache but reads the resolution table
+        warm_time, (warm_result, _) = time_call(join, renders, repeat=1)
+
+        def same_rows(a, b):
+            return (a is None) == (b is None) and (a is None or list(a) == list(b))
+
+        def label(rows):
+            return '-' if rows is None else ', '.join(world['name'].iloc[rows])
+
+        same = all(same_rows(a, b) for a, b in zip(result, warm_result))
+        resolved = dict(zip(names, result))
+        wrong = {name: label(resolved[name]) for name, expected_name in RESOLUTION_CHECKS.items()
+                 if label(resolved[name]) != (expected_name or '-')}
+        codes = encode_names(names)
+        code_time, _ = time_call(lambda: [index.join(names, codes) for _ in range(renders)], repeat=1)
+        print(f"mask join:                {legacy_time * 1000:8.1f} ms")
+        print(f"index, cold resolutions:  {cold_time * 1000:8.1f} ms  ({legacy_time / cold_time:.0f}x faster)")
+        print(f"index, saved resolutions: {warm_time * 1000:8.1f} ms  ({legacy_time / warm_time:.0f}x faster)")
+        print(f"ISO3 code join:           {code_time * 1000:8.1f} ms  ({legacy_time / code_time:.0f}x faster)")
+        print(f"Unresolved: {len(index.unresolved(names))} names")
+        for name, before, after in zip(names, expected[0], result):
+            if not same_rows(before, after):
+                print(f"  {name!r}: substring match {label(before)} -> resolver {label(after)}")
+        print(f"Saved resolutions reproduce the cold run: {same}")
+        print(f"Resolution checks: {'ok' if not wrong else wrong}")
+        return same and not wrong
+    finally:
+        shutil.rmtree(resolution_dir, ignore_errors=True)
+
+def legacy_draw_countries(ax, world, geometry_rows, colors, linewidth=0.5):
+    """Previous rendering: a gray basemap, then one plot call per country with geometry"""
+    world.plot(ax=ax, color=map_render.BASEMAP_COLOR, edgecolor=map_render.BORDER_COLOR, linewidth=linewidth)
+    for color, rows in zip(colors, geometry_rows):
+        if rows is not None:
+            world.iloc[rows].plot(ax=ax, color=color, edgecolor=map_render.BORDER_COLOR, linewidth=linewidth)
+
+def draw_countries(ax, world_paths, geometry_rows, colors, linewidth=0.5):
+    facecolors = map_render.row_facecolors(len(world_paths), geometry_rows, colors)
+    map_render.plot_world(ax, world_paths, facecolors, linewidth)
+
+def render_png(draw, world, geometry_rows, colors, figsize, panels=1, dpi=300):
+    """Draw the map on `panels` axes and save it as PNG; return (bytes, collections per axis)"""
+    fig, axes = plt.subplots(1, panels, figsize=figsize, squeeze=False)
+    for ax in axes.ravel():
+        draw(ax, world, geometry_rows, colors, 0.5 if panels == 1 else 0.3)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    collections = len(axes[0, 0].collections)
+    plt.close(fig)
+    return buffer.getvalue(), collections
+
+def benchmark_choropleth_render(data_dir, world_path='world.geojson', dpi=300):
+    """Compare per-country plot calls with the single-call choropleth at the sizes used by main()"""
+    world = gpd.read_file(world_path)
+    table = synthetic_covid_data(list(world['name']))
+    index = GeometryIndex(world, resolution_path=None)
+    geometry_rows = index.join(table.countries, table.codes)
+    world_paths = map_render.WorldPaths(world)
+    colors = plt.get_cmap('Reds')(plt.Normalize()(table.column('cases')))
+    print(f"{len(table)} countries x {len(world)} features, dpi {dpi}")
+    ok = True
+    for label, figsize, panels in [('single map', (15, 10), 1), ('multiple views', (20, 15), 4)]:
+        legacy_time, (_, legacy_collections) = time_call(render_png, legacy_draw_countries, world, geometry_rows,
+                                                         colors, figsize, panels, dpi, repeat=1)
+        new_time, (_, new_collections) = time_call(render_png, draw_countries, world_paths, geometry_rows,
+                                                   colors, figsize, panels, dpi, repeat=3)
+        print(f"{label} {figsize}:")
+        print(f"  per-country plots: {legacy_time * 1000:8.1f} ms  ({legacy_collections} collections per axis)")
+        print(f"  single call:       {new_time * 1000:8.1f} ms  ({new_collections} collection per axis, "
+              f"{legacy_time / new_time:.1f}x faster)")
+        ok = ok and new_collections == 1
+    return ok
+
+def benchmark_world_paths(data_dir, world_path='world.geojson', maps=8, panels=4):
+    """Compare converting geometries on every map with drawing from the cached paths"""
+    world = gpd.read_file(world_path)
+    colors = plt.get_cmap('Reds')(np.linspace(0, 1, len(world)))
+    print(f"{len(world)} features, {maps} maps of {panels} panels")
+
+    def draw(plot):
+        for _ in range(maps):
+            fig, axes = plt.subplots(1, panels, squeeze=False)
+            for ax in axes.ravel():
+                plot(ax)
+            plt.close(fig)
+
+    def geopandas_plot(ax):
+        world.plot(ax=ax, color=colors, edgecolor=map_render.BORDER_COLOR, linewidth=0.3)
+
+    legacy_time, _ = time_call(draw, geopandas_plot, repeat=3)
+    cache_time, world_paths = time_call(map_render.WorldPaths, world, repeat=3)
+    cached_time, _ = time_call(draw, lambda ax: map_render.plot_world(ax, world_paths, colors, 0.3), repeat=3)
+    vertices = sum(len(path.vertices) for path in world_paths.paths)
+    print(f"path cache ({vertices} vertices): {cache_time * 1000:8.1f} ms, once per world layer")
+    print(f"GeoDataFrame.plot:               {legacy_time * 1000:8.1f} ms")
+    print(f"cached paths:                    {cached_time * 1000:8.1f} ms  ({legacy_time / cached_time:.1f}x faster)")
+
+def benchmark_simplification(data_dir, world_path='world.geojson', figsize=(15, 10), dpi=300):
+    """Vertex counts and render times per simplification level, and the level chosen per output size"""
+    world = gpd.read_file(world_path)
+    build_time, world_paths = time_call(map_render.WorldPaths, world, repeat=1)
+    colors = plt.get_cmap('Reds')(np.linspace(0, 1, len(world)))
+    print(f"{len(world)} features, {len(world_paths.levels)} levels built in {build_time * 1000:.1f} ms")
+
+    def render(level, figsize, dpi):
+        fig, ax = plt.subplots(figsize=figsize)
+        collection = map_render.plot_world(ax, world_paths, colors, level=level)
+        # Raw RGBA output, so the timings are not dominated by PNG compression
+        fig.savefig(io.BytesIO(), format='raw', dpi=dpi)
+        plt.close(fig)
+        return collection.drawn_level
+
+    print(f"{'level':>5} {'tolerance':>10} {'vertices':>9} {'render ' + str(figsize) + ' @ ' + str(dpi):>22}")
+    for level, ((tolerance, _), vertices) in enumerate(zip(world_paths.levels, world_paths.vertex_counts())):
+        render_time, _ = time_call(render, level, figsize, dpi, repeat=3)
+        print(f"{level:>5} {tolerance:>10.3f} {vertices:>9} {render_time * 1000:>19.1f} ms")
+    for size, output_dpi in [((12, 6), 150), ((15, 10), 300), ((20, 15), 300), ((8, 5), 100)]:
+        print(f"{str(size):>8} @ {output_dpi} dpi -> level {render(None, size, output_dpi)}")
+
+def benchmark_map_template(data_dir, world_path='world.geojson', dpi=150, rounds=2):
+    """Compare building a new figure per metric with recoloring a persistent map template"""
+    visualizer = COVIDChoroplethMap()
+    visualizer.covid_data = synthetic_covid_data()
+    visualizer.world_data = gpd.read_file(world_path)
+    metrics = [('cases', 'Reds'), ('deaths', 'Reds'), ('recovered', 'Greens'), ('active', 'Oranges')] * rounds
+    print(f"{len(metrics)} maps at (12, 8) and {rounds} multiple views at (16, 12), dpi {dpi}")
+
+    def encode(fig):
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        return buffer.getvalue()
+
+    def new_figures():
+        maps = [encode(visualizer.create_choropleth_map(metric, scheme, (12, 8))[0]) for metric, scheme in metrics]
+        views = [encode(visualizer.create_multiple_views((16, 12))[0]) for _ in range(rounds)]
+        return maps, views
+
+    def templates():
+        maps = [visualizer.render_map(metric, scheme, (12, 8), dpi=dpi) for metric, scheme in metrics]
+        views = [visualizer.render_multiple_views((16, 12), dpi=dpi) for _ in range(rounds)]
+        return maps, views
+
+    visualizer.get_world_paths()
+    new_time, _ = time_call(new_figures, repeat=1)
+    cold_time, _ = time_call(templates, repeat=1)
+    warm_time, _ = time_call(templates, repeat=1)
+    print(f"new figure per map:    {new_time * 1000:8.1f} ms")
+    print(f"templates, first use:  {cold_time * 1000:8.1f} ms")
+    print(f"templates, reused:     {warm_time * 1000:8.1f} ms  ({new_time / warm_time:.1f}x faster)")
+    return len(visualizer.map_templates) == 2
+
+def benchmark_batch_render(data_dir, world_path='world.geojson', workers=4):
+    """Compare rendering the outputs of main() one after another with a forked process pool"""
+    visualizer = COVIDChoroplethMap()
+    visualizer.covid_data = synthetic_covid_data()
+    visualizer.world_data = gpd.read_file(world_path)
+    output_dir = tempfile.mkdtemp(prefix='covid_batch_')
+    print(f"{len(batch_render.BATCH_OUTPUTS)} outputs at 300 dpi, {os.cpu_count()} CPUs")
+    try:
+        serial, serial_time, _ = batch_render.render_batch(visualizer, workers=1, output_dir=output_dir)
+        batch_render.print_report(serial, serial_time, 1)
+        parallel, parallel_time, used = batch_render.render_batch(visualizer, workers=workers, output_dir=output_dir)
+        batch_render.print_report(parallel, parallel_time, used)
+        print(f"Parallel vs. serial wall time: {serial_time / parallel_time:.1f}x")
+        return sorted(os.listdir(output_dir)) == sorted(name for name, _, _ in batch_render.BATCH_OUTPUTS)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def benchmark_raster_render(data_dir, world_path='world.geojson', width=1200, maps=8):
+    """Compare the matplotlib map template with lookups on the raster engine's label image"""
+    visualizer = COVIDChoroplethMap()
+    visualizer.covid_data = synthetic_covid_data()
+    visualizer.world_data = gpd.read_file(world_path)
+    metrics = [('cases', 'Reds'), ('deaths', 'Reds'), ('recovered', 'Greens'), ('active', 'Oranges')]
+    metrics = (metrics * maps)[:maps]
+    # (12, 8) at dpi 100 is about as wide as the raster map
+    visualizer.render_map('cases', 'Reds', (12, 8), dpi=100)
+    build_time, raster = time_call(visualizer.get_raster_map, width, repeat=1)
+    print(f"{maps} maps, raster width {width} ({raster.size[0]}x{raster.size[1]} map area); "
+          f"label image built in {build_time * 1000:.1f} ms")
+    _, values, geometry_rows = visualizer.join_metric(visualizer.map_data(), 'cases')
+    rows, row_values = map_render.colored_rows(geometry_rows, values)
+    values_by_row = np.full(len(raster.world_paths), np.nan)
+    values_by_row[rows] = row_values
+    cmap = plt.get_cmap('Reds')
+    vector_time, _ = time_call(lambda: [visualizer.render_map(m, s, (12, 8), dpi=100) for m, s in metrics], repeat=1)
+    cold_time, _ = time_call(lambda: [visualizer.render_raster_map(m, s, width) for m, s in metrics], repeat=1)
+    raster_time, _ = time_call(lambda: [visualizer.render_raster_map(m, s, width) for m, s in metrics], repeat=3)
+    gather_time, _ = time_call(raster.render_map, values_by_row, cmap)
+    print(f"map template PNG:        {vector_time / maps * 1000:8.1f} ms per map")
+    print(f"raster engine PNG, cold: {cold_time / maps * 1000:8.1f} ms per map  (first title and legend of each)")
+    print(f"raster engine PNG:       {raster_time / maps * 1000:8.1f} ms per map  "
+          f"({vector_time / raster_time:.1f}x faster, title and legend frames cached)")
+    print(f"  color lookup only:     {gather_time * 1000:8.1f} ms")
+    ok = True
+    for scheme in ['quantile', 'linear']:
+        classes = classify(values_by_row, scheme)
+        title = f'COVID-19 Cases ({scheme})'
+        frame_time, _ = time_call(raster.render, values_by_row, cmap, title, 'Cases', classes, repeat=1)
+        render_time, image = time_call(raster.render, values_by_row, cmap, title, 'Cases', classes)
+        encode_time, png = time_call(raster.encode, image)
+        print(f"  {scheme} classes ({image.mode} image):")
+        print(f"    first render (draws the title and legend frame): {frame_time * 1000:6.1f} ms")
+        print(f"    render with the cached frame:                    {render_time * 1000:6.1f} ms")
+        print(f"    PNG encoding:                                    {encode_time * 1000:6.1f} ms "
+              f"({len(png) / 1024:.0f} KB)")
+        ok = ok and image.size == (raster.size[0] + raster_map.LEGEND_WIDTH, raster.size[1] + raster_map.TITLE_HEIGHT)
+    return ok
+
+def benchmark_vector_output(data_dir, world_path='world.geojson', dpi=300):
+    """Compare the bytes and time of a PNG map per metric with vector geometry sent once plus a style map per metric"""
+    visualizer = COVIDChoroplethMap()
+    visualizer.covid_data = synthetic_covid_data()
+    visualizer.world_data = gpd.read_file(world_path)
+    metrics = [('cases', 'Reds'), ('deaths', 'Reds'), ('recovered', 'Greens'), ('active', 'Oranges')]
+    visualizer.render_map('cases', 'Reds', (12, 8), dpi=dpi)
+    png_time, pngs = time_call(lambda: [visualizer.render_map(m, s, (12, 8), dpi=dpi) for m, s in metrics], repeat=1)
+    build_time, vector = time_call(visualizer.get_vector_map, repeat=1)
+    styles_time, styles = time_call(lambda: [json.dumps(visualizer.vector_styles(m, s)) for m, s in metrics])
+    geojson = vector.geojson_document()
+
+    def sizes(data):
+        data = data.encode() if isinstance(data, str) else data
+        return f"{len(data) / 1024:8.1f} KB  ({len(gzip.compress(data)) / 1024:7.1f} KB gzipped)"
+
+    print(f"{len(metrics)} metrics; PNG maps at (12, 8) and {dpi} dpi, vector geometry for a {vector.width} px map")
+    print(f"PNG map per metric:    {sizes(pngs[0])}  {png_time / len(metrics) * 1000:7.1f} ms")
+    print(f"SVG geometry (once):   {sizes(vector.geometry_svg)}  {build_time * 1000:7.1f} ms")
+    print(f"GeoJSON (once):        {sizes(geojson)}")
+    print(f"style map per metric:  {sizes(styles[0])}  {styles_time / len(metrics) * 1000:7.1f} ms")
+    return all(json.loads(style)['classes'] for style in styles)
+
+def benchmark_map_tiles(data_dir, world_path='world.geojson', zoom=4, viewport=(4, 3)):
+    """Compare rendering the whole world at a zoom level's resolution with the tiles of one viewport, cold and cached"""
+    visualizer = COVIDChoroplethMap()
+    visualizer.covid_data = synthetic_covid_data()
+    visualizer.world_data = gpd.read_file(world_path)
+    # Viewport over Europe: tiles around lon 10, lat 50
+    center_x = int((10 + 180) / 360 * 2 ** zoom)
+    center_y = int((1 - np.log(np.tan(np.radians(50)) + 1 / np.cos(np.radians(50))) / np.pi) / 2 * 2 ** zoom)
+    tiles = [(center_x + dx - viewport[0] // 2, center_y + dy - viewport[1] // 2)
+             for dx in range(viewport[0]) for dy in range(viewport[1])]
+    world_pixels = 2 ** zoom * 256
+    dpi = world_pixels / 12
+    print(f"zoom {zoom}: {len(tiles)} tiles of a {viewport[0] * 256}x{viewport[1] * 256} viewport "
+          f"vs. the whole world at (12, 8) and {dpi:.0f} dpi ({world_pixels} px wide)")
+    visualizer.render_map('cases', 'Reds', (12, 8), dpi=100)
+    world_time, _ = time_call(visualizer.render_map, 'cases', 'Reds', (12, 8), None, dpi, repeat=1)
+    setup_time, _ = time_call(visualizer.get_tile_renderer, repeat=1)
+    cold_time, _ = time_call(lambda: [visualizer.render_tile('cases', zoom, x, y) for x, y in tiles], repeat=1)
+    warm_time, _ = time_call(lambda: [visualizer.render_tile('cases', zoom, x, y) for x, y in tiles])
+    # New data: cached tiles of the old version must not be served
+    visualizer.covid_data = synthetic_covid_data(seed=1)
+    new_data_time, _ = time_call(lambda: [visualizer.render_tile('cases', zoom, x, y) for x, y in tiles], repeat=1)
+    stats = visualizer.tile_cache.stats()
+    print(f"whole world render:        {world_time * 1000:8.1f} ms")
+    print(f"tile renderer setup:       {setup_time * 1000:8.1f} ms (once per world layer)")
+    print(f"viewport tiles, cold:      {cold_time * 1000:8.1f} ms")
+    print(f"viewport tiles, cached:    {warm_time * 1000:8.3f} ms")
+    print(f"viewport tiles, new data:  {new_data_time * 1000:8.1f} ms")
+    print(f"tile cache: {stats['entries']} tiles, {stats['bytes'] / 1024:.0f} KB, "
+          f"{stats['hits']} hits / {stats['misses']} misses")
+    return stats['entries'] == len(tiles)
+
+def benchmark_classification(data_dir, units=5000):
+    """Time each classification scheme on country and sub-national counts, and show how evenly it spreads countries"""
+    visualizer = COVIDChoroplethMap()
+    visualizer.covid_data = synthetic_covid_data(countries=200)
+    _, countries = visualizer.covid_data.positive('cases')
+    # Skewed like county-level counts
+    sub_national = np.random.default_rng(DEFAULT_SEED).lognormal(8, 2.5, units)
+    print(f"{len(countries)} countries, {units} sub-national units, {DEFAULT_CLASS_COUNT} classes")
+    print(f"{'scheme':<16} {'countries':>10} {'units':>10}   countries per class")
+    for scheme in SCHEMES:
+        country_time, classes = time_call(classify, countries, scheme)
+        unit_time, _ = time_call(classify, sub_national, scheme)
+        if scheme == 'linear':
+            # Continuous scale: count countries in equal color ranges
+            classes = classify(countries, 'equal_interval')
+        counts = np.bincount(classes.classify(countries), minlength=classes.count)
+        print(f"{scheme:<16} {country_time * 1000:8.2f} ms {unit_time * 1000:8.2f} ms   {counts.tolist()}")
+    visualizer.metric_classes('cases')
+    cached_time, _ = time_call(visualizer.metric_classes, 'cases', repeat=100)
+    print(f"cached breaks per (metric, data version): {cached_time * 1e6:.1f} us")
+    return True
+
+def benchmark_animation(data_dir, world_path='world.geojson', days=1100, figsize=(8, 5), dpi=80, legacy_frames=20):
+    """Compare a new figure and PNG file per date with streaming frames of one figure, and its memory over frame counts"""
+    visualizer = COVIDChoroplethMap()
+    visualizer.time_series = synthetic_time_series(countries=200, days=days)
+    visualizer.covid_data = visualizer.time_series.snapshot()
+    visualizer.world_data = gpd.read_file(world_path)
+    dates = visualizer.time_series.dates
+    print(f"{len(visualizer.time_series)} countries x {days} days, {figsize} at {dpi} dpi")
+    with tempfile.TemporaryDirectory() as directory:
+
+        def png_per_date():
+            for frame, date in enumerate(dates[-legacy_frames:]):
+                fig, _ = visualizer.create_choropleth_map('cases', 'Reds', figsize, date)
+                fig.savefig(os.path.join(directory, f'frame_{frame:04d}.png'), dpi=dpi)
+                plt.close(fig)
+
+        legacy_time, _ = time_call(png_per_date, repeat=1)
+        print(f"figure + PNG file per date: {legacy_frames / legacy_time:6.1f} fps ({legacy_frames} frames)")
+        path = os.path.join(directory, 'cases.gif')
+        count, seconds, fps = visualizer.animate_choropleth(path, 'cases', 'Reds', figsize, dpi, start=dates[-100])
+        print(f"streamed GIF:               {fps:6.1f} fps ({count} frames, {os.path.getsize(path) / 1e6:.1f} MB)")
+        # tracemalloc slows rendering; these runs only measure memory
+        peaks = []
+        for frames in [100, days]:
+            _, peak, (count, _, _) = peak_memory(visualizer.animate_choropleth, path, 'cases', 'Reds',
+                                                 figsize, dpi, start=dates[-frames])
+            peaks.append(peak)
+            print(f"streamed GIF, {count:>4} frames: peak traced memory {peak / 1e6:.1f} MB")
+    # Frames are streamed, so memory must not grow with their count (the values array grows by 8 bytes per cell)
+    return peaks[1] < 2 * peaks[0]
+
+def benchmark_render_cache(data_dir, rounds=3):
+    """Compare rendering the dashboard's chart endpoints in app.py cold with serving them from the render cache"""
+    client = dashboard.app.test_client()
+    urls = [f'/api/map/{data_type}' for data_type in ['cases', 'deaths', 'recovered', 'active']]
+    urls += ['/api/multiple_views', '/api/time_series']
+
+    def load_dashboard():
+        return [client.get(url).get_json() for url in urls]
+
+    dashboard.reload_covid_data()
+    cold_time, _ = time_call(load_dashboard, repeat=1)
+    cached_time, images = time_call(load_dashboard, repeat=rounds)
+    # New data: charts of the old version must not be served
+    dashboard.covid_data = synthetic_covid_data(dashboard.SAMPLE_COUNTRIES[:20], seed=1)
+    new_data_time, new_images = time_call(load_dashboard, repeat=1)
+    stats = dashboard.render_cache.stats()
+    print(f"{len(urls)} chart endpoints per dashboard load")
+    print(f"cold:      {cold_time * 1000:8.1f} ms")
+    print(f"cached:    {cached_time * 1000:8.1f} ms  ({cold_time / cached_time:.0f}x faster)")
+    print(f"new data:  {new_data_time * 1000:8.1f} ms")
+    print(f"render cache: {stats['entries']} images, {stats['bytes'] / 1024:.0f} KB, "
+          f"{stats['hits']} hits / {stats['misses']} misses")
+    return stats['entries'] == len(urls) and images != new_images
+
+BENCHMARKS = {
+    'jhu_ingestion': benchmark_jhu_ingestion,
+    'fetch_cache': benchmark_fetch_cache,
+    'jhu_concurrent': benchmark_jhu_concurrent,
+    'jhu_incremental': benchmark_jhu_incremental,
+    'snapshot': benchmark_snapshot,
+    'owid_streaming': benchmark_owid_streaming,
+    'country_table': benchmark_country_table,
+    'geometry_join': benchmark_geometry_join,
+    'choropleth_render': benchmark_choropleth_render,
+    'world_paths': benchmark_world_paths,
+    'simplification': benchmark_simplification,
+    'map_template': benchmark_map_template,
+    'batch_render': benchmark_batch_render,
+    'raster_render': benchmark_raster_render,
+    'vector_output': benchmark_vector_output,
+    'map_tiles': benchmark_map_tiles,
+    'classification': benchmark_classification,
+    'animation': benchmark_animation,
+    'render_cache': benchmark_render_cache
+}
+
+def main():
+    """Run a benchmark by name"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['save_jhu', 'save_owid', 'save_synthetic'])
+    parser.add_argument('--data-dir', default='benchmark_data',
+                        help='Directory holding saved copies of the upstream CSVs')
+    synthetic = parser.add_argument_group('save_synthetic options')
+    synthetic.add_argument('--countries', type=int, default=200)
+    synthetic.add_argument('--provinces', type=int, default=0, help='Provinces per country')
+    synthetic.add_argument('--counties', type=int, default=0, help='Counties per province')
+    synthetic.add_argument('--days', type=int, default=1100)
+    synthetic.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    if args.benchmark == 'save_jhu':
+        save_jhu_csvs(args.data_dir)
+        return 0
+    if args.benchmark == 'save_owid':
+        save_owid_history(args.data_dir)
+        return 0
+    if args.benchmark == 'save_synthetic':
+        save_synthetic_csvs(args.data_dir, args.countries, args.provinces, args.counties, args.days, args.seed)
+        return 0
+    return 0 if BENCHMARKS[args.benchmark](args.data_dir) is not False else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
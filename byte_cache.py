@@ -0,0 +1,75 @@
+"""
+Least-recently-used cache of encoded images and documents under a byte budget
+Thread-safe; counts hits and misses so callers can report how well it works
+"""
+
+import threading
+from collections import OrderedDict
+
+class ByteCache:
+    """LRU mapping of hashable keys to bytes (or str) whose total size stays within `budget` bytes
+
+    Values larger than the budget are not stored. Hold no lock of your own
+    around get() and put(): two threads missing the same key both render it,
+    and the second put() replaces the first.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.entries = OrderedDict()  # key -> value, least recently used first
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return the value of key and mark it recently used, or None"""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries beyond the budget"""
+        size = len(value)
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= len(self.entries.pop(key))
+            if size > self.budget:
+                return
+            self.entries[key] = value
+            self.nbytes += size
+            while self.nbytes > self.budget:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def discard(self, predicate):
+        """Remove every entry whose key satisfies predicate and return how many were removed"""
+        with self.lock:
+            keys = [key for key in self.entries if predicate(key)]
+            for key in keys:
+                self.nbytes -= len(self.entries.pop(key))
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Return entries, bytes, budget, hits, misses and hit rate as a dict"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self.entries), 'bytes': self.nbytes, 'budget': self.budget,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,147 @@
+"""
+Classification of metric values into color classes for the choropleth maps
+Breaks are computed with vectorized NumPy (Jenks by dynamic programming); classes map to colors through lookup tables
+"""
+
+import threading
+import numpy as np
+from matplotlib.colors import Normalize, BoundaryNorm, ListedColormap
+
+# 'linear' is the continuous min-max scale the maps used before classification
+SCHEMES = ['quantile', 'natural_breaks', 'log', 'equal_interval', 'linear']
+DEFAULT_SCHEME = 'quantile'
+DEFAULT_CLASS_COUNT = 7
+
+# Natural breaks run on at most this many order statistics of the values
+JENKS_SAMPLE = 1000
+
+def equal_interval_breaks(values, count):
+    return np.linspace(values.min(), values.max(), count + 1)
+
+def quantile_breaks(values, count):
+    return np.quantile(values, np.linspace(0, 1, count + 1))
+
+def log_breaks(values, count):
+    """Breaks evenly spaced in log scale between the smallest positive value and the maximum"""
+    positive = values[values > 0]
+    if not len(positive):
+        return equal_interval_breaks(values, count)
+    breaks = np.geomspace(positive.min(), positive.max(), count + 1)
+    breaks[0] = min(breaks[0], values.min())
+    return breaks
+
+def natural_breaks(values, count):
+    """Jenks natural breaks: the split into `count` runs of sorted values with the least within-class variance
+
+    Solved exactly by dynamic programming over the sorted values, one
+    vectorized (n + 1) x (n + 1) step per class. Above JENKS_SAMPLE values the
+    problem is solved on evenly spaced order statistics, which keeps the
+    distribution and bounds the work for thousands of sub-national units.
+    """
+    x = np.sort(values)
+    if len(x) > JENKS_SAMPLE:
+        x = x[np.linspace(0, len(x) - 1, JENKS_SAMPLE).round().astype(np.intp)]
+    count = min(count, len(np.unique(x)))
+    if count < 2:
+        return np.array([x[0], x[-1]])
+    n = len(x)
+    # Standardize so the sums of squares keep their precision for counts in the millions
+    scaled = (x - x.mean()) / (x.std() or 1.0)
+    sums = np.concatenate([[0.0], np.cumsum(scaled)])
+    squares = np.concatenate([[0.0], np.cumsum(scaled * scaled)])
+    # deviation[a, b]: squared deviation of the class x[a:b]
+    start = np.arange(n + 1)[:, None]
+    stop = np.arange(n + 1)[None, :]
+    size = stop - start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = squares[stop] - squares[start] - (sums[stop] - sums[start]) ** 2 / size
+    deviation[size <= 0] = np.inf
+    cost = deviation[0]  # best cost of x[:b] in one class
+    splits = []  # per extra class: best start of the last class of x[:b]
+    for _ in range(count - 1):
+        total = cost[:, None] + deviation
+        split = total.argmin(axis=0)
+        cost = total[split, np.arange(n + 1)]
+        splits.append(split)
+    # Walk back from the end: the last value of each class but the last is an upper edge
+    edges = []
+    stop = n
+    for split in reversed(splits):
+        stop = split[stop]
+        edges.append(x[stop - 1])
+    return np.concatenate([[x[0]], edges[::-1], [x[-1]]])
+
+BREAKS = {
+    'equal_interval': equal_interval_breaks,
+    'quantile': quantile_breaks,
+    'log': log_breaks,
+    'natural_breaks': natural_breaks
+}
+
+lookup_tables = {}  # (colormap name, class count) -> RGBA array
+lookup_tables_lock = threading.Lock()
+
+def class_colors(cmap, count):
+    """RGBA color of each of `count` classes, evenly spread over cmap; built once per colormap and count"""
+    key = (cmap.name, count)
+    with lookup_tables_lock:
+        table = lookup_tables.get(key)
+        if table is None:
+            table = cmap(np.linspace(0, 1, count)) if count > 1 else cmap(np.array([1.0]))
+            table.setflags(write=False)
+            lookup_tables[key] = table
+        return table
+
+class Classes:
+    """Class breaks of one metric and the mapping of values to classes and colors
+
+    breaks are ascending class edges: class i holds values in
+    (breaks[i], breaks[i + 1]], the first class includes the minimum. The
+    'linear' scheme has no classes; it colors values on a continuous min-max
+    scale.
+    """
+
+    def __init__(self, scheme, breaks):
+        self.scheme = scheme
+        self.breaks = np.asarray(breaks, dtype=np.float64)
+
+    @property
+    def count(self):
+        return len(self.breaks) - 1
+
+    def classify(self, values):
+        """Class index of each value"""
+        return np.searchsorted(self.breaks[1:-1], values, side='left')
+
+    def colors(self, values, cmap):
+        """RGBA color of each value"""
+        values = np.asarray(values, dtype=np.float64)
+        if self.scheme == 'linear':
+            return cmap(self.norm()(values))
+        return class_colors(cmap, self.count)[self.classify(values)]
+
+    def norm(self):
+        if self.scheme == 'linear':
+            return Normalize(self.breaks[0], self.breaks[-1])
+        return BoundaryNorm(self.breaks, self.count)
+
+    def colormap(self, cmap):
+        """Colormap for a colorbar that shows the classes with the colors of colors()"""
+        if self.scheme == 'linear':
+            return cmap
+        return ListedColormap(class_colors(cmap, self.count), name=f'{cmap.name}_{self.count}')
+
+def classify(values, scheme=DEFAULT_SCHEME, count=DEFAULT_CLASS_COUNT):
+    """Return the Classes of a scheme (one of SCHEMES) for values; NaN values are ignored
+
+    Schemes may return fewer classes than requested when values repeat.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown classification {scheme!r}, expected one of {', '.join(SCHEMES)}")
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return Classes(scheme, [0.0, 1.0])
+    if scheme == 'linear' or values.min() == values.max():
+        return Classes(scheme, [values.min(), max(values.max(), values.min() + 1)])
+    return Classes(scheme, np.unique(BREAKS[scheme](values, count)))
@@ -0,0 +1,129 @@
+"""
+ISO 3166-1 alpha-3 country codes used as the canonical join key
+Maps source spellings to ISO3 and ISO3 to integer category codes
+"""
+
+import numpy as np
+import pandas as pd
+
+# ISO3 code -> display name used in covid_data
+COUNTRIES = {
+    'AFG': 'Afghanistan', 'AGO': 'Angola', 'ALB': 'Albania', 'AND': 'Andorra',
+    'ARE': 'United Arab Emirates', 'ARG': 'Argentina', 'ARM': 'Armenia', 'ATA': 'Antarctica',
+    'ATF': 'French Southern and Antarctic Lands', 'ATG': 'Antigua and Barbuda', 'AUS': 'Australia',
+    'AUT': 'Austria', 'AZE': 'Azerbaijan', 'BDI': 'Burundi', 'BEL': 'Belgium', 'BEN': 'Benin',
+    'BFA': 'Burkina Faso', 'BGD': 'Bangladesh', 'BGR': 'Bulgaria', 'BHR': 'Bahrain', 'BHS': 'Bahamas',
+    'BIH': 'Bosnia and Herzegovina', 'BLR': 'Belarus', 'BLZ': 'Belize', 'BOL': 'Bolivia', 'BRA': 'Brazil',
+    'BRB': 'Barbados', 'BRN': 'Brunei', 'BTN': 'Bhutan', 'BWA': 'Botswana', 'CAF': 'Central African Republic',
+    'CAN': 'Canada', 'CHE': 'Switzerland', 'CHL': 'Chile', 'CHN': 'China', 'CIV': 'Ivory Coast',
+    'CMR': 'Cameroon', 'COD': 'Democratic Republic of the Congo', 'COG': 'Republic of the Congo',
+    'COL': 'Colombia', 'COM': 'Comoros', 'CPV': 'Cape Verde', 'CRI': 'Costa Rica', 'CUB': 'Cuba',
+    'CYP': 'Cyprus', 'CZE': 'Czech Republic', 'DEU': 'Germany', 'DJI': 'Djibouti', 'DMA': 'Dominica',
+    'DNK': 'Denmark', 'DOM': 'Dominican Republic', 'DZA': 'Algeria', 'ECU': 'Ecuador', 'EGY': 'Egypt',
+    'ERI': 'Eritrea', 'ESH': 'Western Sahara', 'ESP': 'Spain', 'EST': 'Estonia', 'ETH': 'Ethiopia',
+    'FIN': 'Finland', 'FJI': 'Fiji', 'FLK': 'Falkland Islands', 'FRA': 'France', 'FSM': 'Micronesia',
+    'GAB': 'Gabon', 'GBR': 'United Kingdom', 'GEO': 'Georgia', 'GHA': 'Ghana', 'GIN': 'Guinea',
+    'GMB': 'Gambia', 'GNB': 'Guinea-Bissau', 'GNQ': 'Equatorial Guinea', 'GRC': 'Greece', 'GRD': 'Grenada',
+    'GRL': 'Greenland', 'GTM': 'Guatemala', 'GUY': 'Guyana', 'HKG': 'Hong Kong', 'HND': 'Honduras',
+    'HRV': 'Croatia', 'HTI': 'Haiti', 'HUN': 'Hungary', 'IDN': 'Indonesia', 'IND': 'India', 'IRL': 'Ireland',
+    'IRN': 'Iran', 'IRQ': 'Iraq', 'ISL': 'Iceland', 'ISR': 'Israel', 'ITA': 'Italy', 'JAM': 'Jamaica',
+    'JOR': 'Jordan', 'JPN': 'Japan', 'KAZ': 'Kazakhstan', 'KEN': 'Kenya', 'KGZ': 'Kyrgyzstan',
+    'KHM': 'Cambodia', 'KIR': 'Kiribati', 'KNA': 'Saint Kitts and Nevis', 'KOR': 'South Korea',
+    'KWT': 'Kuwait', 'LAO': 'Laos', 'LBN': 'Lebanon', 'LBR': 'Liberia', 'LBY': 'Libya', 'LCA': 'Saint Lucia',
+    'LIE': 'Liechtenstein', 'LKA': 'Sri Lanka', 'LSO': 'Lesotho', 'LTU': 'Lithuania', 'LUX': 'Luxembourg',
+    'LVA': 'Latvia', 'MAC': 'Macau', 'MAR': 'Morocco', 'MCO': 'Monaco', 'MDA': 'Moldova', 'MDG': 'Madagascar',
+    'MDV': 'Maldives', 'MEX': 'Mexico', 'MHL': 'Marshall Islands', 'MKD': 'North Macedonia', 'MLI': 'Mali',
+    'MLT': 'Malta', 'MMR': 'Myanmar', 'MNE': 'Montenegro', 'MNG': 'Mongolia', 'MOZ': 'Mozambique',
+    'MRT': 'Mauritania', 'MUS': 'Mauritius', 'MWI': 'Malawi', 'MYS': 'Malaysia', 'NAM': 'Namibia',
+    'NCL': 'New Caledonia', 'NER': 'Niger', 'NGA': 'Nigeria', 'NIC': 'Nicaragua', 'NLD': 'Netherlands',
+    'NOR': 'Norway', 'NPL': 'Nepal', 'NRU': 'Nauru', 'NZL': 'New Zealand', 'OMN': 'Oman', 'PAK': 'Pakistan',
+    'PAN': 'Panama', 'PER': 'Peru', 'PHL': 'Philippines', 'PLW': 'Palau', 'PNG': 'Papua New Guinea',
+    'POL': 'Poland', 'PRI': 'Puerto Rico', 'PRK': 'North Korea', 'PRT': 'Portugal', 'PRY': 'Paraguay',
+    'PSE': 'Palestine', 'QAT': 'Qatar', 'ROU': 'Romania', 'RUS': 'Russia', 'RWA': 'Rwanda',
+    'SAU': 'Saudi Arabia', 'SDN': 'Sudan', 'SEN': 'Senegal', 'SGP': 'Singapore', 'SLB': 'Solomon Islands',
+    'SLE': 'Sierra Leone', 'SLV': 'El Salvador', 'SMR': 'San Marino', 'SOM': 'Somalia', 'SRB': 'Serbia',
+    'SSD': 'South Sudan', 'STP': 'Sao Tome and Principe', 'SUR': 'Suriname', 'SVK': 'Slovakia',
+    'SVN': 'Slovenia', 'SWE': 'Sweden', 'SWZ': 'Eswatini', 'SYC': 'Seychelles', 'SYR': 'Syria', 'TCD': 'Chad',
+    'TGO': 'Togo', 'THA': 'Thailand', 'TJK': 'Tajikistan', 'TKM': 'Turkmenistan', 'TLS': 'Timor-Leste',
+    'TON': 'Tonga', 'TTO': 'Trinidad and Tobago', 'TUN': 'Tunisia', 'TUR': 'Turkey', 'TUV': 'Tuvalu',
+    'TWN': 'Taiwan', 'TZA': 'Tanzania', 'UGA': 'Uganda', 'UKR': 'Ukraine', 'URY': 'Uruguay',
+    'USA': 'United States of America', 'UZB': 'Uzbekistan', 'VAT': 'Holy See',
+    'VCT': 'Saint Vincent and the Grenadines', 'VEN': 'Venezuela', 'VNM': 'Vietnam', 'VUT': 'Vanuatu',
+    'WSM': 'Samoa', 'XKX': 'Kosovo', 'YEM': 'Yemen', 'ZAF': 'South Africa', 'ZMB': 'Zambia', 'ZWE': 'Zimbabwe'
+}
+
+# Other spellings used by JHU, OWID and the world map layers
+NAME_ALIASES = {
+    'US': 'USA', 'USA': 'USA', 'United States': 'USA',
+    'UK': 'GBR', 'England': 'GBR',
+    'Korea, South': 'KOR', 'Korea, North': 'PRK',
+    'Russian Federation': 'RUS', 'Iran, Islamic Republic of': 'IRN', 'UAE': 'ARE',
+    'Czechia': 'CZE', 'Slovak Republic': 'SVK', 'Republic of Moldova': 'MDA',
+    'Macedonia': 'MKD', 'Bosnia': 'BIH', 'Republic of Serbia': 'SRB',
+    'Venezuela, Bolivarian Republic of': 'VEN', 'Bolivia, Plurinational State of': 'BOL',
+    'The Bahamas': 'BHS', 'Bahamas, The': 'BHS', 'Gambia, The': 'GMB',
+    'Taiwan*': 'TWN', 'Burma': 'MMR', 'Macao': 'MAC',
+    'Congo (Kinshasa)': 'COD', 'Congo (Brazzaville)': 'COG', 'Congo': 'COD',
+    "Cote d'Ivoire": 'CIV', 'Guinea Bissau': 'GNB', 'Cabo Verde': 'CPV', 'Swaziland': 'SWZ',
+    'United Republic of Tanzania': 'TZA', 'East Timor': 'TLS',
+    'West Bank and Gaza': 'PSE', 'West Bank': 'PSE', 'Palestine, State of': 'PSE'
+}
+
+# Non-standard codes found in source files
+CODE_ALIASES = {'OWID_KOS': 'XKX', 'SDS': 'SSD', 'OSA': 'XKX'}
+
+# Category order of the integer codes; -1 means no known country
+ISO3_CODES = pd.Index(sorted(COUNTRIES))
+
+NAME_TO_ISO3 = {**{name: code for code, name in COUNTRIES.items()}, **NAME_ALIASES}
+
+# Country name -> integer code and integer code -> display name
+NAME_TO_CODE = {name: ISO3_CODES.get_loc(code) for name, code in NAME_TO_ISO3.items()}
+DISPLAY_NAMES = np.array([COUNTRIES[code] for code in ISO3_CODES], dtype=object)
+
+def iso3_for_names(names):
+    """Return the ISO3 code of each country name as a Series (NaN if unknown)"""
+    names = pd.Series(names, dtype=object)
+    return names.map(NAME_TO_ISO3)
+
+def clean_iso3(codes):
+    """Return source ISO3 codes with known non-standard codes replaced"""
+    codes = pd.Series(codes, dtype=object)
+    return codes.replace(CODE_ALIASES)
+
+def encode_iso3(codes):
+    """Return int16 category codes of ISO3 strings; unknown or missing codes are -1"""
+    return pd.Categorical(clean_iso3(codes), categories=ISO3_CODES).codes.astype(np.int16)
+
+def encode_names(names):
+    """Return int16 category codes of country names; callers pass distinct names where possible"""
+    return np.fromiter((NAME_TO_CODE.get(name, -1) for name in names), dtype=np.int16, count=len(names))
+
+def decode(codes):
+    """Return the ISO3 strings of integer codes (None for -1)"""
+    codes = np.asarray(codes)
+    iso3 = np.asarray(ISO3_CODES, dtype=object)[np.maximum(codes, 0)]
+    return np.where(codes >= 0, iso3, None)
+
+def display_names(codes, fallback):
+    """Return the display name of each code, or the fallback name where the code is -1"""
+    codes = np.asarray(codes)
+    return np.where(codes >= 0, DISPLAY_NAMES[np.maximum(codes, 0)], np.asarray(fallback, dtype=object))
+
+def lookup_table(codes):
+    """Return an array mapping each integer code to the first position holding it (-1 if absent)
+
+    Joining another code array against it is a single fancy-indexing pass.
+    """
+    codes = np.asarray(codes)
+    table = np.full(len(ISO3_CODES) + 1, -1, dtype=np.int64)
+    valid = np.flatnonzero(codes >= 0)
+    # Assign in reverse so the first occurrence wins
+    table[codes[valid[::-1]]] = valid[::-1]
+    return table
+
+def join(left_codes, right_codes):
+    """Return, for each left code, the position of the same code in right_codes (-1 if none)"""
+    left_codes = np.asarray(left_codes)
+    positions = lookup_table(right_codes)[left_codes]
+    return np.where(left_codes >= 0, positions, -1)
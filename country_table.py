@@ -0,0 +1,216 @@
+"""
+Columnar per-country COVID-19 table
+One NumPy array per metric with a country-name index, exposed as a read-only mapping
+"""
+
+import hashlib
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+INT_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+def compact_dtype(values):
+    """Return the smallest integer dtype that holds values; other dtypes are kept"""
+    if values.dtype.kind not in 'iu' or len(values) == 0:
+        return values.dtype
+    low, high = values.min(), values.max()
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return values.dtype
+
+def compact(values):
+    """Downcast an integer array to its compact dtype"""
+    values = np.asarray(values)
+    return values.astype(compact_dtype(values), copy=False)
+
+class CountryRow(Mapping):
+    """Read-only view of one country's values in a CountryTable"""
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        column = self.table.columns[key]
+        if key in self.table.present and not self.table.present[key][self.row]:
+            raise KeyError(key)
+        return column[self.row].item()
+
+    def __iter__(self):
+        for key in self.table.columns:
+            if key not in self.table.present or self.table.present[key][self.row]:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class CountryTable(Mapping):
+    """Per-country metrics stored column-wise
+
+    Iterating, indexing and .items() behave like the former dict of per-country
+    dicts, but each row is a read-only view. Columns that only some countries
+    have carry a boolean mask in `present`. `codes` optionally holds the int16
+    ISO3 category code of each country (see country_codes), -1 if unknown.
+    """
+
+    def __init__(self, countries, columns, present=None, codes=None):
+        self.countries = pd.Index(countries)
+        self.columns = dict(columns)
+        self.present = dict(present or {})
+        self.codes = codes
+        self.row_lookup = None
+
+    @classmethod
+    def from_dict(cls, covid_data):
+        """Build a table from a dict of per-country dicts"""
+        countries = list(covid_data)
+        keys = []
+        for data in covid_data.values():
+            keys.extend(key for key in data if key not in keys)
+
+        columns, present = {}, {}
+        for key in keys:
+            mask = np.array([key in covid_data[country] for country in countries], dtype=bool)
+            values = [covid_data[country].get(key, 0) for country in countries]
+            if all(isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in values):
+                columns[key] = compact(np.array(values, dtype=np.int64))
+            else:
+                columns[key] = np.array(values, dtype=np.float64)
+            if not mask.all():
+                present[key] = mask
+        return cls(countries, columns, present)
+
+    @classmethod
+    def from_arrays(cls, countries, columns, present=None, codes=None):
+        """Build a table from per-metric arrays, downcasting integer columns"""
+        return cls(countries, {key: compact(values) for key, values in columns.items()}, present, codes)
+
+    @property
+    def row_of(self):
+        """Country name -> row position, built on first use"""
+        if self.row_lookup is None:
+            self.row_lookup = {country: i for i, country in enumerate(self.countries)}
+        return self.row_lookup
+
+    def __getitem__(self, country):
+        return CountryRow(self, self.row_of[country])
+
+    def __iter__(self):
+        return iter(self.countries)
+
+    def __len__(self):
+        return len(self.countries)
+
+    def __contains__(self, country):
+        return country in self.row_of
+
+    def __repr__(self):
+        return f"CountryTable({len(self)} countries, columns={list(self.columns)})"
+
+    def has(self, name):
+        return name in self.columns
+
+    def column(self, name):
+        """Return the array of a metric (values of countries lacking it are 0)"""
+        return self.columns[name]
+
+    def mask(self, name):
+        """Return which countries have a value for a metric"""
+        if name not in self.columns:
+            return np.zeros(len(self), dtype=bool)
+        return self.present.get(name, np.ones(len(self), dtype=bool))
+
+    def total(self, name):
+        """Sum of a metric over all countries as a Python number (0 if missing)"""
+        if name not in self.columns:
+            return 0
+        return self.columns[name][self.mask(name)].sum().item()
+
+    def positive_mask(self, name):
+        """Return which countries have a positive value for a metric"""
+        if name not in self.columns:
+            return np.zeros(len(self), dtype=bool)
+        return self.mask(name) & (self.columns[name] > 0)
+
+    def positive(self, name):
+        """Return (countries, values) of the countries with a positive value for a metric"""
+        if name not in self.columns:
+            return self.countries[:0], np.array([])
+        keep = self.positive_mask(name)
+        return self.countries[keep], self.columns[name][keep]
+
+    def top(self, name, n=10):
+        """Return the n (country, value) pairs with the largest values, largest first"""
+        if name not in self.columns:
+            return []
+        rows = np.flatnonzero(self.mask(name))
+        values = self.columns[name][rows]
+        keys = -values.astype(np.int64 if values.dtype.kind in 'iu' else np.float64)
+        candidates = np.arange(len(rows))
+        if n < len(rows):
+            # Keep everything tied with the n-th value so ties resolve like a stable sort
+            threshold = np.partition(keys, n - 1)[n - 1]
+            candidates = np.flatnonzero(keys <= threshold)
+        best = candidates[np.lexsort((candidates, keys[candidates]))][:n]
+        return [(self.countries[rows[i]], values[i].item()) for i in best]
+
+    def select(self, keep):
+        """Return a table with the rows selected by a boolean mask or positions"""
+        return CountryTable(self.countries[keep],
+                            {key: values[keep] for key, values in self.columns.items()},
+                            {key: mask[keep] for key, mask in self.present.items()},
+                            None if self.codes is None else self.codes[keep])
+
+    def with_column(self, name, values, present=None):
+        """Return a table sharing this table's columns plus one new or replaced column"""
+        table = CountryTable(self.countries, self.columns, self.present, self.codes)
+        table.columns[name] = values
+        table.present.pop(name, None)
+        if present is not None and not np.all(present):
+            table.present[name] = present
+        table.row_lookup = self.row_lookup
+        return table
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column and mask arrays"""
+        return sum(values.nbytes for values in self.columns.values()) + \
+            sum(mask.nbytes for mask in self.present.values()) + \
+            (0 if self.codes is None else self.codes.nbytes)
+
+    def fingerprint(self):
+        """Short hex digest of the countries, codes, columns and masks; equal tables give equal digests"""
+        digest = hashlib.sha1()
+        digest.update('\0'.join(map(str, self.countries)).encode())
+        arrays = [('codes', self.codes)] if self.codes is not None else []
+        arrays += sorted(self.columns.items()) + [(f'present:{key}', mask) for key, mask in sorted(self.present.items())]
+        for name, values in arrays:
+            values = np.ascontiguousarray(values)
+            digest.update(f'{name}:{values.dtype.str}'.encode())
+            digest.update(values.tobytes() if values.dtype != object else repr(values.tolist()).encode())
+        return digest.hexdigest()[:16]
+
+    def to_dict(self):
+        """Return the data as a dict of per-country dicts"""
+        return {country: dict(self[country]) for country in self.countries}
+
+    def to_frame(self):
+        """Return the data as a DataFrame indexed by country (missing values as NaN)"""
+        frame = pd.DataFrame(self.columns, index=self.countries)
+        for key, mask in self.present.items():
+            frame[key] = frame[key].where(mask)
+        return frame
+
+def as_country_table(covid_data):
+    """Return covid_data as a CountryTable, converting a plain dict if needed"""
+    if covid_data is None or isinstance(covid_data, CountryTable):
+        return covid_data
+    return CountryTable.from_dict(covid_data)
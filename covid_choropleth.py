@@ -10,405 +10,338 @@ import pandas as pd
 import numpy as np
 import requests
 import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import geopandas as gpd
 from shapely.geometry import Point
 import warnings
+from timeseries_store import TimeSeriesStore, read_owid_chunks
+from fetch_cache import FetchCache, DEFAULT_CACHE_DIR
+import snapshot
+from data_sources import SourceRegistry
+from country_table import CountryTable, as_country_table
+from synthetic_data import synthetic_covid_data, DEFAULT_SEED
+from geometry_index import GeometryIndex
+from map_render import WorldPaths, colored_rows, row_facecolors
+from raster_map import RasterMap
+from vector_map import VectorMap
+from classification import classify, DEFAULT_SCHEME, DEFAULT_CLASS_COUNT
+from map_tiles import TileRenderer, MAX_ZOOM, TILE_CACHE_BYTES, valid_tile, row_colors
+from byte_cache import ByteCache
+from map_template import MapPanel, MapTemplate, colormap
+from batch_render import render_batch, print_report
+from map_animation import write_animation, country_row_pairs
+from country_codes import COUNTRIES, NAME_TO_ISO3, encode_iso3, encode_names, display_names
 warnings.filterwarnings('ignore')
 
+# JHU CSSE GitHub repository
+JHU_BASE_URL = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series"
+JHU_CONFIRMED_URL = f"{JHU_BASE_URL}/time_series_covid19_confirmed_global.csv"
+JHU_DEATHS_URL = f"{JHU_BASE_URL}/time_series_covid19_deaths_global.csv"
+JHU_RECOVERED_URL = f"{JHU_BASE_URL}/time_series_covid19_recovered_global.csv"
+JHU_URLS = {
+    'confirmed': JHU_CONFIRMED_URL,
+    'deaths': JHU_DEATHS_URL,
+    'recovered': JHU_RECOVERED_URL
+}
+
+# Our World in Data GitHub repository
+OWID_LATEST_URL = "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/latest/owid-covid-latest.csv"
+OWID_HISTORY_URL = "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/owid-covid-data.csv"
+
+# MapPanel options of the four small maps in the multiple views
+MULTIPLE_VIEW_PANEL = {'linewidth': 0.3, 'marker_size': 50, 'fontsize': 10, 'format_ticks': True}
+
 class COVIDChoroplethMap:
-    def __init__(self):
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
         self.covid_data = None
         self.world_data = None
+        self.geometry_index = None
+        self.world_paths = None
+        self.map_templates = {}  # (kind, figsize) -> MapTemplate
+        self.raster_maps = {}  # width -> RasterMap
+        self.vector_maps = {}  # width -> VectorMap
+        self.tile_renderer = None
+        self.tile_cache = ByteCache(TILE_CACHE_BYTES)  # tile_colors key + (z, x, y) -> PNG
+        self.tile_colors = {}  # (metric, color scheme, classification, class count, data version) -> RGBA per row
+        self.data_fingerprint = (None, None)  # (covid_data, its fingerprint)
+        self.classification = DEFAULT_SCHEME  # see classification.SCHEMES
+        self.class_count = DEFAULT_CLASS_COUNT
+        self.class_breaks = {}  # (metric, scheme, class count, date, data version) -> Classes
+        self.lock = threading.Lock()  # guards tile_colors and class_breaks, read and filled by web threads
+        self.unresolved_countries = []
+        self.time_series = None
+        self.fetch_cache = FetchCache(cache_dir)
+        self.fetch_timings = {}
+        self.snapshot_version = None
+        self.data_source = None
+        self.source_report = None
         self.country_mapping = {}
         self.setup_country_mapping()
+        self.setup_data_sources()
         
     def setup_country_mapping(self):
-        """Map country names between different data sources"""
-        self.country_mapping = {
-            'US': 'United States of America',
-            'USA': 'United States of America',
-            'United States': 'United States of America',
-            'UK': 'United Kingdom',
-            'United Kingdom': 'United Kingdom',
-            'South Korea': 'South Korea',
-            'Korea, South': 'South Korea',
-            'Russia': 'Russia',
-            'Russian Federation': 'Russia',
-            'Iran': 'Iran',
-            'Iran, Islamic Republic of': 'Iran',
-            'UAE': 'United Arab Emirates',
-            'United Arab Emirates': 'United Arab Emirates',
-            'Czech Republic': 'Czech Republic',
-            'Czechia': 'Czech Republic',
-            'Slovakia': 'Slovakia',
-            'Slovak Republic': 'Slovakia',
-            'Moldova': 'Moldova',
-            'Republic of Moldova': 'Moldova',
-            'North Macedonia': 'North Macedonia',
-            'Macedonia': 'North Macedonia',
-            'Bosnia and Herzegovina': 'Bosnia and Herzegovina',
-            'Bosnia': 'Bosnia and Herzegovina',
-            'Venezuela': 'Venezuela',
-            'Venezuela, Bolivarian Republic of': 'Venezuela',
-            'Bolivia': 'Bolivia',
-            'Bolivia, Plurinational State of': 'Bolivia',
-            'Dominican Republic': 'Dominican Republic',
-            'Honduras': 'Honduras',
-            'Guatemala': 'Guatemala',
-            'Costa Rica': 'Costa Rica',
-            'Panama': 'Panama',
-            'El Salvador': 'El Salvador',
-            'Nicaragua': 'Nicaragua',
-            'Jamaica': 'Jamaica',
-            'Haiti': 'Haiti',
-            'Cuba': 'Cuba',
-            'Trinidad and Tobago': 'Trinidad and Tobago',
-            'Barbados': 'Barbados',
-            'Bahamas': 'Bahamas',
-            'Belize': 'Belize',
-            'Guyana': 'Guyana',
-            'Suriname': 'Suriname',
-            'Paraguay': 'Paraguay',
-            'Uruguay': 'Uruguay',
-            'Chile': 'Chile',
-            'Peru': 'Peru',
-            'Ecuador': 'Ecuador',
-            'Colombia': 'Colombia',
-            'Brazil': 'Brazil',
-            'Argentina': 'Argentina',
-            'China': 'China',
-            'Japan': 'Japan',
-            'India': 'India',
-            'Indonesia': 'Indonesia',
-            'Thailand': 'Thailand',
-            'Vietnam': 'Vietnam',
-            'Philippines': 'Philippines',
-            'Malaysia': 'Malaysia',
-            'Singapore': 'Singapore',
-            'Myanmar': 'Myanmar',
-            'Cambodia': 'Cambodia',
-            'Laos': 'Laos',
-            'Bangladesh': 'Bangladesh',
-            'Pakistan': 'Pakistan',
-            'Sri Lanka': 'Sri Lanka',
-            'Nepal': 'Nepal',
-            'Bhutan': 'Bhutan',
-            'Maldives': 'Maldives',
-            'Afghanistan': 'Afghanistan',
-            'Kazakhstan': 'Kazakhstan',
-            'Uzbekistan': 'Uzbekistan',
-            'Kyrgyzstan': 'Kyrgyzstan',
-            'Tajikistan': 'Tajikistan',
-            'Turkmenistan': 'Turkmenistan',
-            'Mongolia': 'Mongolia',
-            'North Korea': 'North Korea',
-            'Korea, North': 'North Korea',
-            'Taiwan': 'Taiwan',
-            'Taiwan*': 'Taiwan',
-            'Hong Kong': 'Hong Kong',
-            'Macau': 'Macau',
-            'Macao': 'Macau',
-            'Australia': 'Australia',
-            'New Zealand': 'New Zealand',
-            'Papua New Guinea': 'Papua New Guinea',
-            'Fiji': 'Fiji',
-            'Samoa': 'Samoa',
-            'Tonga': 'Tonga',
-            'Vanuatu': 'Vanuatu',
-            'Solomon Islands': 'Solomon Islands',
-            'Palau': 'Palau',
-            'Micronesia': 'Micronesia',
-            'Marshall Islands': 'Marshall Islands',
-            'Kiribati': 'Kiribati',
-            'Tuvalu': 'Tuvalu',
-            'Nauru': 'Nauru',
-            'Germany': 'Germany',
-            'France': 'France',
-            'Italy': 'Italy',
-            'Spain': 'Spain',
-            'Netherlands': 'Netherlands',
-            'Belgium': 'Belgium',
-            'Switzerland': 'Switzerland',
-            'Austria': 'Austria',
-            'Sweden': 'Sweden',
-            'Norway': 'Norway',
-            'Denmark': 'Denmark',
-            'Finland': 'Finland',
-            'Iceland': 'Iceland',
-            'Ireland': 'Ireland',
-            'Portugal': 'Portugal',
-            'Greece': 'Greece',
-            'Turkey': 'Turkey',
-            'Poland': 'Poland',
-            'Ukraine': 'Ukraine',
-            'Romania': 'Romania',
-            'Bulgaria': 'Bulgaria',
-            'Hungary': 'Hungary',
-            'Slovenia': 'Slovenia',
-            'Croatia': 'Croatia',
-            'Serbia': 'Serbia',
-            'Montenegro': 'Montenegro',
-            'Albania': 'Albania',
-            'Kosovo': 'Kosovo',
-            'Estonia': 'Estonia',
-            'Latvia': 'Latvia',
-            'Lithuania': 'Lithuania',
-            'Belarus': 'Belarus',
-            'Luxembourg': 'Luxembourg',
-            'Malta': 'Malta',
-            'Cyprus': 'Cyprus',
-            'Israel': 'Israel',
-            'Palestine': 'Palestine',
-            'Jordan': 'Jordan',
-            'Lebanon': 'Lebanon',
-            'Syria': 'Syria',
-            'Iraq': 'Iraq',
-            'Saudi Arabia': 'Saudi Arabia',
-            'Kuwait': 'Kuwait',
-            'Qatar': 'Qatar',
-            'Bahrain': 'Bahrain',
-            'Oman': 'Oman',
-            'Yemen': 'Yemen',
-            'Egypt': 'Egypt',
-            'Libya': 'Libya',
-            'Tunisia': 'Tunisia',
-            'Algeria': 'Algeria',
-            'Morocco': 'Morocco',
-            'Sudan': 'Sudan',
-            'South Sudan': 'South Sudan',
-            'Ethiopia': 'Ethiopia',
-            'Eritrea': 'Eritrea',
-            'Djibouti': 'Djibouti',
-            'Somalia': 'Somalia',
-            'Kenya': 'Kenya',
-            'Uganda': 'Uganda',
-            'Tanzania': 'Tanzania',
-            'Rwanda': 'Rwanda',
-            'Burundi': 'Burundi',
-            'Madagascar': 'Madagascar',
-            'Mauritius': 'Mauritius',
-            'Seychelles': 'Seychelles',
-            'Comoros': 'Comoros',
-            'Malawi': 'Malawi',
-            'Zambia': 'Zambia',
-            'Zimbabwe': 'Zimbabwe',
-            'Botswana': 'Botswana',
-            'Namibia': 'Namibia',
-            'South Africa': 'South Africa',
-            'Lesotho': 'Lesotho',
-            'Swaziland': 'Eswatini',
-            'Eswatini': 'Eswatini',
-            'Mozambique': 'Mozambique',
-            'Angola': 'Angola',
-            'Democratic Republic of the Congo': 'Democratic Republic of the Congo',
-            'Congo': 'Democratic Republic of the Congo',
-            'Central African Republic': 'Central African Republic',
-            'Chad': 'Chad',
-            'Niger': 'Niger',
-            'Nigeria': 'Nigeria',
-            'Benin': 'Benin',
-            'Togo': 'Togo',
-            'Ghana': 'Ghana',
-            'Burkina Faso': 'Burkina Faso',
-            'Mali': 'Mali',
-            'Senegal': 'Senegal',
-            'Gambia': 'Gambia',
-            'Guinea-Bissau': 'Guinea-Bissau',
-            'Guinea': 'Guinea',
-            'Sierra Leone': 'Sierra Leone',
-            'Liberia': 'Liberia',
-            'Ivory Coast': 'Ivory Coast',
-            'Cote d\'Ivoire': 'Ivory Coast',
-            'Cameroon': 'Cameroon',
-            'Equatorial Guinea': 'Equatorial Guinea',
-            'Gabon': 'Gabon',
-            'Sao Tome and Principe': 'Sao Tome and Principe',
-            'Cape Verde': 'Cape Verde',
-            'Canada': 'Canada',
-            'Mexico': 'Mexico'
-        }
-
-    def fetch_covid_data(self, source='jhu'):
-        """Fetch COVID-19 data from online sources"""
+        """Map source country names to display names through their ISO3 codes"""
+        self.country_mapping = {name: COUNTRIES[code] for name, code in NAME_TO_ISO3.items()}
+
+    def setup_data_sources(self):
+        """Register the data sources; lower priority numbers are tried first"""
+        self.sources = SourceRegistry()
+        self.sources.register('jhu', self.fetch_jhu_data, priority=10, timeout=120,
+                              refresh=lambda: self.fetch_jhu_data(incremental=True))
+        self.sources.register('owid', self.fetch_owid_data, priority=20, timeout=120)
+        self.sources.register('owid_history', self.fetch_owid_history, priority=25, timeout=300)
+        self.sources.register('snapshot', self.load_snapshot, priority=30, timeout=30)
+        self.sources.register('sample', self.fetch_sample_data, priority=1000, timeout=10)
+
+    def fetch_covid_data(self, source='jhu', race=False, allow_sample=False, incremental=False):
+        """Fetch COVID-19 data from one source, a list of sources or all of them (None)
+        
+        Sources are tried by priority, or raced concurrently with race=True. Sample
+        data is only returned when source is 'sample' or allow_sample is set.
+        With incremental=True, JHU only appends the dates after the loaded history.
+        Only the accepted source's time series (None for sources without
+        history) replaces self.time_series. Raises DataSourceError if no source
+        answered.
+        """
         print("Fetching COVID-19 data...")
         
-        if source == 'jhu':
-            return self.fetch_jhu_data()
-        elif source == 'owid':
-            return self.fetch_owid_data()
-        else:
-            return self.fetch_sample_data()
+        report = self.sources.fetch(source, race=race, allow_sample=allow_sample, incremental=incremental)
+        self.data_source = report['source']
+        self.source_report = report
+        self.time_series = report['time_series']
+        if report['source'] == 'snapshot':
+            self.snapshot_version = snapshot.latest_version(snapshot.DEFAULT_SNAPSHOT_DIR)
+        return report['data']
+
+    def refresh(self, source='jhu', allow_sample=False):
+        """Fetch the latest data into self.covid_data, parsing only the dates after the loaded history"""
+        self.covid_data = self.fetch_covid_data(source, allow_sample=allow_sample, incremental=True)
+        return self.covid_data
 
-    def fetch_jhu_data(self):
-        """Fetch data from Johns Hopkins University CSSE"""
+    def fetch_jhu_data(self, incremental=False):
+        """Fetch data from Johns Hopkins University CSSE and return (covid_data, time_series)
+        
+        With incremental=True and history already loaded, only the dates after the
+        last ingested one are appended, to a copy of self.time_series, and only
+        revised countries are reprocessed. The loaded store is never changed, so
+        a fetch that loses a race or times out leaves it as it was.
+        """
         try:
-            # JHU CSSE GitHub repository
-            url = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv"
-            
-            # Fetch confirmed cases
-            confirmed_df = pd.read_csv(url)
-            
-            # Get the latest date (last column)
-            latest_date = confirmed_df.columns[-1]
+            loaded = self.time_series
+            frames = self.fetch_jhu_frames()
+            confirmed_df, deaths_df, recovered_df = frames['confirmed'], frames['deaths'], frames['recovered']
             
-            # Process the data
-            covid_data = {}
-            for _, row in confirmed_df.iterrows():
-                country = row['Country/Region']
-                province = row['Province/State']
-                lat = row['Lat']
-                lon = row['Long']
-                cases = row[latest_date]
-                
-                # Standardize country name
-                country_std = self.country_mapping.get(country, country)
-                
-                if country_std not in covid_data:
-                    covid_data[country_std] = {
-                        'cases': 0,
-                        'deaths': 0,
-                        'recovered': 0,
-                        'lat': lat,
-                        'lon': lon,
-                        'population': 0
-                    }
-                
-                covid_data[country_std]['cases'] += cases
+            covid_data = self.process_jhu_frames(confirmed_df, deaths_df, recovered_df)
             
-            # Fetch deaths data
-            deaths_url = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv"
-            deaths_df = pd.read_csv(deaths_url)
+            # Keep the full daily history for time series and date-specific maps
+            if incremental and loaded is not None:
+                time_series = self.update_time_series(loaded, confirmed_df, deaths_df, recovered_df)
+            else:
+                time_series = TimeSeriesStore.from_jhu_frames(
+                    confirmed_df, deaths_df, recovered_df, self.standardize_countries)
             
-            for _, row in deaths_df.iterrows():
-                country = row['Country/Region']
-                deaths = row[latest_date]
-                country_std = self.country_mapping.get(country, country)
-                
-                if country_std in covid_data:
-                    covid_data[country_std]['deaths'] += deaths
+            print(f"Successfully fetched data for {len(covid_data)} countries")
+            return covid_data, time_series
             
-            # Fetch recovered data
-            recovered_url = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_recovered_global.csv"
+        except Exception as e:
+            print(f"Error fetching JHU data: {e}")
+            raise
+
+    def fetch_jhu_frames(self, urls=None, max_workers=3):
+        """Download and parse the JHU time-series files concurrently
+        
+        Returns a dict of frames keyed like JHU_URLS. A failed recovered fetch
+        yields None so the caller can estimate it; any other failure is raised.
+        Per-file timings are kept in self.fetch_timings.
+        """
+        urls = urls or JHU_URLS
+        self.fetch_timings = {}
+        
+        def load(name):
+            start = time.perf_counter()
             try:
-                recovered_df = pd.read_csv(recovered_url)
-                
-                for _, row in recovered_df.iterrows():
-                    country = row['Country/Region']
-                    recovered = row[latest_date]
-                    country_std = self.country_mapping.get(country, country)
-                    
-                    if country_std in covid_data:
-                        covid_data[country_std]['recovered'] += recovered
+                return self.fetch_cache.read_csv(urls[name])
+            finally:
+                self.fetch_timings[name] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {name: pool.submit(load, name) for name in urls}
+        
+        frames = {}
+        for name, future in futures.items():
+            try:
+                frames[name] = future.result()
+            except Exception as e:
+                if name != 'recovered':
+                    raise
+                print(f"Warning: Could not fetch recovered data: {e}")
+                frames[name] = None
+        self.fetch_timings['total'] = time.perf_counter() - start
+        
+        timings = ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.fetch_timings.items())
+        print(f"JHU fetch timings: {timings}")
+        return frames
+
+    def update_time_series(self, store, confirmed_df, deaths_df, recovered_df=None):
+        """Return a copy of store with the new JHU dates appended, or a rebuilt store if they don't line up"""
+        store = store.copy()
+        try:
+            update = store.update_from_jhu_frames(
+                confirmed_df, deaths_df, recovered_df, self.standardize_countries)
+        except ValueError as e:
+            print(f"Warning: Incremental update not possible ({e}), rebuilding time series...")
+            return TimeSeriesStore.from_jhu_frames(
+                confirmed_df, deaths_df, recovered_df, self.standardize_countries)
+        
+        print(f"Appended {update['new_dates']} new dates, "
+              f"{len(update['added_countries'])} new and {len(update['revised_countries'])} revised countries")
+        if update['revised_countries']:
+            print(f"Revised upstream: {', '.join(update['revised_countries'])}")
+        return store
+
+    def standardize_countries(self, countries):
+        """Map a Series of source country names to display names via their ISO3 codes"""
+        # Resolve each distinct name once
+        positions, names = pd.factorize(countries)
+        names = np.asarray(names, dtype=object)
+        return pd.Series(display_names(encode_names(names), names)[positions], index=countries.index)
+
+    def sum_jhu_column(self, df, date_column):
+        """Sum one date column of a JHU time-series frame per standardized country"""
+        countries = self.standardize_countries(df['Country/Region'])
+        return df[date_column].groupby(countries, sort=False).sum()
+
+    def process_jhu_frames(self, confirmed_df, deaths_df, recovered_df=None):
+        """Aggregate JHU time-series frames into the per-country covid_data table"""
+        # Get the latest date (last column)
+        latest_date = confirmed_df.columns[-1]
+        
+        # Country order, lat and lon come from the first row of each country
+        countries = self.standardize_countries(confirmed_df['Country/Region'])
+        first_rows = confirmed_df.loc[~countries.duplicated().to_numpy(), ['Lat', 'Long']]
+        index = pd.Index(countries[first_rows.index])
+        
+        cases = self.sum_jhu_column(confirmed_df, latest_date).reindex(index)
+        deaths = self.sum_jhu_column(deaths_df, latest_date).reindex(index, fill_value=0)
+        
+        recovered = None
+        if recovered_df is not None:
+            try:
+                recovered = self.sum_jhu_column(recovered_df, latest_date).reindex(index, fill_value=0)
                 print("Successfully loaded recovered data")
             except Exception as e:
                 print(f"Warning: Could not fetch recovered data: {e}")
-                print("Estimating recovered cases as 90% of cases...")
-                # Estimate recovered cases as 90% of total cases (common recovery rate)
-                for country in covid_data:
-                    covid_data[country]['recovered'] = int(covid_data[country]['cases'] * 0.9)
-            
-            # Calculate active cases and fix recovered data if needed
-            for country in covid_data:
-                # If recovered is 0, estimate it
-                if covid_data[country]['recovered'] == 0 and covid_data[country]['cases'] > 0:
-                    covid_data[country]['recovered'] = int(covid_data[country]['cases'] * 0.9)
-                
-                covid_data[country]['active'] = max(0, 
-                    covid_data[country]['cases'] - 
-                    covid_data[country]['deaths'] - 
-                    covid_data[country]['recovered']
-                )
-            
-            print(f"Successfully fetched data for {len(covid_data)} countries")
-            return covid_data
-            
-        except Exception as e:
-            print(f"Error fetching JHU data: {e}")
-            return self.fetch_sample_data()
+        
+        cases = cases.to_numpy()
+        deaths = deaths.to_numpy()
+        if recovered is None:
+            print("Estimating recovered cases as 90% of cases...")
+            # Estimate recovered cases as 90% of total cases (common recovery rate)
+            recovered = (cases * 0.9).astype(np.int64)
+        else:
+            recovered = recovered.to_numpy()
+            # If recovered is 0, estimate it
+            missing = (recovered == 0) & (cases > 0)
+            recovered = np.where(missing, (cases * 0.9).astype(np.int64), recovered)
+        
+        active = np.maximum(0, cases - deaths - recovered)
+        
+        return CountryTable.from_arrays(index, codes=encode_names(index), columns={
+            'cases': cases,
+            'deaths': deaths,
+            'recovered': recovered,
+            'lat': first_rows['Lat'].to_numpy(dtype=np.float64),
+            'lon': first_rows['Long'].to_numpy(dtype=np.float64),
+            'population': np.zeros(len(index), dtype=np.int64),
+            'active': active
+        })
 
     def fetch_owid_data(self):
-        """Fetch data from Our World in Data"""
+        """Fetch the latest data from Our World in Data and return (covid_data, None)"""
         try:
-            url = "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/latest/owid-covid-latest.csv"
-            df = pd.read_csv(url)
+            df = self.fetch_cache.read_csv(OWID_LATEST_URL)
             
-            covid_data = {}
-            for _, row in df.iterrows():
-                country = row['location']
-                country_std = self.country_mapping.get(country, country)
-                
-                cases = int(row['total_cases']) if pd.notna(row['total_cases']) else 0
-                deaths = int(row['total_deaths']) if pd.notna(row['total_deaths']) else 0
-                population = int(row['population']) if pd.notna(row['population']) else 0
-                
-                # Calculate recovered and active cases
-                # If we have total cases and deaths, estimate recovered as 90% of cases
-                recovered = int(cases * 0.9) if cases > 0 else 0
-                active = max(0, cases - deaths - recovered)
-                
-                covid_data[country_std] = {
-                    'cases': cases,
-                    'deaths': deaths,
-                    'recovered': recovered,
-                    'active': active,
-                    'population': population,
-                    'lat': 0,  # OWID doesn't provide coordinates
-                    'lon': 0
-                }
-                
-                # Calculate per capita metrics
-                if covid_data[country_std]['population'] > 0:
-                    covid_data[country_std]['cases_per_million'] = (covid_data[country_std]['cases'] / covid_data[country_std]['population']) * 1000000
-                    covid_data[country_std]['deaths_per_million'] = (covid_data[country_std]['deaths'] / covid_data[country_std]['population']) * 1000000
-                else:
-                    covid_data[country_std]['cases_per_million'] = 0
-                    covid_data[country_std]['deaths_per_million'] = 0
+            # ISO3 is the country key; aggregates like OWID_WRL get no code and keep their name
+            codes = encode_iso3(df['iso_code'])
+            countries = pd.Series(display_names(codes, df['location']), index=df.index)
+            # A later row for the same country replaces the earlier one
+            first_position = pd.Series(np.arange(len(df)), index=countries.to_numpy()).groupby(level=0).first()
+            keep = ~countries.duplicated(keep='last').to_numpy()
+            order = np.argsort(first_position.loc[countries[keep].to_numpy()].to_numpy(), kind='stable')
+            df = df[keep].iloc[order]
             
-            print(f"Successfully fetched OWID data for {len(covid_data)} countries")
-            return covid_data
+            cases = df['total_cases'].fillna(0).to_numpy(dtype=np.int64)
+            deaths = df['total_deaths'].fillna(0).to_numpy(dtype=np.int64)
+            population = df['population'].fillna(0).to_numpy(dtype=np.int64)
             
-        except Exception as e:
-            print(f"Error fetching OWID data: {e}")
-            return self.fetch_sample_data()
-
-    def fetch_sample_data(self):
-        """Generate sample data for demonstration"""
-        print("Using sample data for demonstration...")
-        
-        countries = [
-            'United States of America', 'China', 'India', 'Brazil', 'Russia',
-            'United Kingdom', 'France', 'Germany', 'Italy', 'Spain',
-            'Canada', 'Australia', 'Japan', 'South Korea', 'Mexico',
-            'Argentina', 'Chile', 'Colombia', 'Peru', 'South Africa',
-            'Egypt', 'Nigeria', 'Kenya', 'Morocco', 'Algeria',
-            'Saudi Arabia', 'Turkey', 'Iran', 'Iraq', 'Israel',
-            'Thailand', 'Vietnam', 'Indonesia', 'Malaysia', 'Philippines',
-            'Poland', 'Ukraine', 'Romania', 'Czech Republic', 'Hungary',
-            'Netherlands', 'Belgium', 'Switzerland', 'Austria', 'Sweden',
-            'Norway', 'Denmark', 'Finland', 'Portugal', 'Greece'
-        ]
-
-        covid_data = {}
-        for country in countries:
-            cases = np.random.randint(10000, 10000000)
-            deaths = int(cases * np.random.uniform(0.01, 0.05))
-            recovered = int(cases * np.random.uniform(0.7, 0.9))
-            population = np.random.randint(1000000, 1000000000)
+            # Calculate recovered and active cases
+            # If we have total cases and deaths, estimate recovered as 90% of cases
+            recovered = np.where(cases > 0, (cases * 0.9).astype(np.int64), 0)
+            active = np.maximum(0, cases - deaths - recovered)
+            
+            # Calculate per capita metrics
+            has_population = population > 0
+            safe_population = np.where(has_population, population, 1)
             
-            covid_data[country] = {
+            covid_data = CountryTable.from_arrays(countries[keep].iloc[order].to_numpy(), codes=codes[keep][order], columns={
                 'cases': cases,
                 'deaths': deaths,
                 'recovered': recovered,
-                'active': cases - deaths - recovered,
+                'active': active,
                 'population': population,
-                'cases_per_million': (cases / population) * 1000000,
-                'deaths_per_million': (deaths / population) * 1000000,
-                'lat': np.random.uniform(-60, 60),
-                'lon': np.random.uniform(-180, 180)
-            }
+                'lat': np.zeros(len(df), dtype=np.int64),  # OWID doesn't provide coordinates
+                'lon': np.zeros(len(df), dtype=np.int64),
+                'cases_per_million': np.where(has_population, cases / safe_population * 1000000, 0.0),
+                'deaths_per_million': np.where(has_population, deaths / safe_population * 1000000, 0.0)
+            })
+            
+            print(f"Successfully fetched OWID data for {len(covid_data)} countries")
+            return covid_data, None
+            
+        except Exception as e:
+            print(f"Error fetching OWID data: {e}")
+            raise
 
-        return covid_data
+    def save_snapshot(self, directory=snapshot.DEFAULT_SNAPSHOT_DIR, source=None):
+        """Save covid_data and the time series as a new binary snapshot version"""
+        version = snapshot.save_snapshot(directory, self.covid_data, self.time_series, source)
+        self.snapshot_version = version
+        print(f"Saved snapshot {version} to {directory}")
+        return version
+
+    def load_snapshot(self, directory=snapshot.DEFAULT_SNAPSHOT_DIR, version=None):
+        """Return (covid_data, time_series) of a saved snapshot instead of the network (arrays are memory-mapped)"""
+        try:
+            covid_data, time_series, manifest = snapshot.load_snapshot(directory, version)
+            print(f"Loaded snapshot {manifest['version']} with data for {len(covid_data)} countries")
+            return covid_data, time_series
+        except Exception as e:
+            print(f"Error loading snapshot: {e}")
+            raise
+
+    def fetch_owid_history(self, url=OWID_HISTORY_URL, chunksize=100_000):
+        """Stream the full OWID history in bounded memory and return (latest covid_data, time_series)"""
+        try:
+            # The download goes through the fetch cache; parsing streams from the cached file
+            path, _, _ = self.fetch_cache.fetch(url)
+            time_series = TimeSeriesStore.from_owid_chunks(
+                read_owid_chunks(path, chunksize), self.standardize_countries)
+            print(f"Successfully loaded OWID history for {len(time_series)} countries "
+                  f"over {len(time_series.dates)} days")
+            return time_series.snapshot(), time_series
+        except Exception as e:
+            print(f"Error fetching OWID history: {e}")
+            raise
+
+    def fetch_sample_data(self, countries=50, seed=DEFAULT_SEED):
+        """Generate reproducible sample data for demonstration and return (covid_data, None)"""
+        print("Using sample data for demonstration...")
+        return synthetic_covid_data(countries, seed=seed), None
 
     def load_world_data(self):
         """Load world map data"""
@@ -548,7 +481,7 @@ class COVIDChoroplethMap:
             for country, shape in countries_shapes.items():
                 feature = {
                     'type': 'Feature',
-                    'properties': {'name': country},
+                    'properties': {'name': country, 'id': NAME_TO_ISO3.get(country)},
                     'geometry': {
                         'type': 'Polygon',
                         'coordinates': [[
@@ -572,8 +505,28 @@ class COVIDChoroplethMap:
             print(f"Could not create simple world data: {e}")
             return None
 
-    def create_choropleth_map(self, data_type='cases', color_scheme='Reds', figsize=(15, 10)):
-        """Create a choropleth map using matplotlib"""
+    def get_geometry_index(self):
+        """Return the name -> geometry index of the current world data, building it on first use"""
+        if self.world_data is None:
+            return None
+        if self.geometry_index is None or self.geometry_index.world is not self.world_data:
+            self.geometry_index = GeometryIndex(self.world_data)
+        return self.geometry_index
+
+    def get_world_paths(self):
+        """Return the matplotlib paths of the current world data, converting them on first use"""
+        if self.world_data is None:
+            return None
+        if self.world_paths is None or self.world_paths.world is not self.world_data:
+            self.world_paths = WorldPaths(self.world_data)
+        return self.world_paths
+
+    def create_choropleth_map(self, data_type='cases', color_scheme='Reds', figsize=(15, 10), date=None,
+                              classification=None):
+        """Create a choropleth map using matplotlib, optionally for a past date
+
+        classification is one of classification.SCHEMES (default: self.classification).
+        """
         
         # Load data
         if self.covid_data is None:
@@ -584,197 +537,382 @@ class COVIDChoroplethMap:
         
         # Create figure and axis
         fig, ax = plt.subplots(figsize=figsize)
+        panel = MapPanel(ax, self.get_world_paths(), linewidth=0.5)
         
-        # Set up color scheme
-        color_schemes = {
-            'Reds': plt.cm.Reds,
-            'Blues': plt.cm.Blues,
-            'Greens': plt.cm.Greens,
-            'Purples': plt.cm.Purples,
-            'Oranges': plt.cm.Oranges,
-            'YlOrRd': plt.cm.YlOrRd,
-            'YlGnBu': plt.cm.YlGnBu,
-            'RdYlBu_r': plt.cm.RdYlBu_r
-        }
-        
-        cmap = color_schemes.get(color_scheme, plt.cm.Reds)
-        
-        # Get data values
-        values = []
-        country_names = []
-        
-        for country, data in self.covid_data.items():
-            if data_type in data and data[data_type] > 0:
-                values.append(data[data_type])
-                country_names.append(country)
-        
-        if not values:
+        if not self.draw_choropleth(panel, data_type, color_scheme, date, classification):
             print("No data available for the selected metric")
             return fig, ax
         
-        # Normalize values for color mapping
-        values = np.array(values)
-        norm = plt.Normalize(vmin=values.min(), vmax=values.max())
-        
-        # Create color map
-        colors = cmap(norm(values))
-        
-        # Plot world map if available
-        if self.world_data is not None:
-            self.world_data.plot(ax=ax, color='lightgray', edgecolor='white', linewidth=0.5)
-        
-        # Plot countries with data
-        color_index = 0
-        for country, data in self.covid_data.items():
-            if data_type in data and data[data_type] > 0:
-                # Find country in world data
-                if self.world_data is not None:
-                    # Try different column names for country names
-                    country_found = False
-                    for col in ['name', 'NAME', 'NAME_EN', 'ADMIN', 'COUNTRY']:
-                        if col in self.world_data.columns:
-                            country_geom = self.world_data[self.world_data[col] == country]
-                            if not country_geom.empty:
-                                country_geom.plot(ax=ax, color=colors[color_index], edgecolor='white', linewidth=0.5)
-                                color_index += 1
-                                country_found = True
-                                break
-                    
-                    # If not found by exact name, try partial matching
-                    if not country_found:
-                        for col in ['name', 'NAME', 'NAME_EN', 'ADMIN', 'COUNTRY']:
-                            if col in self.world_data.columns:
-                                # Try to find countries that contain our country name
-                                matching_countries = self.world_data[
-                                    self.world_data[col].str.contains(country, case=False, na=False)
-                                ]
-                                if not matching_countries.empty:
-                                    matching_countries.plot(ax=ax, color=colors[color_index], edgecolor='white', linewidth=0.5)
-                                    color_index += 1
-                                    country_found = True
-                                    break
-                    
-                    # If still not found, plot as circle
-                    if not country_found and 'lat' in data and 'lon' in data:
-                        ax.scatter(data['lon'], data['lat'], 
-                                 c=[colors[color_index]], s=100, alpha=0.7, edgecolors='black')
-                        color_index += 1
-                else:
-                    # Plot as circles if no world data
-                    if 'lat' in data and 'lon' in data:
-                        ax.scatter(data['lon'], data['lat'], 
-                                 c=[colors[color_index]], s=100, alpha=0.7, edgecolors='black')
-                        color_index += 1
+        plt.tight_layout()
+        return fig, ax
+
+    def render_map(self, data_type='cases', color_scheme='Reds', figsize=(15, 10), date=None, dpi=150, format='png',
+                   classification=None):
+        """Render a choropleth map to image bytes, reusing a persistent figure per figsize"""
+        if self.covid_data is None:
+            self.covid_data = self.fetch_covid_data()
+        if self.world_data is None:
+            self.world_data = self.load_world_data()
+        template = self.get_map_template('map', figsize, linewidth=0.5)
+        with template.lock:
+            self.draw_choropleth(template.panels[0], data_type, color_scheme, date, classification)
+            return template.encode(format, dpi)
+
+    def get_map_template(self, kind, figsize, layout=(1, 1), **panel_options):
+        """Return the persistent MapTemplate of a kind of figure, rebuilt when the world data changes"""
+        world_paths = self.get_world_paths()
+        key = (kind, tuple(figsize))
+        template = self.map_templates.get(key)
+        if template is None or template.world_paths is not world_paths:
+            template = MapTemplate(world_paths, figsize, layout, **panel_options)
+            self.map_templates[key] = template
+        return template
+
+    def country_locations(self, covid_data):
+        """Return (lons, lats) of every country, NaN where unknown"""
+        located = covid_data.mask('lat') & covid_data.mask('lon')
+        if not located.any():
+            return np.full(len(covid_data), np.nan), np.full(len(covid_data), np.nan)
+        return (np.where(located, covid_data.column('lon'), np.nan),
+                np.where(located, covid_data.column('lat'), np.nan))
+
+    def map_data(self, date=None):
+        """Return the CountryTable to map: the latest data, or the snapshot of a past date"""
+        covid_data = as_country_table(self.covid_data)
+        if date is not None and self.time_series is not None:
+            covid_data = self.time_series.snapshot(date)
+        return covid_data
+
+    def join_metric(self, covid_data, data_type):
+        """Return (keep mask, values, geometry rows) of the countries with a positive value
+
+        Also records the countries without geometry in self.unresolved_countries.
+        """
+        keep = covid_data.positive_mask(data_type)
+        country_names = covid_data.countries[keep]
+        values = covid_data.column(data_type)[keep] if covid_data.has(data_type) else np.array([])
+        codes = None if covid_data.codes is None else covid_data.codes[keep]
+        geometry_index = self.get_geometry_index()
+        geometry_rows = geometry_index.join(country_names, codes) if geometry_index else [None] * len(country_names)
+        self.unresolved_countries = [country for country, rows in zip(country_names, geometry_rows) if rows is None]
+        return keep, values, geometry_rows
+
+    def draw_choropleth(self, panel, data_type, color_scheme, date=None, classification=None):
+        """Color a MapPanel for one metric and set its title, labels and statistics box
+
+        Returns False if no country has a positive value; the panel then shows
+        a message under this metric's title instead of a previous metric's map.
+        """
+        covid_data = self.map_data(date)
+        keep, values, geometry_rows = self.join_metric(covid_data, data_type)
         
         # Customize the plot
-        ax.set_title(f'COVID-19 {data_type.replace("_", " ").title()} by Country', 
-                    fontsize=16, fontweight='bold', pad=20)
+        label = data_type.replace("_", " ").title()
+        ax = panel.ax
+        ax.set_title(self.map_title(label, date), fontsize=16, fontweight='bold', pad=20)
         ax.set_xlabel('Longitude', fontsize=12)
         ax.set_ylabel('Latitude', fontsize=12)
         
-        # Add colorbar
-        sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
-        sm.set_array([])
-        cbar = plt.colorbar(sm, ax=ax, shrink=0.8, aspect=30)
-        cbar.set_label(f'{data_type.replace("_", " ").title()}', fontsize=12)
-        
-        # Format colorbar ticks
-        if values.max() > 1000000:
-            cbar.ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
-        elif values.max() > 1000:
-            cbar.ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e3:.1f}K'))
+        # Countries without geometry are drawn as circles at their coordinates
+        lons, lats = self.country_locations(covid_data)
+        classes = self.metric_classes(data_type, date, classification) if len(values) else None
+        if not panel.update(values, geometry_rows, lons[keep], lats[keep], colormap(color_scheme), label, classes):
+            panel.show_message(f'No data available for {label}')
+            panel.set_note(None)
+            return False
         
         # Add statistics text
-        total_cases = sum(data.get('cases', 0) for data in self.covid_data.values())
-        total_deaths = sum(data.get('deaths', 0) for data in self.covid_data.values())
-        total_recovered = sum(data.get('recovered', 0) for data in self.covid_data.values())
+        total_cases = covid_data.total('cases')
+        total_deaths = covid_data.total('deaths')
+        total_recovered = covid_data.total('recovered')
         
-        stats_text = f'Global Statistics:\nTotal Cases: {total_cases:,}\nTotal Deaths: {total_deaths:,}\nTotal Recovered: {total_recovered:,}'
-        ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, fontsize=10,
-                verticalalignment='top', bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+        panel.set_note(f'Global Statistics:\nTotal Cases: {total_cases:,}\nTotal Deaths: {total_deaths:,}\nTotal Recovered: {total_recovered:,}')
+        return True
+
+    def get_raster_map(self, width=1200):
+        """Return the RasterMap of the current world data at a width, rasterizing it on first use"""
+        world_paths = self.get_world_paths()
+        raster = self.raster_maps.get(width)
+        if raster is None or raster.world_paths is not world_paths:
+            raster = RasterMap(world_paths, width)
+            self.raster_maps[width] = raster
+        return raster
+
+    def render_raster_map(self, data_type='cases', color_scheme='Reds', width=1200, date=None, format='png',
+                          classification=None):
+        """Render a choropleth map with the raster engine and return image bytes
+
+        Countries without geometry are not drawn (see self.unresolved_countries).
+        """
+        values_by_row = self.row_values(data_type, date)
+        raster = self.get_raster_map(width)
+        label = data_type.replace("_", " ").title()
+        classes = self.metric_classes(data_type, date, classification)
+        image = raster.render(values_by_row, colormap(color_scheme), self.map_title(label, date), label, classes)
+        return raster.encode(image, format)
+
+    def row_values(self, data_type, date=None):
+        """Return the value of a metric for every world row, NaN where no country has a positive value
+
+        Countries without geometry are left out (see self.unresolved_countries).
+        """
+        if self.covid_data is None:
+            self.covid_data = self.fetch_covid_data()
+        if self.world_data is None:
+            self.world_data = self.load_world_data()
+        if self.world_data is None:
+            raise ValueError("Per-country geometry needs world map data")
+        _, values, geometry_rows = self.join_metric(self.map_data(date), data_type)
+        rows, row_values = colored_rows(geometry_rows, values)
+        values_by_row = np.full(len(self.world_data), np.nan)
+        values_by_row[rows] = row_values
+        return values_by_row
+
+    def map_title(self, label, date=None):
+        title = f'COVID-19 {label} by Country'
+        if date is not None:
+            title += f' ({pd.Timestamp(date):%Y-%m-%d})'
+        return title
+
+    def get_vector_map(self, width=1000):
+        """Return the VectorMap of the current world data at a width, building its geometry on first use"""
+        if self.world_data is None:
+            self.world_data = self.load_world_data()
+        world_paths = self.get_world_paths()
+        if world_paths is None:
+            raise ValueError("Vector output needs world map data")
+        vector = self.vector_maps.get(width)
+        if vector is None or vector.world_paths is not world_paths:
+            vector = VectorMap(world_paths, width)
+            self.vector_maps[width] = vector
+        return vector
+
+    def vector_styles(self, data_type='cases', color_scheme='Reds', date=None, classification=None):
+        """Return the style map of a metric for the vector geometry: class colors, breaks and country ID -> class"""
+        values_by_row = self.row_values(data_type, date)
+        label = data_type.replace("_", " ").title()
+        classes = self.metric_classes(data_type, date, classification)
+        return self.get_vector_map().style_map(values_by_row, colormap(color_scheme), label, classes)
+
+    def render_vector_map(self, data_type='cases', color_scheme='Reds', width=1000, date=None, classification=None):
+        """Return a standalone SVG choropleth map (geometry, class styles and legend) as a string"""
+        values_by_row = self.row_values(data_type, date)
+        label = data_type.replace("_", " ").title()
+        vector = self.get_vector_map(width)
+        classes = self.metric_classes(data_type, date, classification)
+        return vector.svg_document(vector.style_map(values_by_row, colormap(color_scheme), label, classes),
+                                   self.map_title(label, date))
+
+    def data_version(self):
+        """Fingerprint of covid_data, recomputed only when covid_data is replaced
+
+        Caches of rendered output key on it. Changes made to covid_data in
+        place are not detected: assign new data instead.
+        """
+        if self.covid_data is None:
+            return None
+        data, version = self.data_fingerprint
+        if data is not self.covid_data:
+            version = as_country_table(self.covid_data).fingerprint()
+            self.data_fingerprint = (self.covid_data, version)
+        return version
+
+    def metric_classes(self, data_type, date=None, classification=None):
+        """Return the Classes of a metric's positive values (see classification.classify)
+
+        Breaks are cached per metric, scheme, class count, date and data version,
+        so every map, tile and style map of the same data shares them.
+        """
+        classification = classification or self.classification
+        version = self.data_version()
+        key = (data_type, classification, self.class_count, date, version)
+        with self.lock:
+            classes = self.class_breaks.get(key)
+        if classes is None:
+            _, values = self.map_data(date).positive(data_type)
+            classes = classify(values, classification, self.class_count)
+            with self.lock:
+                # Breaks of older data versions can no longer be requested
+                for cached in [cached for cached in self.class_breaks if cached[-1] != version]:
+                    del self.class_breaks[cached]
+                self.class_breaks[key] = classes
+        return classes
+
+    def get_tile_renderer(self):
+        """Return the TileRenderer of the current world data, projecting it on first use"""
+        if self.world_data is None:
+            self.world_data = self.load_world_data()
+        if self.world_data is None:
+            raise ValueError("Map tiles need world map data")
+        if self.tile_renderer is None or self.tile_renderer.world is not self.world_data:
+            self.tile_renderer = TileRenderer(self.world_data)
+            self.tile_cache.clear()
+        return self.tile_renderer
+
+    def render_tile(self, data_type, z, x, y, color_scheme='Reds', classification=None):
+        """Return XYZ tile z/x/y of a metric's choropleth as PNG bytes, from the tile cache when possible
+
+        Tiles are cached by metric, color scheme, classification and data
+        version; tiles of older data versions are dropped when the data changes.
+        """
+        if not valid_tile(z, x, y):
+            raise ValueError(f"No tile {z}/{x}/{y} (zoom 0-{MAX_ZOOM})")
+        if self.covid_data is None:
+            self.covid_data = self.fetch_covid_data()
+        renderer = self.get_tile_renderer()
+        version = self.data_version()
+        classification = classification or self.classification
+        key = (data_type, color_scheme, classification, self.class_count, version, z, x, y)
+        tile = self.tile_cache.get(key)
+        if tile is None:
+            colors_key = key[:5]
+            with self.lock:
+                colors = self.tile_colors.get(colors_key)
+            if colors is None:
+                colors = row_colors(self.row_values(data_type), colormap(color_scheme),
+                                    self.metric_classes(data_type, classification=classification))
+                with self.lock:
+                    stale = [cached for cached in self.tile_colors if cached[4] != version]
+                    for cached in stale:
+                        del self.tile_colors[cached]
+                    self.tile_colors[colors_key] = colors
+                if stale:
+                    self.tile_cache.discard(lambda cached: cached[4] != version)
+            tile = renderer.render(z, x, y, colors)
+            self.tile_cache.put(key, tile)
+        return tile
+
+    def animate_choropleth(self, path, data_type='cases', color_scheme='Reds', figsize=(12, 8), dpi=100, fps=10,
+                           start=None, end=None, step=1, classification=None):
+        """Write an animated choropleth of a metric over the time series to a GIF or MP4 file
+
+        One figure is built and drawn once; each date only recolors its geometry
+        collection and retitles it, and just those two are redrawn over the
+        static map, axes and colorbar before the frame is streamed to the
+        encoder. Classes come from the values of all frames, so colors compare
+        across dates. Countries without geometry are not shown. Returns
+        (frames, seconds, frames per second).
+        """
+        if self.time_series is None:
+            raise ValueError("Animations need per-date data: fetch JHU data first")
+        if self.world_data is None:
+            self.world_data = self.load_world_data()
+        world_paths = self.get_world_paths()
+        if world_paths is None:
+            raise ValueError("Animations need world map data")
+        store = self.time_series.date_slice(start, end)
+        positions = np.arange(0, len(store.dates), step)
+        countries, rows = country_row_pairs(self.get_geometry_index().join(store.countries))
+        values = store.metric(data_type)[countries][:, positions]  # world rows x frames
+        classes = classify(values[values > 0], classification or self.classification, self.class_count)
+        cmap = colormap(color_scheme)
+        label = data_type.replace("_", " ").title()
         
-        plt.tight_layout()
-        return fig, ax
+        template = MapTemplate(world_paths, figsize, linewidth=0.5)
+        panel = template.panels[0]
+        no_location = np.full(len(rows), np.nan)
+        panel.update(values[:, -1], [[row] for row in rows], no_location, no_location, cmap, label, classes)
+        ax = panel.ax
+        ax.set_title(self.map_title(label, store.dates[positions[-1]]), fontsize=16, fontweight='bold', pad=20)
+        ax.set_xlabel('Longitude', fontsize=12)
+        ax.set_ylabel('Latitude', fontsize=12)
+        template.figure.tight_layout()
+        basemap = row_facecolors(len(world_paths), [], [])
+        facecolors = basemap.copy()
+        
+        def draw_frame(frame):
+            frame_values = values[:, frame]
+            has_value = frame_values > 0
+            facecolors[:] = basemap  # rows without a value this frame
+            facecolors[rows[has_value]] = classes.colors(frame_values[has_value], cmap)
+            panel.collection.set_facecolor(facecolors)
+            ax.title.set_text(self.map_title(label, store.dates[positions[frame]]))
+        
+        return write_animation(template.figure, path, range(len(positions)), draw_frame,
+                               [panel.collection, ax.title], fps, dpi)
 
-    def create_multiple_views(self, figsize=(20, 15)):
+    def create_multiple_views(self, figsize=(20, 15), classification=None):
         """Create multiple views of COVID-19 data"""
+        fig, axes = plt.subplots(2, 2, figsize=figsize)
+        axes = axes.flatten()
+        world_paths = self.get_world_paths()
+        self.draw_multiple_views([MapPanel(ax, world_paths, **MULTIPLE_VIEW_PANEL) for ax in axes], classification)
+        
+        plt.suptitle('COVID-19 Global Impact - Multiple Views', fontsize=18, fontweight='bold')
+        plt.tight_layout()
+        return fig, axes
+
+    def render_multiple_views(self, figsize=(20, 15), dpi=150, format='png', classification=None):
+        """Render the multiple views to image bytes, reusing a persistent figure per figsize"""
+        template = self.get_map_template('multiple_views', figsize, (2, 2), **MULTIPLE_VIEW_PANEL)
+        with template.lock:
+            self.draw_multiple_views(template.panels, classification)
+            template.figure.suptitle('COVID-19 Global Impact - Multiple Views', fontsize=18, fontweight='bold')
+            return template.encode(format, dpi)
+
+    def draw_multiple_views(self, panels, classification=None):
+        """Color four MapPanels with cases, deaths, recovered and active"""
         data_types = ['cases', 'deaths', 'recovered', 'active']
         color_schemes = ['Reds', 'Blues', 'Greens', 'Oranges']
         
-        fig, axes = plt.subplots(2, 2, figsize=figsize)
-        axes = axes.flatten()
+        covid_data = as_country_table(self.covid_data)
         
-        for i, (data_type, color_scheme) in enumerate(zip(data_types, color_schemes)):
-            ax = axes[i]
+        # Join countries to geometry once for all metrics
+        geometry_index = self.get_geometry_index()
+        geometry_rows = geometry_index.join(covid_data.countries, covid_data.codes) if geometry_index else None
+        lons, lats = self.country_locations(covid_data)
+        
+        for panel, data_type, color_scheme in zip(panels, data_types, color_schemes):
+            ax = panel.ax
             
             # Get data values
-            values = []
-            for country, data in self.covid_data.items():
-                if data_type in data and data[data_type] > 0:
-                    values.append(data[data_type])
+            keep = np.flatnonzero(covid_data.positive_mask(data_type))
+            values = covid_data.column(data_type)[keep] if covid_data.has(data_type) else np.array([])
+            rows = [geometry_rows[i] for i in keep] if geometry_rows is not None else [None] * len(keep)
+            label = data_type.replace("_", " ").title()
             
-            if not values:
-                ax.text(0.5, 0.5, f'No data for {data_type}', 
-                       ha='center', va='center', transform=ax.transAxes)
+            classes = self.metric_classes(data_type, classification=classification) if len(values) else None
+            if not panel.update(values, rows, lons[keep], lats[keep], colormap(color_scheme), label, classes):
+                panel.show_message(f'No data for {data_type}')
                 continue
             
-            # Create color map
-            cmap = getattr(plt.cm, color_scheme)
-            values = np.array(values)
-            norm = plt.Normalize(vmin=values.min(), vmax=values.max())
-            colors = cmap(norm(values))
-            
-            # Plot world map if available
-            if self.world_data is not None:
-                self.world_data.plot(ax=ax, color='lightgray', edgecolor='white', linewidth=0.3)
-            
-            # Plot countries
-            j = 0
-            for country, data in self.covid_data.items():
-                if data_type in data and data[data_type] > 0:
-                    if self.world_data is not None:
-                        country_geom = self.world_data[self.world_data['name'] == country]
-                        if not country_geom.empty:
-                            country_geom.plot(ax=ax, color=colors[j], edgecolor='white', linewidth=0.3)
-                    else:
-                        ax.scatter(data['lon'], data['lat'], 
-                                 c=[colors[j]], s=50, alpha=0.7, edgecolors='black')
-                    j += 1
-            
             # Customize subplot
-            ax.set_title(f'{data_type.replace("_", " ").title()}', fontsize=14, fontweight='bold')
+            ax.set_title(label, fontsize=14, fontweight='bold')
             ax.set_xlabel('Longitude', fontsize=10)
             ax.set_ylabel('Latitude', fontsize=10)
-            
-            # Add colorbar
-            sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
-            sm.set_array([])
-            cbar = plt.colorbar(sm, ax=ax, shrink=0.8, aspect=30)
-            cbar.set_label(f'{data_type.replace("_", " ").title()}', fontsize=10)
-        
-        plt.suptitle('COVID-19 Global Impact - Multiple Views', fontsize=18, fontweight='bold')
-        plt.tight_layout()
-        return fig, axes
 
-    def create_time_series_plot(self, countries=None, figsize=(15, 8)):
+    def create_time_series_plot(self, countries=None, figsize=(15, 8), data_type='cases', start=None, end=None):
         """Create a time series plot for selected countries"""
+        covid_data = as_country_table(self.covid_data)
         if countries is None:
             # Select top 10 countries by cases
-            country_cases = [(country, data['cases']) for country, data in self.covid_data.items()]
-            country_cases.sort(key=lambda x: x[1], reverse=True)
-            countries = [country for country, _ in country_cases[:10]]
+            countries = [country for country, _ in covid_data.top('cases', 10)]
         
         fig, ax = plt.subplots(figsize=figsize)
         
-        for country in countries:
-            if country in self.covid_data:
-                data = self.covid_data[country]
-                ax.bar(country, data['cases'], alpha=0.7, label=country)
-        
-        ax.set_title('COVID-19 Cases by Country', fontsize=16, fontweight='bold')
-        ax.set_xlabel('Country', fontsize=12)
-        ax.set_ylabel('Total Cases', fontsize=12)
-        ax.tick_params(axis='x', rotation=45)
+        if self.time_series is None:
+            # Only the latest snapshot is available, plot it as bars
+            for country in countries:
+                if country in covid_data:
+                    data = covid_data[country]
+                    ax.bar(country, data['cases'], alpha=0.7, label=country)
+            
+            ax.set_title('COVID-19 Cases by Country', fontsize=16, fontweight='bold')
+            ax.set_xlabel('Country', fontsize=12)
+            ax.set_ylabel('Total Cases', fontsize=12)
+            ax.tick_params(axis='x', rotation=45)
+        else:
+            series = self.time_series.date_slice(start, end)
+            for country in countries:
+                if country in series.row_of:
+                    ax.plot(series.dates, series.series(country, data_type), linewidth=2, label=country)
+            
+            label = data_type.replace("_", " ").title()
+            ax.set_title(f'COVID-19 {label} Over Time', fontsize=16, fontweight='bold')
+            ax.set_xlabel('Date', fontsize=12)
+            ax.set_ylabel(f'Total {label}', fontsize=12)
+            ax.grid(True, alpha=0.3)
+            fig.autofmt_xdate()
         
         # Format y-axis
         ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e6:.1f}M'))
@@ -789,10 +927,11 @@ class COVIDChoroplethMap:
             print("No data available")
             return
         
-        total_cases = sum(data.get('cases', 0) for data in self.covid_data.values())
-        total_deaths = sum(data.get('deaths', 0) for data in self.covid_data.values())
-        total_recovered = sum(data.get('recovered', 0) for data in self.covid_data.values())
-        total_active = sum(data.get('active', 0) for data in self.covid_data.values())
+        covid_data = as_country_table(self.covid_data)
+        total_cases = covid_data.total('cases')
+        total_deaths = covid_data.total('deaths')
+        total_recovered = covid_data.total('recovered')
+        total_active = covid_data.total('active')
         
         print("\n" + "="*50)
         print("GLOBAL COVID-19 STATISTICS")
@@ -805,16 +944,28 @@ class COVIDChoroplethMap:
         print(f"Recovery Rate: {(total_recovered/total_cases*100):.2f}%" if total_cases > 0 else "Recovery Rate: N/A")
         
         # Top 10 countries by cases
-        country_cases = [(country, data['cases']) for country, data in self.covid_data.items()]
-        country_cases.sort(key=lambda x: x[1], reverse=True)
+        country_cases = covid_data.top('cases', 10)
         
         print("\nTop 10 Countries by Total Cases:")
         print("-" * 40)
-        for i, (country, cases) in enumerate(country_cases[:10], 1):
+        for i, (country, cases) in enumerate(country_cases, 1):
             print(f"{i:2d}. {country:<25} {cases:>12,}")
 
 def main():
     """Main function to demonstrate the COVID-19 choropleth map"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', action='store_true',
+                        help='Render the PNG files headless and in parallel instead of showing each plot')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for --batch (default: one per output, up to the CPU count)')
+    parser.add_argument('--animate', metavar='PATH',
+                        help='Write an animated cases map over time to PATH (.gif, or .mp4 with ffmpeg) and exit')
+    parser.add_argument('--fps', type=int, default=10, help='Frames per second for --animate')
+    parser.add_argument('--step', type=int, default=7, help='Days between frames for --animate')
+    args = parser.parse_args()
+    if args.batch or args.animate:
+        plt.switch_backend('Agg')
+    
     print("COVID-19 Choropleth Map Visualization")
     print("="*50)
     
@@ -823,12 +974,30 @@ def main():
     
     # Fetch data
     print("\n1. Fetching COVID-19 data...")
-    visualizer.covid_data = visualizer.fetch_covid_data('jhu')  # Try JHU first
+    # Try JHU first, then OWID; this demo accepts sample data if both fail
+    visualizer.covid_data = visualizer.fetch_covid_data(['jhu', 'owid'], allow_sample=True)
     
     # Print statistics
     print("\n2. Global Statistics:")
     visualizer.print_statistics()
     
+    if args.animate:
+        print(f"\n3. Animating cases over time to {args.animate}...")
+        try:
+            frames, seconds, fps = visualizer.animate_choropleth(args.animate, fps=args.fps, step=args.step)
+        except (ValueError, RuntimeError) as e:
+            print(f"Cannot animate: {e}")
+            return
+        print(f"Wrote {frames} frames in {seconds:.1f} s ({fps:.1f} frames per second)")
+        return
+    
+    if args.batch:
+        print("\n3. Rendering all outputs...")
+        timings, wall_time, workers = render_batch(visualizer, workers=args.workers)
+        print_report(timings, wall_time, workers)
+        print("\nVisualization complete! Check the generated PNG files.")
+        return
+    
     # Create individual choropleth maps
     print("\n3. Creating choropleth maps...")
     
@@ -0,0 +1,175 @@
+"""
+Registry of COVID-19 data sources
+Tries sources by priority or races them concurrently, with per-source timeouts
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+SAMPLE_SOURCE = 'sample'
+
+class DataSourceError(Exception):
+    """Raised when no data source returned valid data"""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+class DataSource:
+    """A named fetch function; lower priority numbers are tried first
+
+    fetch() returns (covid_data, time_series), time_series being None when the
+    source has no daily history. It must not store either anywhere: a source
+    that loses a race or times out keeps running in the background, and only
+    the accepted result may reach the caller. refresh() is called instead for
+    incremental refreshes and follows the same contract; it defaults to fetch().
+    """
+
+    def __init__(self, name, fetch, priority=100, timeout=60.0, refresh=None):
+        self.name = name
+        self.fetch = fetch
+        self.refresh = refresh or fetch
+        self.priority = priority
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"DataSource({self.name!r}, priority={self.priority}, timeout={self.timeout})"
+
+def is_valid_data(data):
+    """Check that a fetcher returned a non-empty covid_data mapping with some cases"""
+    if not data:
+        return False
+    if hasattr(data, 'total'):
+        return data.total('cases') > 0
+    try:
+        return sum(values.get('cases', 0) for values in data.values()) > 0
+    except (AttributeError, TypeError):
+        return False
+
+class SourceRegistry:
+    """Data sources keyed by name"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, name, fetch, priority=100, timeout=60.0, refresh=None):
+        self.sources[name] = DataSource(name, fetch, priority, timeout, refresh)
+        return self.sources[name]
+
+    def unregister(self, name):
+        self.sources.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self.sources
+
+    def ordered(self, names=None):
+        """Return the requested sources (default: all but sample) by priority"""
+        if names is None:
+            names = [name for name in self.sources if name != SAMPLE_SOURCE]
+        elif isinstance(names, str):
+            names = [names]
+        unknown = [name for name in names if name not in self.sources]
+        if unknown:
+            raise ValueError(f"Unknown data source(s): {', '.join(unknown)}")
+        return sorted((self.sources[name] for name in names), key=lambda source: source.priority)
+
+    def fetch(self, names=None, race=False, allow_sample=False, incremental=False):
+        """Fetch from the first source that returns valid data
+
+        With race=True all sources run concurrently and the first valid result wins;
+        otherwise they are tried one after another by priority. Sample data is only
+        used if requested by name or if allow_sample is set and every source failed.
+        With incremental=True each source's refresh() is called instead of fetch().
+
+        Returns a report dict with 'source', 'data', 'time_series', 'timings' and
+        'errors'. Raises DataSourceError if no source answered.
+        """
+        sources = self.ordered(names)
+        report = {'source': None, 'data': None, 'time_series': None, 'timings': {}, 'errors': {}}
+
+        if race and len(sources) > 1:
+            self.race(sources, report, incremental)
+        else:
+            for source in sources:
+                if self.run(source, report, incremental):
+                    break
+
+        if report['source'] is None and allow_sample and SAMPLE_SOURCE in self.sources \
+                and SAMPLE_SOURCE not in report['timings']:
+            print("All data sources failed, falling back to sample data as requested")
+            self.run(self.sources[SAMPLE_SOURCE], report, incremental)
+
+        if report['source'] is None:
+            failures = '; '.join(f"{name}: {error}" for name, error in report['errors'].items())
+            raise DataSourceError(f"No data source returned valid data ({failures})", report)
+
+        timings = ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in report['timings'].items()
+                            if seconds is not None)
+        print(f"Data source: {report['source']} ({timings})")
+        return report
+
+    def accept(self, source, result, report):
+        """Record a source's (covid_data, time_series); return True if the data is valid"""
+        data, time_series = result
+        if not is_valid_data(data):
+            report['errors'][source.name] = 'returned no valid data'
+            return False
+        if report['source'] is None:
+            report['source'] = source.name
+            report['data'] = data
+            report['time_series'] = time_series
+        return True
+
+    def run(self, source, report, incremental=False):
+        """Run one source with its timeout; return True if it answered"""
+        pool = ThreadPoolExecutor(max_workers=1)
+        start = time.perf_counter()
+        future = pool.submit(source.refresh if incremental else source.fetch)
+        try:
+            result = future.result(timeout=source.timeout)
+        except TimeoutError:
+            report['errors'][source.name] = f'timed out after {source.timeout:g} s'
+            return False
+        except Exception as e:
+            report['errors'][source.name] = str(e) or type(e).__name__
+            return False
+        finally:
+            report['timings'][source.name] = time.perf_counter() - start
+            # Never wait on a source that overran its timeout
+            pool.shutdown(wait=False, cancel_futures=True)
+        return self.accept(source, result, report)
+
+    def race(self, sources, report, incremental=False):
+        """Run sources concurrently and keep the first valid result"""
+        pool = ThreadPoolExecutor(max_workers=len(sources))
+        start = time.perf_counter()
+        futures = {pool.submit(source.refresh if incremental else source.fetch): source for source in sources}
+        deadlines = {source.name: start + source.timeout for source in sources}
+        pending = set(futures)
+        try:
+            while pending and report['source'] is None:
+                now = time.perf_counter()
+                for future in [future for future in pending if deadlines[futures[future].name] <= now]:
+                    source = futures[future]
+                    report['timings'][source.name] = now - start
+                    report['errors'][source.name] = f'timed out after {source.timeout:g} s'
+                    pending.discard(future)
+                if not pending:
+                    break
+
+                next_deadline = min(deadlines[futures[future].name] for future in pending)
+                done, pending = wait(pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = futures[future]
+                    report['timings'][source.name] = time.perf_counter() - start
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        report['errors'][source.name] = str(e) or type(e).__name__
+                        continue
+                    self.accept(source, result, report)
+
+            for future in pending:
+                report['timings'].setdefault(futures[future].name, None)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
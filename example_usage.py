@@ -4,6 +4,7 @@ This script demonstrates various ways to use the COVIDChoroplethMap class
 """
 
 from covid_choropleth import COVIDChoroplethMap
+from data_sources import DataSourceError
 import matplotlib.pyplot as plt
 
 def example_basic_usage():
@@ -15,7 +16,7 @@ def example_basic_usage():
     
     # Fetch data from Johns Hopkins University
     print("Fetching data from JHU...")
-    visualizer.covid_data = visualizer.fetch_covid_data('jhu')
+    visualizer.covid_data = visualizer.fetch_covid_data('jhu', allow_sample=True)
     
     # Create a simple cases map
     fig, ax = visualizer.create_choropleth_map('cases', 'Reds', (12, 8))
@@ -33,9 +34,14 @@ def example_multiple_data_sources():
     
     for source in sources:
         print(f"\nFetching data from {source.upper()}...")
-        data = visualizer.fetch_covid_data(source)
+        try:
+            data = visualizer.fetch_covid_data(source)
+        except DataSourceError as e:
+            print(f"Skipping {source}: {e}")
+            continue
         
         if data:
+            visualizer.covid_data = data
             print(f"Successfully loaded data for {len(data)} countries")
             # Create a map for each source
             fig, ax = visualizer.create_choropleth_map('cases', 'Blues', (10, 6))
@@ -47,7 +53,7 @@ def example_different_metrics():
     print("\n=== Different Metrics Example ===")
     
     visualizer = COVIDChoroplethMap()
-    visualizer.covid_data = visualizer.fetch_covid_data('jhu')
+    visualizer.covid_data = visualizer.fetch_covid_data('jhu', allow_sample=True)
     
     # Different metrics to visualize
     metrics = [
@@ -68,7 +74,7 @@ def example_custom_analysis():
     print("\n=== Custom Analysis Example ===")
     
     visualizer = COVIDChoroplethMap()
-    visualizer.covid_data = visualizer.fetch_covid_data('jhu')
+    visualizer.covid_data = visualizer.fetch_covid_data('jhu', allow_sample=True)
     
     # Print detailed statistics
     visualizer.print_statistics()
@@ -90,7 +96,7 @@ def example_specific_countries():
     print("\n=== Specific Countries Example ===")
     
     visualizer = COVIDChoroplethMap()
-    visualizer.covid_data = visualizer.fetch_covid_data('jhu')
+    visualizer.covid_data = visualizer.fetch_covid_data('jhu', allow_sample=True)
     
     # Focus on specific countries
     target_countries = [
@@ -116,7 +122,7 @@ def example_data_export():
     print("\n=== Data Export Example ===")
     
     visualizer = COVIDChoroplethMap()
-    visualizer.covid_data = visualizer.fetch_covid_data('jhu')
+    visualizer.covid_data = visualizer.fetch_covid_data('jhu', allow_sample=True)
     
     # Convert to DataFrame for analysis
     import pandas as pd
@@ -140,6 +146,9 @@ def example_data_export():
     df.to_csv('covid_data_export.csv', index=False)
     print("Data exported to 'covid_data_export.csv'")
     
+    # Save a binary snapshot that later runs can load with fetch_covid_data('snapshot')
+    visualizer.save_snapshot('snapshots', source='jhu')
+    
     # Display summary statistics
     print("\nData Summary:")
     print(df.describe())
@@ -155,28 +164,25 @@ def example_error_handling():
     
     visualizer = COVIDChoroplethMap()
     
-    # Try to fetch data with error handling
+    # Race JHU and OWID concurrently and keep the first valid answer
     try:
-        print("Attempting to fetch data from JHU...")
-        data = visualizer.fetch_covid_data('jhu')
-        if data:
-            print("JHU data loaded successfully")
-        else:
-            print("JHU data failed, trying OWID...")
-            data = visualizer.fetch_covid_data('owid')
-            if data:
-                print("OWID data loaded successfully")
-            else:
-                print("All online sources failed, using sample data")
-                data = visualizer.fetch_covid_data('sample')
-    except Exception as e:
-        print(f"Error occurred: {e}")
-        print("Using sample data as fallback")
+        print("Racing JHU and OWID...")
+        data = visualizer.fetch_covid_data(['jhu', 'owid'], race=True)
+    except DataSourceError as e:
+        print(f"All online sources failed: {e}")
+        # Sample data is only used when asked for explicitly
         data = visualizer.fetch_covid_data('sample')
     
+    report = visualizer.source_report
+    for source, seconds in report['timings'].items():
+        status = report['errors'].get(source, 'ok')
+        timing = f"{seconds:.2f}s" if seconds is not None else "still running"
+        print(f"  {source}: {timing} ({status})")
+    
     # Create visualization regardless of data source
+    visualizer.covid_data = data
     fig, ax = visualizer.create_choropleth_map('cases', 'Reds', (12, 8))
-    plt.title('COVID-19 Cases - Data Source: ' + ('JHU' if 'jhu' in str(type(data)) else 'Sample'))
+    plt.title('COVID-19 Cases - Data Source: ' + visualizer.data_source.upper())
     plt.show()
 
 if __name__ == "__main__":
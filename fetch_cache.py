@@ -0,0 +1,156 @@
+"""
+Persistent HTTP cache for upstream CSV downloads
+Stores ETag / Last-Modified per URL and revalidates with conditional requests
+"""
+
+import os
+import json
+import time
+import glob
+import pickle
+import hashlib
+import threading
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CACHE_DIR = '.fetch_cache'
+
+def create_session(pool_size=10):
+    """Create a requests session whose connection pool is shared by worker threads"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class FetchCache:
+    """On-disk cache of CSV downloads keyed by URL, revalidated with conditional GETs"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, session=None, timeout=60):
+        self.cache_dir = cache_dir
+        self.session = session or create_session()
+        self.timeout = timeout
+        self.frames = {}  # parsed frames kept in memory, keyed by (url, read_csv options, version)
+        self.lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'bytes_downloaded': 0,
+            'bytes_saved': 0,
+            'seconds': 0.0
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, url, suffix):
+        """Return the cache file path for a URL"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def frame_path(self, url, options):
+        """Return the path of the parsed frame of a URL for one set of read_csv options"""
+        key = hashlib.sha256(options.encode('utf-8')).hexdigest()[:16]
+        return self.path_for(url, f'.{key}.pkl')
+
+    def load_meta(self, url):
+        """Return the stored validators of a URL, or None if it was never fetched"""
+        try:
+            with open(self.path_for(url, '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_meta(self, url, meta):
+        with open(self.path_for(url, '.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def record(self, key, value):
+        with self.lock:
+            self.stats[key] += value
+
+    def fetch(self, url):
+        """Return (body path, meta, modified) for a URL, downloading only if it changed upstream"""
+        start = time.perf_counter()
+        body_path = self.path_for(url, '.csv')
+        meta = self.load_meta(url)
+
+        headers = {}
+        if meta is not None and os.path.exists(body_path):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self.record('hits', 1)
+                self.record('bytes_saved', meta.get('size', 0))
+                return body_path, meta, False
+
+            response.raise_for_status()
+            body = response.content
+            # Write atomically so a concurrent reader never sees a partial file
+            tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, body_path)
+            meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'size': len(body),
+                'fetched_at': time.time()
+            }
+            self.save_meta(url, meta)
+            self.record('misses', 1)
+            self.record('bytes_downloaded', len(body))
+            return body_path, meta, True
+        finally:
+            self.record('seconds', time.perf_counter() - start)
+
+    def read_csv(self, url, **kwargs):
+        """Fetch a CSV through the cache and parse it, reusing the parsed frame on a 304"""
+        body_path, meta, modified = self.fetch(url)
+        options = json.dumps(kwargs, sort_keys=True, default=str)
+        frame_key = (url, options, meta['fetched_at'])
+        frame_path = self.frame_path(url, f"{options}{meta['fetched_at']}")
+
+        if not modified:
+            with self.lock:
+                frame = self.frames.get(frame_key)
+            if frame is not None:
+                return frame
+            try:
+                frame = pd.read_pickle(frame_path)
+            except OSError:
+                pass
+            except (EOFError, pickle.UnpicklingError, ValueError, AttributeError):
+                # Truncated, corrupt or written by another pandas version: parse the CSV again
+                os.remove(frame_path)
+            else:
+                with self.lock:
+                    self.frames[frame_key] = frame
+                return frame
+
+        frame = pd.read_csv(body_path, **kwargs)
+        if modified:
+            # Parsed frames of the previous version are stale now
+            for stale_path in glob.glob(self.path_for(url, '.*.pkl')):
+                os.remove(stale_path)
+        tmp_path = f"{frame_path}.{threading.get_ident()}.tmp"
+        frame.to_pickle(tmp_path)
+        os.replace(tmp_path, frame_path)
+        # Other threads read and insert frames of other URLs meanwhile: update in place under the lock
+        with self.lock:
+            for key in [key for key in self.frames if key[:2] == frame_key[:2]]:
+                del self.frames[key]
+            self.frames[frame_key] = frame
+        return frame
+
+    def clear(self):
+        """Remove every cached response"""
+        with self.lock:
+            self.frames.clear()
+        for name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, name))
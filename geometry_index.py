@@ -0,0 +1,101 @@
+"""
+Country name -> world geometry row index for the choropleth join
+Built once per world GeoDataFrame and reused for every render and metric
+"""
+
+import re
+import unicodedata
+import numpy as np
+from name_resolver import NameResolver, DEFAULT_RESOLUTION_PATH
+import country_codes
+
+# Columns of the world layer that can hold country names, in lookup order
+NAME_COLUMNS = ['name', 'NAME', 'NAME_EN', 'ADMIN', 'COUNTRY']
+
+# Columns that can hold ISO3 codes, in lookup order
+ISO_COLUMNS = ['id', 'ISO_A3', 'ADM0_A3', 'iso_a3']
+
+def normalize_name(name):
+    """Case-fold a country name and reduce it to ASCII words separated by single spaces"""
+    name = unicodedata.normalize('NFKD', str(name))
+    name = name.encode('ascii', 'ignore').decode('ascii').casefold().replace('&', ' and ')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
+
+class GeometryIndex:
+    """Resolves covid_data country names to row positions of a world GeoDataFrame
+
+    Countries with an ISO3 code are joined on integer codes. Other names are
+    looked up exactly (normalized) in a dict built from the name columns, then
+    through a fuzzy NameResolver whose decisions persist on disk.
+    """
+
+    def __init__(self, world, resolution_path=DEFAULT_RESOLUTION_PATH):
+        self.world = world
+        self.columns = [col for col in NAME_COLUMNS if col in world.columns]
+        self.rows = {}  # normalized name -> row positions
+        # Earlier columns win, like the former per-column lookup
+        for col in reversed(self.columns):
+            by_name = {}
+            for position, value in enumerate(world[col]):
+                if isinstance(value, str):
+                    by_name.setdefault(normalize_name(value), []).append(position)
+            self.rows.update({key: np.array(positions) for key, positions in by_name.items()})
+        self.resolver = NameResolver(self.rows, resolution_path)
+        self.resolved = {}  # covid name -> row positions, or None if unresolved
+        self.codes = self.row_codes()
+        self.code_table = country_codes.lookup_table(self.codes)
+        self.single_rows = np.arange(len(world))[:, None]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row_codes(self):
+        """ISO3 category code of each world row, from a code column or else the name"""
+        codes = np.full(len(self.world), -1, dtype=np.int16)
+        for col in ISO_COLUMNS + self.columns:
+            if col not in self.world.columns:
+                continue
+            encode = country_codes.encode_iso3 if col in ISO_COLUMNS else country_codes.encode_names
+            missing = codes < 0
+            codes[missing] = encode(self.world[col].to_numpy()[missing])
+        return codes
+
+    def lookup(self, name):
+        if name not in self.resolved:
+            key = normalize_name(name)
+            if key not in self.rows:
+                key = self.resolver.resolve(key)
+            self.resolved[name] = self.rows.get(key) if key is not None else None
+        return self.resolved[name]
+
+    def resolve(self, name):
+        """Return the geometry row positions of a country name, or None"""
+        rows = self.lookup(name)
+        self.resolver.save()
+        return rows
+
+    def resolve_many(self, names):
+        """Return a list with the row positions (or None) of each name"""
+        rows = [self.lookup(name) for name in names]
+        self.resolver.save()
+        return rows
+
+    def join(self, names, codes=None):
+        """Return the row positions (or None) of each country, joining on ISO3 codes first
+
+        codes are the int16 country codes of names (as in CountryTable.codes);
+        they are derived from the names if not given.
+        """
+        if codes is None:
+            codes = country_codes.encode_names(names)
+        positions = self.code_table[np.asarray(codes)]
+        rows = [self.single_rows[position] if position >= 0 else self.lookup(name)
+                for name, position in zip(names, positions)]
+        self.resolver.save()
+        return rows
+
+    def unresolved(self, names=None):
+        """Names without geometry, among `names` or everything resolved so far"""
+        if names is None:
+            return sorted(name for name, rows in self.resolved.items() if rows is None)
+        return [name for name, rows in zip(names, self.resolve_many(names)) if rows is None]
@@ -0,0 +1,102 @@
+"""
+Animated choropleth maps over time, streamed frame by frame into a GIF or MP4 encoder
+The static figure is drawn once; each frame redraws only its animated artists over a copy of it
+"""
+
+import os
+import time
+import subprocess
+import numpy as np
+from PIL import Image, GifImagePlugin
+from matplotlib import animation
+
+class GifStream:
+    """Appends RGBA frames to a GIF file as they arrive, holding only the current frame
+
+    Each frame is quantized to its own 256-color palette (a local color table).
+    """
+
+    def __init__(self, path, size, fps):
+        self.file = open(path, 'wb')
+        self.duration = round(1000 / fps)
+        self.frames = 0
+
+    def write(self, rgba):
+        frame = Image.fromarray(np.ascontiguousarray(rgba[..., :3]), 'RGB')
+        frame = frame.quantize(256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+        if not self.frames:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': 0, 'duration': self.duration})
+            self.file.write(b''.join(header))
+        self.file.write(b''.join(GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True)))
+        self.frames += 1
+
+    def close(self):
+        self.file.write(b';')  # GIF trailer
+        self.file.close()
+
+class FFMpegStream:
+    """Pipes raw RGBA frames into an ffmpeg process that encodes H.264 (MP4) or the format of the path"""
+
+    def __init__(self, path, size, fps):
+        width, height = size
+        command = [animation.FFMpegWriter.bin_path(), '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+                   # yuv420p needs even dimensions
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.PIPE)
+
+    def write(self, rgba):
+        self.process.stdin.write(np.ascontiguousarray(rgba).data)
+
+    def close(self):
+        _, errors = self.process.communicate()
+        if self.process.returncode:
+            raise RuntimeError(f"ffmpeg failed: {errors.decode(errors='replace').strip()}")
+
+def frame_stream(path, size, fps):
+    """Return the frame stream for the file type of path: GIF, or MP4 and others through ffmpeg"""
+    if os.path.splitext(path)[1].lower() == '.gif':
+        return GifStream(path, size, fps)
+    if not animation.writers.is_available('ffmpeg'):
+        raise RuntimeError(f"Writing {path} needs ffmpeg (or write a .gif)")
+    return FFMpegStream(path, size, fps)
+
+def country_row_pairs(geometry_rows):
+    """Return (country positions, world rows) for per-frame scattering, later countries winning shared rows"""
+    pairs = {}
+    for country, rows in enumerate(geometry_rows):
+        if rows is not None:
+            pairs.update((int(row), country) for row in rows)
+    rows = np.fromiter(pairs.keys(), dtype=np.intp, count=len(pairs))
+    countries = np.fromiter(pairs.values(), dtype=np.intp, count=len(pairs))
+    return countries, rows
+
+def write_animation(figure, path, frames, draw_frame, animated, fps=10, dpi=100):
+    """Stream one image per frame to a GIF or MP4 file and return (frames written, seconds, frames per second)
+
+    draw_frame(frame) updates the `animated` artists; everything else in the
+    Agg figure is drawn once and restored from a copy for every frame, and the
+    canvas buffer goes straight to the encoder, so no frame touches the disk.
+    """
+    figure.set_dpi(dpi)
+    canvas = figure.canvas
+    for artist in animated:
+        artist.set_animated(True)
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+    stream = frame_stream(path, canvas.get_width_height(physical=True), fps)
+    start = time.perf_counter()
+    count = 0
+    try:
+        for frame in frames:
+            draw_frame(frame)
+            canvas.restore_region(background)
+            for artist in animated:
+                figure.draw_artist(artist)
+            stream.write(np.asarray(canvas.buffer_rgba()))
+            count += 1
+    finally:
+        stream.close()
+    seconds = time.perf_counter() - start
+    return count, seconds, count / seconds if seconds else 0.0
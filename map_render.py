@@ -0,0 +1,176 @@
+"""
+Vectorized drawing helpers for the choropleth maps
+The basemap and every data color go into one collection drawn by a single plot call
+"""
+
+import numpy as np
+import shapely
+from matplotlib.path import Path
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_rgba
+
+BASEMAP_COLOR = 'lightgray'
+BORDER_COLOR = 'white'
+
+# Simplification levels, as output widths in pixels: each level is simplified to one pixel at that width
+SIMPLIFY_WIDTHS = (8000, 4000, 2000, 1000, 500)
+
+def geometry_paths(geometries):
+    """Return one compound matplotlib Path per (Multi)Polygon, holes included
+
+    Rings are normalized first so holes wind against their exterior and stay unfilled,
+    as in GeoDataFrame.plot. Missing or empty geometries give empty paths.
+    """
+    geometries = shapely.normalize(np.asarray(geometries, dtype=object))
+    parts, part_rows = shapely.get_parts(geometries, return_index=True)
+    rings, ring_parts = shapely.get_rings(parts, return_index=True)
+    vertices, ring_index = shapely.get_coordinates(rings, return_index=True)
+    counts = np.bincount(ring_index, minlength=len(rings))
+    starts = np.cumsum(counts) - counts
+    codes = np.full(len(vertices), Path.LINETO, dtype=Path.code_type)
+    codes[starts[counts > 0]] = Path.MOVETO
+    codes[(starts + counts - 1)[counts > 0]] = Path.CLOSEPOLY
+    # Vertices come out in row order, so each row is one contiguous slice
+    vertex_rows = part_rows[ring_parts][ring_index]
+    bounds = np.searchsorted(vertex_rows, np.arange(len(geometries) + 1))
+    return [Path(vertices[start:stop], codes[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+def repaired_geometries(geometries):
+    """Return a copy with invalid geometries (e.g. self-intersecting rings) made valid, keeping their structure"""
+    repaired = np.asarray(geometries, dtype=object).copy()
+    invalid = ~shapely.is_valid(repaired) & ~shapely.is_missing(repaired)
+    repaired[invalid] = shapely.make_valid(repaired[invalid], method='structure', keep_collapsed=False)
+    return repaired
+
+def simplified_geometries(geometries, tolerance):
+    """Simplify a polygon layer so neighbours keep a shared border, falling back to per-geometry simplification"""
+    # coverage_simplify needs shapely 2.1 built against GEOS 3.12
+    if hasattr(shapely, 'coverage_simplify'):
+        try:
+            return shapely.coverage_simplify(geometries, tolerance)
+        except (shapely.errors.GEOSException, shapely.errors.UnsupportedGEOSVersionError):
+            pass
+    # Not a usable coverage: still topology-preserving within each geometry
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+class WorldPaths:
+    """matplotlib paths of every row of a world GeoDataFrame, converted once and reused by every map
+
+    Besides the full-resolution paths, one simplified set is precomputed per
+    entry of `widths`, with a tolerance of one pixel when the layer spans that
+    many pixels. Collections pick the coarsest level that is still finer than
+    an output pixel when they are drawn.
+    """
+
+    def __init__(self, world, widths=SIMPLIFY_WIDTHS):
+        self.world = world
+        geometries = np.asarray(world.geometry.values, dtype=object)
+        self.paths = geometry_paths(geometries)
+        # Repair self-intersecting rings, which coverage simplification rejects
+        repaired = repaired_geometries(geometries)
+        self.repaired = repaired  # valid geometries, simplified again for vector output
+        self.bounds = world.total_bounds
+        xmin, ymin, xmax, ymax = self.bounds
+        span = max(xmax - xmin, ymax - ymin) or 1.0
+        self.levels = [(0.0, self.paths)]  # (tolerance in data units, paths), finest first
+        for width in widths:
+            tolerance = span / width
+            self.levels.append((tolerance, geometry_paths(simplified_geometries(repaired, tolerance))))
+        # Same aspect as GeoDataFrame.plot: corrected for latitude in geographic coordinates
+        if world.crs is not None and world.crs.is_geographic:
+            self.aspect = 1 / np.cos(np.mean([ymin, ymax]) * np.pi / 180)
+        else:
+            self.aspect = 'equal'
+
+    def __len__(self):
+        return len(self.paths)
+
+    def level_for(self, pixel_size):
+        """Index of the coarsest level whose tolerance is at most pixel_size (data units per pixel)"""
+        return max(level for level, (tolerance, _) in enumerate(self.levels) if tolerance <= pixel_size)
+
+    def vertex_counts(self):
+        return [sum(len(path.vertices) for path in paths) for _, paths in self.levels]
+
+    def collection(self, facecolors, linewidth=0.5, level=None, rows=None):
+        """Return a new collection of the cached paths (of `rows`, or all) with per-row face colors
+
+        level fixes the simplification level; by default it follows the output resolution.
+        """
+        return WorldCollection(self, level, rows, facecolors=facecolors, edgecolors=BORDER_COLOR,
+                               linewidths=linewidth)
+
+class WorldCollection(PathCollection):
+    """Collection of WorldPaths that draws the simplification level matching the output resolution"""
+
+    def __init__(self, world_paths, level=None, rows=None, **kwargs):
+        self.world_paths = world_paths
+        self.level = level
+        self.rows = rows
+        self.drawn_level = None  # level used by the last draw
+        super().__init__(self.level_paths(0), **kwargs)
+
+    def level_paths(self, level):
+        paths = self.world_paths.levels[level][1]
+        return paths if self.rows is None else [paths[row] for row in self.rows]
+
+    def pixel_size(self):
+        """Data units per output pixel, along the more magnified axis"""
+        origin, unit = self.axes.transData.transform([(0, 0), (1, 1)])
+        return 1 / np.abs(unit - origin).max()
+
+    def draw(self, renderer):
+        level = self.level
+        if level is None:
+            # Transforms follow the dpi of the current draw, including savefig(dpi=...)
+            level = self.world_paths.level_for(self.pixel_size()) if self.axes is not None else 0
+        self.set_paths(self.level_paths(level))
+        self.drawn_level = level
+        super().draw(renderer)
+
+def row_facecolors(count, geometry_rows, colors, base=BASEMAP_COLOR):
+    """Return a count x 4 RGBA array: base color, overwritten by each country's color on its rows
+
+    geometry_rows holds the row positions (or None) of each colored country.
+    """
+    facecolors = np.tile(to_rgba(base), (count, 1))
+    matched = [i for i, rows in enumerate(geometry_rows) if rows is not None]
+    if matched:
+        rows = np.concatenate([geometry_rows[i] for i in matched])
+        owners = np.repeat(matched, [len(geometry_rows[i]) for i in matched])
+        # Later countries win where rows are shared, as when they were drawn on top
+        facecolors[rows] = np.asarray(colors)[owners]
+    return facecolors
+
+def colored_rows(geometry_rows, colors):
+    """Return (rows, facecolors) of the world rows colored by some country
+
+    geometry_rows holds the row positions (or None) of each colored country;
+    later countries win where rows are shared, as in row_facecolors.
+    """
+    matched = [i for i, rows in enumerate(geometry_rows) if rows is not None]
+    if not matched:
+        return np.empty(0, dtype=np.int64), np.empty((0, 4))
+    rows = np.concatenate([geometry_rows[i] for i in matched])[::-1]
+    owners = np.repeat(matched, [len(geometry_rows[i]) for i in matched])[::-1]
+    rows, last = np.unique(rows, return_index=True)
+    return rows, np.asarray(colors)[owners[last]]
+
+def plot_world(ax, world_paths, facecolors, linewidth=0.5, level=None, rows=None):
+    """Draw world geometries (`rows`, or all) in one collection with per-geometry face colors
+
+    The axes limits always cover the whole world layer.
+    """
+    collection = world_paths.collection(facecolors, linewidth, level, rows)
+    ax.add_collection(collection, autolim=False)
+    xmin, ymin, xmax, ymax = world_paths.bounds
+    ax.update_datalim([(xmin, ymin), (xmax, ymax)])
+    ax.autoscale_view()
+    ax.set_aspect(world_paths.aspect)
+    return collection
+
+def scatter_unmatched(ax, lons, lats, colors, size=100):
+    """Draw countries without geometry as circles at their coordinates in one call"""
+    if len(lons) == 0:
+        return None
+    return ax.scatter(lons, lats, c=np.asarray(colors), s=size, alpha=0.7, edgecolors='black')
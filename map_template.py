@@ -0,0 +1,137 @@
+"""
+Persistent choropleth figures that are recolored instead of rebuilt
+Axes, geometry collection and colorbar are created once; a metric change updates colors, norm and ticks
+"""
+
+import io
+import threading
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import ticker
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from map_render import row_facecolors, plot_world
+from classification import classify
+
+COLOR_SCHEMES = ['Reds', 'Blues', 'Greens', 'Purples', 'Oranges', 'YlOrRd', 'YlGnBu', 'RdYlBu_r']
+
+def colormap(name):
+    """Return the colormap of a color scheme name, Reds if it is not one of COLOR_SCHEMES"""
+    return plt.get_cmap(name if name in COLOR_SCHEMES else 'Reds')
+
+def format_value(x, vmax):
+    """Tick label of a value on a scale up to vmax: millions, thousands or plain numbers
+
+    On scales above 1000 each value gets its own unit, so small class breaks
+    next to large ones stay readable.
+    """
+    if vmax > 1000 and abs(x) >= 1000000:
+        return f'{x/1e6:.1f}M'
+    if vmax > 1000 and abs(x) >= 1000:
+        return f'{x/1e3:.1f}K'
+    if vmax > 1000:
+        return f'{x:.0f}'
+    return f'{x:g}'
+
+def value_formatter(vmax):
+    """Colorbar tick formatter for values up to vmax: millions, thousands or plain numbers"""
+    if vmax > 1000:
+        return ticker.FuncFormatter(lambda x, p: format_value(x, vmax))
+    return ticker.ScalarFormatter()
+
+class MapPanel:
+    """One choropleth axes whose artists are created once and recolored per metric
+
+    Countries with geometry are colored in a single collection over every world
+    row (the basemap color where there is no data), so each border is stroked
+    once; countries without geometry are circles at their coordinates. Without
+    world paths only the circles are drawn.
+    """
+
+    def __init__(self, ax, world_paths=None, linewidth=0.5, marker_size=100, fontsize=12, format_ticks=True):
+        self.ax = ax
+        self.world_paths = world_paths
+        self.fontsize = fontsize
+        self.format_ticks = format_ticks
+        self.collection = None
+        if world_paths is not None:
+            self.collection = plot_world(ax, world_paths, row_facecolors(len(world_paths), [], []), linewidth)
+        self.markers = ax.scatter(np.empty(0), np.empty(0), s=marker_size, alpha=0.7, edgecolors='black')
+        self.mappable = ScalarMappable(norm=Normalize(0, 1), cmap='Reds')
+        self.colorbar = ax.get_figure().colorbar(self.mappable, ax=ax, shrink=0.8, aspect=30)
+        self.message = ax.text(0.5, 0.5, '', ha='center', va='center', transform=ax.transAxes, visible=False)
+        self.note = ax.text(0.02, 0.98, '', transform=ax.transAxes, fontsize=10, verticalalignment='top',
+                            bbox=dict(boxstyle='round', facecolor='white', alpha=0.8), visible=False)
+
+    def update(self, values, geometry_rows, lons, lats, cmap, label, classes=None):
+        """Recolor the panel for one metric and return whether there was anything to draw
+
+        values, geometry_rows (row positions or None), lons and lats (NaN if
+        unknown) are aligned per country. classes (see classification) default
+        to a continuous min-max scale.
+        """
+        values = np.asarray(values)
+        has_data = len(values) > 0
+        self.colorbar.ax.set_visible(has_data)
+        self.message.set_visible(False)
+        if not has_data:
+            values, geometry_rows, lons, lats = np.empty(0), [], np.empty(0), np.empty(0)
+            colors = np.empty((0, 4))
+        else:
+            classes = classes or classify(values, 'linear')
+            self.mappable.set_norm(classes.norm())
+            self.mappable.set_cmap(classes.colormap(cmap))
+            colors = classes.colors(values, cmap)
+        if self.collection is not None:
+            self.collection.set_facecolor(row_facecolors(len(self.world_paths), geometry_rows, colors))
+        unmatched = np.array([rows is None for rows in geometry_rows], dtype=bool)
+        located = unmatched & np.isfinite(lons) & np.isfinite(lats)
+        offsets = np.column_stack([np.asarray(lons)[located], np.asarray(lats)[located]])
+        self.markers.set_offsets(offsets)
+        self.markers.set_facecolor(colors[located])
+        if self.collection is None and len(offsets):
+            self.ax.ignore_existing_data_limits = True
+            self.ax.update_datalim(offsets)
+            self.ax.autoscale_view()
+        if has_data:
+            self.colorbar.set_label(label, fontsize=self.fontsize)
+            if self.format_ticks:
+                self.colorbar.ax.yaxis.set_major_formatter(value_formatter(values.max()))
+        return has_data
+
+    def show_message(self, text):
+        self.message.set_text(text)
+        self.message.set_visible(True)
+
+    def set_note(self, text):
+        """Show a text box in the top left corner, or hide it for None"""
+        self.note.set_text(text or '')
+        self.note.set_visible(text is not None)
+
+class MapTemplate:
+    """A persistent off-screen figure of MapPanels, recolored and re-encoded for each request
+
+    The figure is not registered with pyplot, so it is never shown or closed by
+    pyplot calls. Hold `lock` while updating and encoding from several threads.
+    """
+
+    def __init__(self, world_paths, figsize, layout=(1, 1), **panel_options):
+        self.world_paths = world_paths
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        axes = self.figure.subplots(*layout, squeeze=False).ravel()
+        self.panels = [MapPanel(ax, world_paths, **panel_options) for ax in axes]
+        self.lock = threading.Lock()
+        self.laid_out = False
+
+    def encode(self, format='png', dpi=150):
+        """Return the current figure as image bytes"""
+        if not self.laid_out:
+            # Lay out once, after the first update has set titles and labels
+            self.figure.tight_layout()
+            self.laid_out = True
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format=format, dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
@@ -0,0 +1,103 @@
+"""
+XYZ (slippy map) tiles of the choropleth layers in Web Mercator
+The world layer is projected and simplified once; a tile draws only the rows that intersect it
+"""
+
+import io
+import threading
+import numpy as np
+import shapely
+import geopandas as gpd
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from map_render import WorldPaths, BASEMAP_COLOR, repaired_geometries
+from classification import classify
+
+TILE_SIZE = 256
+MAX_ZOOM = 12
+
+# Web Mercator: latitude limit of the square world and half its side in meters
+MAX_LATITUDE = 85.0511287798066
+HALF_WORLD = 20037508.342789244
+
+# Tile PNGs kept per visualizer, all metrics and data versions together
+TILE_CACHE_BYTES = 64 * 1024 * 1024
+
+def mercator_world(world):
+    """Return the world layer clipped to the Web Mercator latitudes and projected to EPSG:3857"""
+    if world.crs is None:
+        world = world.set_crs(4326)
+    world = world.to_crs(4326)
+    # Clipping an invalid polygon can turn it inside out
+    geometries = repaired_geometries(world.geometry.values)
+    geometries = shapely.clip_by_rect(geometries, -180, -MAX_LATITUDE, 180, MAX_LATITUDE)
+    world = world.set_geometry(gpd.GeoSeries(geometries, index=world.index, crs=world.crs))
+    return world.to_crs(3857)
+
+def tile_bounds(z, x, y):
+    """(xmin, ymin, xmax, ymax) in meters of tile x, y (y counted from the top) at zoom z"""
+    size = 2 * HALF_WORLD / 2 ** z
+    xmin = -HALF_WORLD + x * size
+    ymax = HALF_WORLD - y * size
+    return (xmin, ymax - size, xmin + size, ymax)
+
+def valid_tile(z, x, y, max_zoom=MAX_ZOOM):
+    return 0 <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+def row_colors(row_values, cmap, classes=None):
+    """RGBA face color of every world row by its class (default: min-max scale), the basemap color where NaN"""
+    row_values = np.asarray(row_values, dtype=np.float64)
+    has_value = np.isfinite(row_values)
+    colors = np.tile(to_rgba(BASEMAP_COLOR), (len(row_values), 1))
+    classes = classes or classify(row_values, 'linear')
+    colors[has_value] = classes.colors(row_values[has_value], cmap)
+    return colors
+
+class TileRenderer:
+    """Renders PNG tiles of a world layer colored per row
+
+    The projected layer gets its own WorldPaths, so tiles draw the
+    simplification level of their zoom, and an STRtree that finds the rows
+    intersecting a tile. Tiles are drawn one at a time on a persistent
+    transparent figure; tiles without any country share one blank PNG.
+    """
+
+    def __init__(self, world, tile_size=TILE_SIZE, linewidth=0.5):
+        self.world = world
+        projected = mercator_world(world)
+        self.world_paths = WorldPaths(projected)
+        self.tree = shapely.STRtree(np.asarray(projected.geometry.values, dtype=object))
+        self.linewidth = linewidth
+        self.figure = Figure(figsize=(tile_size / 100, tile_size / 100), dpi=100)
+        FigureCanvasAgg(self.figure)
+        self.figure.patch.set_alpha(0)
+        self.ax = self.figure.add_axes([0, 0, 1, 1])
+        self.ax.set_axis_off()
+        self.lock = threading.Lock()
+        self.blank = self.encode()
+
+    def rows_in(self, bounds):
+        """Sorted positions of the rows whose bounding boxes intersect bounds (xmin, ymin, xmax, ymax)"""
+        return np.sort(self.tree.query(shapely.box(*bounds)))
+
+    def render(self, z, x, y, colors):
+        """Return tile z/x/y as PNG bytes, with the RGBA face color of every world row"""
+        bounds = tile_bounds(z, x, y)
+        rows = self.rows_in(bounds)
+        if not len(rows):
+            return self.blank
+        with self.lock:
+            collection = self.world_paths.collection(np.asarray(colors)[rows], self.linewidth, rows=rows)
+            self.ax.add_collection(collection, autolim=False)
+            self.ax.set_xlim(bounds[0], bounds[2])
+            self.ax.set_ylim(bounds[1], bounds[3])
+            try:
+                return self.encode()
+            finally:
+                collection.remove()
+
+    def encode(self):
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format='png', dpi=100, transparent=True)
+        return buffer.getvalue()
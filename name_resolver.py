@@ -0,0 +1,121 @@
+"""
+Fuzzy country name resolver with a persistent resolution table
+Matches names by token similarity and remembers every decision on disk
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+DEFAULT_RESOLUTION_PATH = '.name_resolutions.json'
+RESOLUTION_FORMAT = 2  # tables decided under earlier matching rules are ignored
+
+# Words that carry no identity on their own
+STOPWORDS = {'the', 'of', 'and'}
+
+def name_tokens(key):
+    """Return the set of significant words of a normalized name"""
+    return frozenset(word for word in key.split() if word not in STOPWORDS)
+
+def token_similarity(a, b):
+    """Jaccard similarity of two token sets, in [0, 1]"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def trigram_similarity(a, b):
+    """Dice coefficient of two trigram sets, used to break token ties"""
+    return 2 * len(a & b) / (len(a) + len(b))
+
+def candidates_fingerprint(candidates):
+    """Short hash identifying a set of candidate names"""
+    digest = hashlib.sha256('\n'.join(sorted(candidates)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+class NameResolver:
+    """Resolves normalized names to one of a fixed set of candidate names
+
+    A name matches the candidate with the highest token similarity if it reaches
+    min_score and every token of the shorter of the two names appears in the
+    other; with the default min_score a one-word name never matches a two-word
+    one ('Georgia' / 'South Georgia', 'Korea' / 'North Korea'). Ties are broken
+    by character-trigram overlap, then by the shorter and alphabetically first
+    candidate, so a name always resolves the same way.
+    Decisions (including "no match") are stored per candidate set in a JSON
+    table at `path`, shared across processes; entries can be edited by hand.
+    """
+
+    def __init__(self, candidates, path=DEFAULT_RESOLUTION_PATH, min_score=0.6):
+        self.candidates = sorted(set(candidates))
+        self.tokens = [name_tokens(candidate) for candidate in self.candidates]
+        self.path = path
+        self.min_score = min_score
+        self.fingerprint = candidates_fingerprint(self.candidates)
+        self.decisions = self.load_table().get(self.fingerprint, {})
+        self.pending = {}  # decisions not yet written to disk
+        self.lock = threading.Lock()
+
+    def load_table(self):
+        """Return {fingerprint: {name: match}} from disk, or {} if missing or unreadable"""
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as f:
+                table = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if table.get('format') != RESOLUTION_FORMAT:
+            return {}
+        return table.get('layers', {})
+
+    def best_match(self, key):
+        """Return the best candidate for a normalized name, or None"""
+        query = name_tokens(key)
+        if not query:
+            return None
+        best, best_rank = None, None
+        query_trigrams = None
+        for candidate, tokens in zip(self.candidates, self.tokens):
+            if not (query <= tokens or tokens <= query):
+                continue
+            score = token_similarity(query, tokens)
+            if score < self.min_score:
+                continue
+            if query_trigrams is None:
+                query_trigrams = trigrams(key)
+            rank = (-score, -trigram_similarity(query_trigrams, trigrams(candidate)), len(candidate), candidate)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = candidate, rank
+        return best
+
+    def resolve(self, key):
+        """Return the candidate a normalized name resolves to, or None"""
+        if key in self.decisions:
+            return self.decisions[key]
+        match = self.best_match(key)
+        with self.lock:
+            self.decisions[key] = match
+            self.pending[key] = match
+        return match
+
+    def save(self):
+        """Merge new decisions into the on-disk table"""
+        with self.lock:
+            if not self.pending or not self.path:
+                return
+            pending, self.pending = self.pending, {}
+            # Re-read so decisions made meanwhile by other processes are kept
+            layers = self.load_table()
+            layers.setdefault(self.fingerprint, {}).update(pending)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'format': RESOLUTION_FORMAT, 'layers': layers}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,231 @@
+"""
+Raster choropleth engine: each map is an array lookup on a cached country-label image
+The world layer is rasterized once per extent and size; colors go value -> color index -> RGBA
+"""
+
+import io
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from matplotlib import ticker, font_manager
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.collections import PathCollection
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from map_render import BASEMAP_COLOR, BORDER_COLOR
+from map_template import format_value
+from classification import classify, class_colors
+
+BACKGROUND_COLOR = 'white'
+TEXT_COLOR = 'black'
+
+# Overlay layout in pixels
+TITLE_HEIGHT = 40
+LEGEND_WIDTH = 110
+LEGEND_BAR_WIDTH = 16
+
+# Title and legend frames kept per RasterMap, one per (title, label, classes, colormap)
+FRAME_CACHE_SIZE = 64
+
+# Antialiased text is snapped to this many gray levels so frames fit in a palette with the map colors
+TEXT_GRAY_LEVELS = 17
+
+def rgba_bytes(color):
+    return (np.asarray(to_rgba(color)) * 255).round().astype(np.uint8)
+
+def rasterize_rows(paths, extent, size):
+    """Return an int32 image of the path drawn at each pixel (-1 where none), later paths on top
+
+    Each path is filled without antialiasing in a color that encodes its index.
+    """
+    width, height = size
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    fig.patch.set_facecolor('black')
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.set_xlim(extent[:2])
+    ax.set_ylim(extent[2:])
+    ids = np.arange(1, len(paths) + 1)
+    colors = np.column_stack([ids & 255, (ids >> 8) & 255, (ids >> 16) & 255, np.full(len(ids), 255)]) / 255
+    ax.add_collection(PathCollection(paths, facecolors=colors, edgecolors='none', antialiaseds=False),
+                      autolim=False)
+    canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba()).astype(np.int32)
+    return (rgba[..., 0] | rgba[..., 1] << 8 | rgba[..., 2] << 16) - 1
+
+def load_font(size):
+    return ImageFont.truetype(font_manager.findfont('DejaVu Sans'), size)
+
+class RasterMap:
+    """Choropleth maps of a world layer rendered by lookups on a label image
+
+    The label image holds, per pixel, an index into a per-map color table:
+    0 for background, 1 + row for a world row and the last entry for borders
+    between rows. It is built once (at the simplification level matching the
+    pixel size); a map then costs one small table build and one gather over the
+    pixels. The title and legend are drawn once per title, label, classes and
+    colormap into a cached frame the map area is written into. Maps whose
+    colors fit in 256 entries (any classed map) come out as palette images,
+    which take a quarter of the memory and encode about ten times faster than
+    RGB; continuous 'linear' maps have more colors and stay RGB.
+    """
+
+    def __init__(self, world_paths, width=1200):
+        self.world_paths = world_paths
+        xmin, ymin, xmax, ymax = world_paths.bounds
+        aspect = world_paths.aspect if world_paths.aspect != 'equal' else 1.0
+        height = max(1, round(width * (ymax - ymin) / (xmax - xmin) * aspect))
+        self.extent = (xmin, xmax, ymin, ymax)
+        pixel_size = (xmax - xmin) / width
+        paths = world_paths.levels[world_paths.level_for(pixel_size)][1]
+        labels = rasterize_rows(paths, self.extent, (width, height))
+        self.size = labels.shape[::-1]
+        # Pixels whose right or lower neighbour is another row become border pixels
+        border = np.zeros(labels.shape, dtype=bool)
+        edges = (labels[:, 1:] != labels[:, :-1]) & (np.minimum(labels[:, 1:], labels[:, :-1]) >= 0)
+        border[:, 1:] |= edges
+        edges = (labels[1:] != labels[:-1]) & (np.minimum(labels[1:], labels[:-1]) >= 0)
+        border[1:] |= edges
+        self.border_index = len(paths) + 1
+        self.index = np.where(border, self.border_index, labels + 1).astype(np.uint16)
+        self.fonts = {'title': load_font(16), 'label': load_font(11)}
+        self.background = rgba_bytes(BACKGROUND_COLOR)
+        self.basemap = rgba_bytes(BASEMAP_COLOR)
+        self.border = rgba_bytes(BORDER_COLOR)
+        self.frames = OrderedDict()  # frame key -> Frame, least recently used first
+        self.lock = threading.Lock()
+
+    def color_table(self, row_values, cmap, classes):
+        """Return the RGBA color of every label index for per-row values (NaN for no data)"""
+        has_value = np.isfinite(row_values)
+        table = np.empty((self.border_index + 1, 4), dtype=np.uint8)
+        table[0] = self.background
+        table[1:-1] = self.basemap
+        table[1:-1][has_value] = (classes.colors(row_values[has_value], cmap) * 255).round()
+        table[-1] = self.border
+        return table
+
+    def render_map(self, row_values, cmap, classes=None):
+        """Return the map area as an RGBA array for per-row values (NaN for no data)"""
+        row_values = np.asarray(row_values, dtype=np.float64)
+        return self.lookup(self.color_table(row_values, cmap, classes or classify(row_values, 'linear')))
+
+    def lookup(self, table):
+        """Return the RGBA image of a color table, gathering each pixel as one packed uint32"""
+        packed = table.view(np.uint32).ravel()[self.index]
+        return packed.view(np.uint8).reshape(self.index.shape + (4,))
+
+    def render(self, row_values, cmap, title='', label='', classes=None):
+        """Return the map with a title above and a colorbar legend on the right as a PIL image
+
+        The image is a palette ('P') image when the frame and the map colors fit
+        in 256 entries, RGB otherwise (all colors are opaque).
+        """
+        row_values = np.asarray(row_values, dtype=np.float64)
+        classes = classes or classify(row_values, 'linear')
+        frame = self.get_frame(cmap, title, label, classes)
+        table = self.color_table(row_values, cmap, classes)
+        width, height = self.size
+        if frame.palette is not None:
+            packed = table.view(np.uint32).ravel()
+            # Colors already in the frame (the legend holds every class color) keep their entry
+            found = np.minimum(np.searchsorted(frame.palette, packed), len(frame.palette) - 1)
+            new = frame.palette[found] != packed
+            extra, extra_index = np.unique(packed[new], return_inverse=True)
+            if len(frame.palette) + len(extra) <= 256:
+                lut = found.astype(np.uint8)
+                lut[new] = len(frame.palette) + extra_index
+                indexed = frame.indexed.copy()
+                indexed[TITLE_HEIGHT:, :width] = lut[self.index]
+                image = Image.fromarray(indexed, 'P')
+                palette = np.concatenate([frame.palette, extra]).view(np.uint8).reshape(-1, 4)
+                image.putpalette(palette[:, :3].tobytes())
+                return image
+        image = frame.rgba.copy()
+        image[TITLE_HEIGHT:, :width] = self.lookup(table)
+        return Image.fromarray(image, 'RGBA').convert('RGB')
+
+    def get_frame(self, cmap, title, label, classes):
+        """Return the cached Frame of a title, label, classes and colormap, drawing it on first use"""
+        key = (title, label, cmap.name, classes.scheme, classes.breaks.tobytes())
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+                return frame
+        frame = Frame(self.draw_frame(cmap, title, label, classes))
+        with self.lock:
+            self.frames[key] = frame
+            while len(self.frames) > FRAME_CACHE_SIZE:
+                self.frames.popitem(last=False)
+        return frame
+
+    def draw_frame(self, cmap, title, label, classes):
+        """Return the title and colorbar legend around an empty map area as an RGBA array"""
+        width, height = self.size
+        image = np.empty((height + TITLE_HEIGHT, width + LEGEND_WIDTH, 4), dtype=np.uint8)
+        image[:] = self.background
+        # Colorbar: a vertical strip, highest values on top; classes get equal heights like matplotlib's colorbar
+        top, bottom = TITLE_HEIGHT + height // 10, TITLE_HEIGHT + height - height // 10
+        left = width + 10
+        fractions = np.linspace(1, 0, bottom - top)
+        vmin, vmax = classes.breaks[0], classes.breaks[-1]
+        if classes.scheme == 'linear':
+            strip = cmap(fractions)
+            ticks = [tick for tick in ticker.MaxNLocator(6).tick_values(vmin, vmax) if vmin <= tick <= vmax]
+            positions = [(tick - vmin) / (vmax - vmin) for tick in ticks]
+        else:
+            strip = class_colors(cmap, classes.count)[np.minimum((fractions * classes.count).astype(int),
+                                                                 classes.count - 1)]
+            ticks, positions = classes.breaks, np.linspace(0, 1, classes.count + 1)
+        image[top:bottom, left:left + LEGEND_BAR_WIDTH] = (strip * 255).round().astype(np.uint8)[:, None]
+        overlay = Image.fromarray(image, 'RGBA')
+        draw = ImageDraw.Draw(overlay)
+        draw.rectangle([left, top, left + LEGEND_BAR_WIDTH, bottom], outline=TEXT_COLOR)
+        for tick, position in zip(ticks, positions):
+            y = bottom - position * (bottom - top)
+            draw.line([left + LEGEND_BAR_WIDTH, y, left + LEGEND_BAR_WIDTH + 4, y], fill=TEXT_COLOR)
+            draw.text((left + LEGEND_BAR_WIDTH + 7, y), format_value(tick, vmax), fill=TEXT_COLOR,
+                      font=self.fonts['label'], anchor='lm')
+        if label:
+            draw.text((left, top - 6), label, fill=TEXT_COLOR, font=self.fonts['label'], anchor='ld')
+        if title:
+            draw.text((width // 2, TITLE_HEIGHT // 2), title, fill=TEXT_COLOR, font=self.fonts['title'], anchor='mm')
+        image = np.array(overlay)
+        strip = image[top:bottom, left:left + LEGEND_BAR_WIDTH].copy()  # gray colormaps keep their strip
+        step = 255 / (TEXT_GRAY_LEVELS - 1)
+        for margin in [image[:TITLE_HEIGHT], image[TITLE_HEIGHT:, width:]]:
+            rgb = margin[..., :3]
+            gray = (rgb[..., 0] == rgb[..., 1]) & (rgb[..., 1] == rgb[..., 2]) & (rgb[..., 0] != 255)
+            rgb[gray] = (np.round(rgb[gray] / step) * step).round().astype(np.uint8)
+        image[top:bottom, left:left + LEGEND_BAR_WIDTH] = strip
+        return image
+
+    def encode(self, image, format='png'):
+        """Return a rendered image (or an RGBA array) as image bytes; PNG uses fast compression"""
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image, 'RGBA')
+        buffer = io.BytesIO()
+        if format.lower() == 'png':
+            image.save(buffer, format=format, compress_level=1)
+        else:
+            # Formats such as JPEG take neither palettes nor alpha
+            image.convert('RGB').save(buffer, format=format)
+        return buffer.getvalue()
+
+class Frame:
+    """Title and legend around an empty map area, as RGBA and, when it has at most 256 colors, as palette indices
+
+    palette holds the frame's colors as sorted packed uint32 RGBA values.
+    """
+
+    def __init__(self, rgba):
+        self.rgba = rgba
+        self.palette = None
+        self.indexed = None
+        colors, inverse = np.unique(np.ascontiguousarray(rgba).view(np.uint32).ravel(), return_inverse=True)
+        if len(colors) <= 256:
+            self.palette = colors
+            self.indexed = inverse.astype(np.uint8).reshape(rgba.shape[:2])
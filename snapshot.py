@@ -0,0 +1,147 @@
+"""
+Versioned binary snapshots of processed COVID-19 data
+Each column is a raw .npy file described by a JSON manifest, so loading memory-maps the data
+"""
+
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from timeseries_store import TimeSeriesStore
+from country_table import CountryTable, as_country_table
+from country_codes import encode_iso3, decode
+
+SNAPSHOT_FORMAT = 1
+DEFAULT_SNAPSHOT_DIR = 'snapshots'
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+
+def new_version():
+    """Return a sortable snapshot version id"""
+    return datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
+def save_snapshot(directory, covid_data, time_series=None, source=None):
+    """Write covid_data (a CountryTable or dict) and the time-series store as a new snapshot version"""
+    os.makedirs(directory, exist_ok=True)
+    version = new_version()
+    staging = tempfile.mkdtemp(prefix=f'.{version}.', dir=directory)
+
+    def write(name, array):
+        np.save(os.path.join(staging, name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+
+    table = as_country_table(covid_data)
+    countries = [str(country) for country in table.countries]
+    keys = list(table.columns)
+    for key, values in table.columns.items():
+        write(f'country.{key}', values)
+    # Keep track of which countries lack a key
+    partial = list(table.present)
+    for key, mask in table.present.items():
+        write(f'present.{key}', mask)
+    if table.codes is not None:
+        # Codes are stored as ISO3 strings so they survive changes of the code table
+        write('country.iso3', np.array([code or '' for code in decode(table.codes)], dtype='U3'))
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        'countries': countries,
+        'columns': keys,
+        'partial_columns': partial,
+        'iso3': table.codes is not None,
+        'time_series': None
+    }
+
+    if time_series is not None:
+        write('dates', time_series.dates.values.astype('datetime64[ns]'))
+        for name, array in time_series.arrays.items():
+            write(f'series.{name}', array)
+        checksums = {}
+        for metric, state in time_series.checksums.items():
+            write(f'checksums.{metric}', state['sums'])
+            checksums[metric] = {
+                'keys': state['keys'].tolist(),
+                'countries': [str(country) for country in state['countries']]
+            }
+        manifest['time_series'] = {
+            'countries': [str(country) for country in time_series.countries],
+            'metrics': list(time_series.arrays),
+            'checksums': checksums
+        }
+
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+    # Publish atomically: rename the finished directory, then move the LATEST pointer
+    os.replace(staging, os.path.join(directory, version))
+    pointer = os.path.join(directory, LATEST_FILE + '.tmp')
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(directory, LATEST_FILE))
+    return version
+
+def latest_version(directory):
+    """Return the newest published snapshot version, or None"""
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def list_versions(directory):
+    """Return published snapshot versions, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory)
+                  if not name.startswith('.') and os.path.isfile(os.path.join(directory, name, MANIFEST_FILE)))
+
+def load_snapshot(directory, version=None, mmap=True):
+    """Load a snapshot version (default LATEST)
+
+    Returns (covid_data, time_series, manifest) with covid_data as a CountryTable
+    whose columns, like the time-series arrays, are memory-mapped
+    read-only unless mmap is False; time_series is None if none was saved.
+    """
+    version = version or latest_version(directory)
+    if version is None:
+        raise FileNotFoundError(f"No snapshot found in {directory}")
+    path = os.path.join(directory, version)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')} in {path}")
+
+    def read(name):
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+
+    codes = encode_iso3(np.asarray(read('country.iso3'))) if manifest.get('iso3') else None
+    covid_data = CountryTable(manifest['countries'],
+                              {key: read(f'country.{key}') for key in manifest['columns']},
+                              {key: read(f'present.{key}') for key in manifest['partial_columns']},
+                              codes)
+
+    time_series = None
+    series = manifest['time_series']
+    if series is not None:
+        arrays = {name: read(f'series.{name}') for name in series['metrics']}
+        time_series = TimeSeriesStore(series['countries'], pd.DatetimeIndex(np.asarray(read('dates'))), arrays)
+        for metric, state in series['checksums'].items():
+            time_series.checksums[metric] = {
+                'keys': pd.Index(state['keys']),
+                'countries': np.array(state['countries'], dtype=object),
+                'sums': np.asarray(read(f'checksums.{metric}'))
+            }
+
+    return covid_data, time_series, manifest
+
+def prune_snapshots(directory, keep=5):
+    """Delete all but the newest `keep` snapshot versions"""
+    latest = latest_version(directory)
+    for version in list_versions(directory)[:-keep or None]:
+        if version != latest:
+            shutil.rmtree(os.path.join(directory, version), ignore_errors=True)
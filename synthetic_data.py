@@ -0,0 +1,148 @@
+"""
+Seeded synthetic COVID-19 data for demos, load and scale testing
+Generates monotone cumulative curves for any number of countries, provinces, counties and days
+"""
+
+import numpy as np
+import pandas as pd
+from country_table import CountryTable
+from country_codes import encode_names, iso3_for_names
+from timeseries_store import TimeSeriesStore, METRICS
+
+DEFAULT_SEED = 2020
+DEFAULT_START = '2020-01-22'
+
+SAMPLE_COUNTRIES = [
+    'United States of America', 'China', 'India', 'Brazil', 'Russia',
+    'United Kingdom', 'France', 'Germany', 'Italy', 'Spain',
+    'Canada', 'Australia', 'Japan', 'South Korea', 'Mexico',
+    'Argentina', 'Chile', 'Colombia', 'Peru', 'South Africa',
+    'Egypt', 'Nigeria', 'Kenya', 'Morocco', 'Algeria',
+    'Saudi Arabia', 'Turkey', 'Iran', 'Iraq', 'Israel',
+    'Thailand', 'Vietnam', 'Indonesia', 'Malaysia', 'Philippines',
+    'Poland', 'Ukraine', 'Romania', 'Czech Republic', 'Hungary',
+    'Netherlands', 'Belgium', 'Switzerland', 'Austria', 'Sweden',
+    'Norway', 'Denmark', 'Finland', 'Portugal', 'Greece'
+]
+
+def country_names(countries):
+    """Return country names: a list is used as is, a count takes the sample names first"""
+    if not isinstance(countries, (int, np.integer)):
+        return list(countries)
+    extra = [f'Country {i:04d}' for i in range(len(SAMPLE_COUNTRIES), countries)]
+    return (SAMPLE_COUNTRIES + extra)[:countries]
+
+def region_names(countries, provinces=0, counties=0):
+    """Return (country, province) per leaf region; province is None without provinces
+
+    Each country has `provinces` provinces and each province `counties` counties,
+    named like JHU province rows ('Province 003' or 'Province 003 / County 0012').
+    """
+    names = country_names(countries)
+    if not provinces:
+        return names, [None] * len(names)
+    labels = [f'Province {p:03d}' for p in range(provinces)]
+    if counties:
+        labels = [f'{label} / County {c:04d}' for label in labels for c in range(counties)]
+    return ([country for country in names for _ in labels],
+            [label for _ in names for label in labels])
+
+def cumulative_curves(rng, count, days, waves=3, scale=500_000):
+    """Return a count x days int64 array of monotone cumulative case curves
+
+    Each curve is a sum of logistic waves with random size, peak day and width;
+    multiplicative noise on the daily increments keeps them from being smooth.
+    """
+    t = np.arange(days, dtype=np.float64)
+    size = rng.lognormal(np.log(scale), 1.2, count)
+    cumulative = np.zeros((count, days))
+    for share in rng.dirichlet(np.ones(waves), count).T:
+        peak = rng.uniform(0, days, count)[:, None]
+        width = rng.uniform(5, 30, count)[:, None]
+        cumulative += (size * share)[:, None] / (1.0 + np.exp(-(t - peak) / width))
+    # Start every curve at zero on the first day
+    daily = np.diff(cumulative, axis=1, prepend=cumulative[:, :1])
+    daily *= rng.gamma(4.0, 0.25, (count, days))
+    return np.cumsum(np.floor(daily), axis=1).astype(np.int64)
+
+def lagged(values, lag):
+    """Shift cumulative curves right by lag days, filling with zeros"""
+    shifted = np.zeros_like(values)
+    if lag < values.shape[1]:
+        shifted[:, lag:] = values[:, :values.shape[1] - lag]
+    return shifted
+
+def synthetic_arrays(count, days, seed=DEFAULT_SEED, metrics=METRICS, scale=500_000):
+    """Return {metric: count x days int64 array} of consistent cumulative curves
+
+    Deaths and recoveries follow cases after a lag, at a per-region fatality and
+    recovery rate, so every metric is monotone and deaths + recovered <= cases.
+    """
+    rng = np.random.default_rng(seed)
+    cases = cumulative_curves(rng, count, days, scale=scale)
+    fatality = rng.uniform(0.005, 0.03, count)[:, None]
+    recovery = rng.uniform(0.7, 0.9, count)[:, None]
+    arrays = {
+        'cases': cases,
+        'deaths': np.floor(lagged(cases, 14) * fatality).astype(np.int64),
+        'recovered': np.floor(lagged(cases, 21) * recovery).astype(np.int64)
+    }
+    return {metric: arrays[metric] for metric in metrics}
+
+def synthetic_dates(days, start=DEFAULT_START):
+    return pd.date_range(start, periods=days, freq='D')
+
+def synthetic_time_series(countries=50, days=365, seed=DEFAULT_SEED, metrics=METRICS, start=DEFAULT_START):
+    """Return a TimeSeriesStore of synthetic per-country curves"""
+    names = country_names(countries)
+    return TimeSeriesStore(names, synthetic_dates(days, start),
+                           synthetic_arrays(len(names), days, seed, metrics))
+
+def synthetic_covid_data(countries=50, days=365, seed=DEFAULT_SEED):
+    """Return a CountryTable with the last day of synthetic curves plus population and location"""
+    names = country_names(countries)
+    arrays = synthetic_arrays(len(names), days, seed)
+    # A separate stream so attributes do not shift when the curve model changes
+    rng = np.random.default_rng([seed, 1])
+    cases, deaths, recovered = (arrays[metric][:, -1] for metric in METRICS)
+    population = np.exp(rng.uniform(np.log(1e6), np.log(1e9), len(names))).astype(np.int64)
+    return CountryTable.from_arrays(names, codes=encode_names(names), columns={
+        'cases': cases,
+        'deaths': deaths,
+        'recovered': recovered,
+        'active': cases - deaths - recovered,
+        'population': population,
+        'cases_per_million': cases / population * 1_000_000,
+        'deaths_per_million': deaths / population * 1_000_000,
+        'lat': rng.uniform(-60, 60, len(names)),
+        'lon': rng.uniform(-180, 180, len(names))
+    })
+
+def synthetic_jhu_frames(countries=50, provinces=0, counties=0, days=365, seed=DEFAULT_SEED, start=DEFAULT_START):
+    """Return (confirmed, deaths, recovered) frames in the JHU time-series CSV layout"""
+    country, province = region_names(countries, provinces, counties)
+    arrays = synthetic_arrays(len(country), days, seed)
+    rng = np.random.default_rng([seed, 2])
+    ids = pd.DataFrame({
+        'Province/State': province,
+        'Country/Region': country,
+        'Lat': rng.uniform(-60, 60, len(country)).round(4),
+        'Long': rng.uniform(-180, 180, len(country)).round(4)
+    })
+    labels = [f'{d.month}/{d.day}/{d:%y}' for d in synthetic_dates(days, start)]
+    return tuple(pd.concat([ids, pd.DataFrame(arrays[metric], columns=labels)], axis=1)
+                 for metric in METRICS)
+
+def synthetic_owid_history(countries=50, days=365, seed=DEFAULT_SEED, start=DEFAULT_START):
+    """Return a long-format frame with the columns of the OWID full history file"""
+    names = country_names(countries)
+    arrays = synthetic_arrays(len(names), days, seed, metrics=['cases', 'deaths'])
+    # Real ISO3 codes where known, as in the upstream file
+    codes = iso3_for_names(names).fillna(pd.Series([f'X{i:04d}' for i in range(len(names))])).tolist()
+    return pd.DataFrame({
+        'iso_code': np.repeat(codes, days),
+        'location': np.repeat(names, days),
+        'date': np.tile(synthetic_dates(days, start).strftime('%Y-%m-%d'), len(names)),
+        'total_cases': arrays['cases'].ravel().astype(np.float64),
+        'total_deaths': arrays['deaths'].ravel().astype(np.float64)
+    })
@@ -0,0 +1,361 @@
+"""
+Country x date time-series store for COVID-19 data
+Keeps the full daily history as dense NumPy arrays sharing one country and one date index
+"""
+
+import numpy as np
+import pandas as pd
+from country_table import CountryTable
+from country_codes import encode_names, encode_iso3, display_names
+
+METRICS = ['cases', 'deaths', 'recovered']
+
+# Column names of the JHU time-series CSVs that are not dates
+JHU_ID_COLUMNS = ['Province/State', 'Country/Region', 'Lat', 'Long']
+
+# Columns and compact dtypes read from the OWID full history file
+OWID_HISTORY_COLUMNS = ['iso_code', 'location', 'date', 'total_cases', 'total_deaths']
+OWID_HISTORY_DTYPES = {
+    'iso_code': 'category',
+    'location': 'category',
+    'total_cases': 'float64',  # float64 keeps counts above 2**24 exact and allows NaN
+    'total_deaths': 'float64'
+}
+
+def read_owid_chunks(path, chunksize=100_000):
+    """Stream the OWID history CSV in chunks, projecting and typing columns up front"""
+    return pd.read_csv(path, usecols=OWID_HISTORY_COLUMNS, dtype=OWID_HISTORY_DTYPES,
+                       parse_dates=['date'], chunksize=chunksize)
+
+def jhu_date_columns(df):
+    """Return the date column labels of a JHU time-series frame"""
+    return [col for col in df.columns if col not in JHU_ID_COLUMNS]
+
+def parse_jhu_dates(columns):
+    """Parse JHU date column labels such as '1/22/20' into a DatetimeIndex"""
+    return pd.DatetimeIndex(pd.to_datetime(columns, format='%m/%d/%y'))
+
+def jhu_row_keys(df):
+    """Identify JHU rows by 'Country/Region|Province/State|occurrence'"""
+    keys = df['Country/Region'].astype(str) + '|' + df['Province/State'].fillna('').astype(str)
+    return pd.Index(keys + '|' + keys.groupby(keys).cumcount().astype(str))
+
+def date_weights(dates):
+    """Odd pseudo-random uint64 weight per date, used by the positional row checksum"""
+    weights = dates.values.astype('datetime64[D]').astype(np.int64).astype(np.uint64) + np.uint64(1)
+    weights *= np.uint64(0x9E3779B97F4A7C15)
+    weights ^= weights >> np.uint64(29)
+    return weights | np.uint64(1)
+
+def row_checksums(values, weights):
+    """Weighted sum of each row modulo 2**64
+    
+    Any single revised value changes the checksum, and the checksum of a longer
+    history is the old checksum plus the contribution of the new columns.
+    """
+    return (values.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+
+def frame_values(df, columns):
+    """Return the given date columns of a JHU frame as an int64 array (missing -> 0)"""
+    if df.columns.isin(columns).sum() == len(columns):
+        values = df[columns].to_numpy()
+    else:
+        values = df.reindex(columns=columns).to_numpy()
+    if values.dtype.kind == 'f':
+        values = np.nan_to_num(values)
+    return values.astype(np.int64, copy=False)
+
+class TimeSeriesStore:
+    """Cumulative per-country daily metrics stored as countries x dates arrays"""
+
+    def __init__(self, countries, dates, arrays, row_of=None):
+        self.countries = pd.Index(countries)
+        self.dates = pd.DatetimeIndex(dates)
+        self.arrays = arrays
+        if row_of is None:
+            row_of = {country: i for i, country in enumerate(self.countries)}
+        self.row_of = row_of
+        self.buffers = {}  # over-allocated backing arrays that self.arrays are views of
+        self.checksums = {}  # per metric: source row keys, their countries and checksums
+
+    @classmethod
+    def from_jhu_frames(cls, confirmed_df, deaths_df, recovered_df=None, standardize=None):
+        """Build a store from the JHU confirmed, deaths and recovered frames"""
+        date_columns = jhu_date_columns(confirmed_df)
+
+        def aggregate(df):
+            countries = df['Country/Region']
+            if standardize is not None:
+                countries = standardize(countries)
+            return df[date_columns].groupby(countries.to_numpy(), sort=False).sum()
+
+        cases = aggregate(confirmed_df)
+        countries = cases.index
+        arrays = {'cases': cases.to_numpy(dtype=np.int64)}
+
+        for metric, df in [('deaths', deaths_df), ('recovered', recovered_df)]:
+            if df is None:
+                arrays[metric] = np.zeros_like(arrays['cases'])
+                continue
+            df = df.reindex(columns=JHU_ID_COLUMNS + date_columns, fill_value=0)
+            arrays[metric] = aggregate(df).reindex(countries, fill_value=0).to_numpy(dtype=np.int64)
+
+        store = cls(countries, parse_jhu_dates(date_columns), arrays)
+        weights = date_weights(store.dates)
+        for metric, df in zip(METRICS, [confirmed_df, deaths_df, recovered_df]):
+            if df is not None:
+                store.remember_checksums(metric, df, row_checksums(frame_values(df, date_columns), weights), standardize)
+        return store
+
+    @classmethod
+    def from_owid_chunks(cls, chunks, standardize=None, origin='2020-01-01', skip_aggregates=True):
+        """Build a store from OWID history chunks without holding the whole file
+        
+        Each chunk is scattered into growing countries x days buffers, so peak memory
+        is one chunk plus the store itself. Missing cumulative values are forward
+        filled per country. OWID has no recovered counts, which stay 0. Countries
+        are keyed by iso_code, as in fetch_owid_data(); rows without a known code
+        keep their (standardized) location name.
+        """
+        origin = np.datetime64(origin, 'D')
+        row_of = {}
+        buffers = {'cases': np.zeros((256, 1024), dtype=np.int64), 'deaths': np.zeros((256, 1024), dtype=np.int64)}
+        observed = {name: np.zeros(buffer.shape, dtype=bool) for name, buffer in buffers.items()}
+        n_days = 0
+
+        for chunk in chunks:
+            if skip_aggregates:
+                # Rows such as World, Europe or High income have OWID_* codes
+                chunk = chunk[~chunk['iso_code'].astype(str).str.startswith('OWID_').to_numpy()]
+            if chunk.empty:
+                continue
+
+            codes, locations = pd.factorize(chunk['location'].astype(object))
+            _, first = np.unique(codes, return_index=True)
+            fallback = pd.Series(locations)
+            if standardize is not None:
+                fallback = standardize(fallback)
+            iso_codes = chunk['iso_code'].astype(object).to_numpy()[first]
+            names = display_names(encode_iso3(iso_codes), fallback)
+            for name in names:
+                row_of.setdefault(name, len(row_of))
+            rows = np.array([row_of[name] for name in names], dtype=np.int64)[codes]
+
+            days = (chunk['date'].to_numpy().astype('datetime64[D]') - origin).astype(np.int64)
+            if days.min() < 0:
+                raise ValueError(f"OWID data starts before origin {origin}")
+
+            n_days = max(n_days, int(days.max()) + 1)
+            shape = buffers['cases'].shape
+            if len(row_of) > shape[0] or n_days > shape[1]:
+                shape = (shape[0] if len(row_of) <= shape[0] else max(len(row_of), 2 * shape[0]),
+                         shape[1] if n_days <= shape[1] else max(n_days, 2 * shape[1]))
+                for name in buffers:
+                    for group in (buffers, observed):
+                        grown = np.zeros(shape, dtype=group[name].dtype)
+                        grown[:group[name].shape[0], :group[name].shape[1]] = group[name]
+                        group[name] = grown
+
+            for name, column in [('cases', 'total_cases'), ('deaths', 'total_deaths')]:
+                values = chunk[column].to_numpy()
+                valid = ~np.isnan(values)
+                buffers[name][rows[valid], days[valid]] = values[valid].astype(np.int64)
+                observed[name][rows[valid], days[valid]] = True
+
+        n_rows = len(row_of)
+        arrays = {}
+        for name, buffer in buffers.items():
+            # Forward fill: take each cell from the last observed day at or before it
+            seen = observed[name][:n_rows, :n_days]
+            last = np.where(seen, np.arange(n_days), 0)
+            np.maximum.accumulate(last, axis=1, out=last)
+            arrays[name] = np.take_along_axis(buffer[:n_rows, :n_days], last, axis=1)
+        arrays['recovered'] = np.zeros((n_rows, n_days), dtype=np.int64)
+
+        dates = pd.DatetimeIndex(origin + np.arange(n_days))
+        return cls(list(row_of), dates, arrays)
+
+    def remember_checksums(self, metric, df, sums, standardize=None):
+        """Store the per-row checksums of a source frame for revision detection"""
+        countries = df['Country/Region']
+        if standardize is not None:
+            countries = standardize(countries)
+        self.checksums[metric] = {
+            'keys': jhu_row_keys(df),
+            'countries': countries.to_numpy(),
+            'sums': sums
+        }
+
+    def reserve(self, rows, columns):
+        """Grow the backing buffers so that rows x columns fit, keeping current values"""
+        for name, array in self.arrays.items():
+            buffer = self.buffers.get(name, array)
+            if buffer.shape[0] >= rows and buffer.shape[1] >= columns and buffer.base is None:
+                self.buffers[name] = buffer
+                continue
+            # Over-allocate columns by 25% so daily appends are amortized O(new data)
+            capacity = max(columns, buffer.shape[1] + buffer.shape[1] // 4 + 1)
+            grown = np.zeros((max(rows, buffer.shape[0]), capacity), dtype=array.dtype)
+            grown[:array.shape[0], :array.shape[1]] = array
+            self.buffers[name] = grown
+            self.arrays[name] = grown[:array.shape[0], :array.shape[1]]
+
+    def update_from_jhu_frames(self, confirmed_df, deaths_df, recovered_df=None, standardize=None, verify=True):
+        """Append the dates after latest_date from refreshed JHU frames
+        
+        Only the new date columns are aggregated. With verify, each source row's
+        checksum over the already stored dates is compared with the remembered one,
+        and only countries whose history was revised upstream are re-aggregated.
+        Raises ValueError if the frames do not extend the stored dates.
+        
+        Returns a dict with the number of new dates, the added and the revised countries.
+        """
+        date_columns = jhu_date_columns(confirmed_df)
+        dates = parse_jhu_dates(date_columns)
+        known = len(self.dates)
+        if known == 0 or len(dates) < known or not dates[:known].equals(self.dates):
+            raise ValueError("Refreshed data does not extend the stored dates")
+
+        new_columns = date_columns[known:]
+        old_weights, new_weights = date_weights(dates[:known]), date_weights(dates[known:])
+
+        def standardized(df):
+            countries = df['Country/Region']
+            return standardize(countries) if standardize is not None else countries
+
+        # Countries that appeared upstream get new rows
+        added = [country for country in pd.unique(standardized(confirmed_df)) if country not in self.row_of]
+        rows = len(self.countries) + len(added)
+        self.reserve(rows, len(dates))
+        if added:
+            self.countries = self.countries.append(pd.Index(added))
+            # Copy so stores returned by date_slice keep their own row lookup
+            self.row_of = dict(self.row_of)
+            for country in added:
+                self.row_of[country] = len(self.row_of)
+
+        revised = set()
+        for metric, df in zip(METRICS, [confirmed_df, deaths_df, recovered_df]):
+            buffer = self.buffers[metric]
+            if df is None:
+                buffer[:rows, known:len(dates)] = 0
+                continue
+
+            countries = standardized(df).to_numpy()
+            keys = jhu_row_keys(df)
+            previous = self.checksums.get(metric)
+            if previous is None:
+                previous = {'keys': pd.Index([]), 'countries': np.array([]), 'sums': np.array([], dtype=np.uint64)}
+            positions = previous['keys'].get_indexer(keys)
+            known_rows = positions >= 0
+
+            values = frame_values(df, date_columns)
+            old_values, new_values = values[:, :known], values[:, known:]
+            if verify:
+                old_sums = row_checksums(old_values, old_weights)
+                changed = ~known_rows
+                changed[known_rows] = old_sums[known_rows] != previous['sums'][positions[known_rows]]
+            else:
+                old_sums = np.zeros(len(df), dtype=np.uint64)
+                old_sums[known_rows] = previous['sums'][positions[known_rows]]
+                if (~known_rows).any():
+                    old_sums[~known_rows] = row_checksums(old_values[~known_rows], old_weights)
+                changed = ~known_rows
+
+            # Rows that disappeared upstream also revise their country
+            removed = ~previous['keys'].isin(keys)
+            affected = set(countries[changed]) | set(previous['countries'][removed])
+            affected = [country for country in affected if country in self.row_of]
+            revised.update(country for country in affected if country not in added)
+
+            # Append the new dates for every country
+            if new_columns:
+                block = pd.DataFrame(new_values).groupby(countries, sort=False).sum()
+                block = block.reindex(self.countries, fill_value=0).to_numpy(dtype=np.int64)
+                buffer[:rows, known:len(dates)] = block
+
+            # Re-aggregate the full history of revised countries only
+            if affected:
+                mask = np.isin(countries, affected)
+                history = pd.DataFrame(old_values[mask]).groupby(countries[mask]).sum()
+                history = history.reindex(affected, fill_value=0).to_numpy(dtype=np.int64)
+                buffer[[self.row_of[country] for country in affected], :known] = history
+
+            sums = old_sums + row_checksums(new_values, new_weights)
+            self.remember_checksums(metric, df, sums, standardize)
+
+        self.dates = dates
+        for name in self.arrays:
+            self.arrays[name] = self.buffers[name][:rows, :len(dates)]
+
+        return {
+            'new_dates': len(new_columns),
+            'added_countries': added,
+            'revised_countries': sorted(revised)
+        }
+
+    def __len__(self):
+        return len(self.countries)
+
+    @property
+    def shape(self):
+        """(countries, dates)"""
+        return len(self.countries), len(self.dates)
+
+    @property
+    def latest_date(self):
+        return self.dates[-1] if len(self.dates) else None
+
+    def metric(self, name):
+        """Return the countries x dates array for a metric, deriving 'active' on demand"""
+        if name == 'active':
+            return np.maximum(0, self.arrays['cases'] - self.arrays['deaths'] - self.arrays['recovered'])
+        return self.arrays[name]
+
+    def date_position(self, date):
+        """Return the column position of a date (the last date on or before it)"""
+        position = self.dates.searchsorted(pd.Timestamp(date), side='right') - 1
+        if position < 0:
+            raise KeyError(f"No data on or before {date}")
+        return position
+
+    def copy(self):
+        """Return a store with its own buffers (spare capacity included), safe to update while this one is read"""
+        buffers = {name: self.buffers.get(name, array).copy() for name, array in self.arrays.items()}
+        arrays = {name: buffers[name][:array.shape[0], :array.shape[1]] for name, array in self.arrays.items()}
+        store = TimeSeriesStore(self.countries, self.dates, arrays, self.row_of)
+        store.buffers = buffers
+        store.checksums = dict(self.checksums)  # entries are replaced on update, never changed in place
+        return store
+
+    def date_slice(self, start=None, end=None):
+        """Return a store restricted to [start, end] whose arrays are views, not copies"""
+        columns = self.dates.slice_indexer(start, end)
+        arrays = {name: array[:, columns] for name, array in self.arrays.items()}
+        return TimeSeriesStore(self.countries, self.dates[columns], arrays, self.row_of)
+
+    def series(self, country, metric='cases'):
+        """Return the daily series of one country (a view for stored metrics)"""
+        row = self.row_of[country]
+        if metric == 'active':
+            return np.maximum(0, self.arrays['cases'][row] - self.arrays['deaths'][row] - self.arrays['recovered'][row])
+        return self.arrays[metric][row]
+
+    def snapshot(self, date=None):
+        """Return per-country values on a date as a CountryTable"""
+        column = -1 if date is None else self.date_position(date)
+        cases = self.arrays['cases'][:, column]
+        deaths = self.arrays['deaths'][:, column]
+        recovered = self.arrays['recovered'][:, column]
+
+        # If recovered is 0, estimate it as 90% of cases
+        missing = (recovered == 0) & (cases > 0)
+        recovered = np.where(missing, (cases * 0.9).astype(np.int64), recovered)
+        active = np.maximum(0, cases - deaths - recovered)
+
+        return CountryTable.from_arrays(self.countries, codes=encode_names(self.countries), columns={
+            'cases': cases,
+            'deaths': deaths,
+            'recovered': recovered,
+            'active': active
+        })
@@ -0,0 +1,167 @@
+"""
+Vector choropleth output: simplified country geometry written once, colored per metric by a class map
+The geometry (SVG or GeoJSON) is keyed by country ID; a metric only adds a small ID -> class table
+"""
+
+import json
+from html import escape
+import numpy as np
+import shapely
+from matplotlib.path import Path
+from matplotlib.colors import to_hex
+from map_render import BASEMAP_COLOR, BORDER_COLOR, simplified_geometries
+from map_template import format_value
+from geometry_index import ISO_COLUMNS, NAME_COLUMNS
+from classification import classify, class_colors
+
+# SVG coordinates are integers in 1 / 10**SVG_PRECISION of an output pixel
+SVG_PRECISION = 1
+
+# Legend below the map in svg_document, in output pixels
+LEGEND_HEIGHT = 50
+
+def row_ids(world):
+    """Country ID of each world row: its ISO3 code, else its name, else 'row-<position>'; always unique"""
+    ids = np.array([f'row-{position}' for position in range(len(world))], dtype=object)
+    missing = np.ones(len(world), dtype=bool)
+    for col in [col for col in ISO_COLUMNS + NAME_COLUMNS if col in world.columns]:
+        values = world[col].to_numpy()
+        usable = missing & np.array([isinstance(value, str) and value not in ('', '-99') for value in values])
+        ids[usable] = values[usable]
+        missing &= ~usable
+    seen = set()
+    for position, value in enumerate(ids):
+        if value in seen:
+            ids[position] = f'{value}-{position}'
+        seen.add(ids[position])
+    return ids
+
+def svg_path_data(path, offset, scale):
+    """SVG path data of a matplotlib Path, its vertices mapped to integer pixels by (vertex - offset) * scale"""
+    if not len(path.vertices):
+        return ''
+    points = np.round((path.vertices - offset) * scale).astype(np.int64)
+    codes = path.codes
+    # Rounding merges nearby vertices; repeated line-to points add nothing
+    repeated = np.zeros(len(points), dtype=bool)
+    repeated[1:] = (codes[1:] == Path.LINETO) & (points[1:] == points[:-1]).all(axis=1)
+    parts = []
+    for (x, y), code in zip(points[~repeated], codes[~repeated]):
+        if code == Path.MOVETO:
+            parts.append(f'M{x} {y}')
+        elif code == Path.CLOSEPOLY:
+            parts.append('Z')
+        else:
+            parts.append(f'{x} {y}')
+    return ' '.join(parts).replace(' Z', 'Z')
+
+class VectorMap:
+    """SVG and GeoJSON geometry of a world layer, plus per-metric style maps keyed by country ID
+
+    The geometry uses the simplification level of a map `width` pixels wide and
+    is built once; the browser keeps it and only fetches a style map (class
+    colors, class breaks and the class of each country ID) when the metric
+    changes. svg_document() combines both into a standalone SVG for reports.
+    """
+
+    def __init__(self, world_paths, width=1000):
+        self.world_paths = world_paths
+        self.ids = row_ids(world_paths.world)
+        xmin, ymin, xmax, ymax = world_paths.bounds
+        aspect = world_paths.aspect if world_paths.aspect != 'equal' else 1.0
+        self.width = width
+        self.height = max(1, round(width * (ymax - ymin) / (xmax - xmin) * aspect))
+        self.level = world_paths.level_for((xmax - xmin) / width)
+        self.tolerance = world_paths.levels[self.level][0]
+        # Pixels grow down in SVG: flip latitudes
+        unit = 10 ** SVG_PRECISION
+        scale = np.array([width / (xmax - xmin), -self.height / (ymax - ymin)]) * unit
+        paths = world_paths.levels[self.level][1]
+        self.path_data = [svg_path_data(path, (xmin, ymax), scale) for path in paths]
+        self.view_box = (0, 0, width * unit, self.height * unit)
+        self.geometry_svg = self.svg_document()
+        self.geojson = None
+
+    def style_map(self, row_values, cmap, label='', classes=None):
+        """Return the style map of per-row values (NaN for no data) as a JSON-serializable dict
+
+        classes (see classification) default to equal intervals; a continuous
+        'linear' scale is split into equal intervals as well. Countries without
+        data are left out and keep the basemap color.
+        """
+        row_values = np.asarray(row_values, dtype=np.float64)
+        has_value = np.isfinite(row_values)
+        if classes is None or classes.scheme == 'linear':
+            classes = classify(row_values, 'equal_interval')
+        return {
+            'label': label,
+            'scheme': classes.scheme,
+            'colors': [to_hex(color) for color in class_colors(cmap, classes.count)],
+            'breaks': classes.breaks.tolist(),
+            'classes': dict(zip(self.ids[has_value].tolist(), classes.classify(row_values[has_value]).tolist()))
+        }
+
+    def svg_document(self, styles=None, title=None):
+        """Return the geometry as an SVG document, colored by a style map and with a legend if one is given"""
+        unit = 10 ** SVG_PRECISION
+        x, y, width, height = self.view_box
+        if styles is not None:
+            height += LEGEND_HEIGHT * unit
+        rules = [f'.countries path{{fill:{BASEMAP_COLOR};stroke:{BORDER_COLOR};stroke-width:{0.5 * unit};'
+                 f'stroke-linejoin:round}}']
+        classes = {}
+        if styles is not None:
+            rules += [f'.countries .c{k}{{fill:{color}}}' for k, color in enumerate(styles['colors'])]
+            classes = styles['classes']
+        lines = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{x} {y} {width} {height}" '
+                 f'width="{width // unit}" height="{height // unit}">',
+                 f'<style>{"".join(rules)}</style>']
+        if title:
+            lines.append(f'<title>{escape(title)}</title>')
+        lines.append('<g class="countries">')
+        for country_id, data in zip(self.ids, self.path_data):
+            if data:
+                cls = f' class="c{classes[country_id]}"' if country_id in classes else ''
+                lines.append(f'<path data-id="{escape(str(country_id))}"{cls} d="{data}"/>')
+        lines.append('</g>')
+        if styles is not None:
+            lines.append(self.svg_legend(styles))
+        lines.append('</svg>')
+        return '\n'.join(lines)
+
+    def svg_legend(self, styles):
+        """SVG group of the class colors with their lower breaks, centered under the map"""
+        unit = 10 ** SVG_PRECISION
+        count = len(styles['colors'])
+        box = min(60, self.width // (count + 2)) * unit
+        left = (self.view_box[2] - box * count) // 2
+        top = self.view_box[3] + 10 * unit
+        vmax = styles['breaks'][-1]
+        parts = [f'<g class="legend" font-family="sans-serif" font-size="{10 * unit}">']
+        if styles['label']:
+            parts.append(f'<text x="{left}" y="{top - 2 * unit}">{escape(styles["label"])}</text>')
+        for k, (color, lower) in enumerate(zip(styles['colors'], styles['breaks'])):
+            parts.append(f'<rect x="{left + k * box}" y="{top}" width="{box}" height="{12 * unit}" '
+                         f'style="fill:{color};stroke:none"/>')
+            parts.append(f'<text x="{left + k * box}" y="{top + 24 * unit}">{format_value(lower, vmax)}</text>')
+        parts.append('</g>')
+        return ''.join(parts)
+
+    def geojson_document(self):
+        """Return the simplified geometry as a GeoJSON FeatureCollection string, built on first use"""
+        if self.geojson is None:
+            geometries = simplified_geometries(self.world_paths.repaired, self.tolerance) if self.level \
+                else self.world_paths.repaired
+            # Coordinates to a tenth of the simplification tolerance
+            digits = max(0, int(np.ceil(-np.log10(self.tolerance / 10)))) if self.tolerance > 0 else 6
+            geometries = shapely.transform(geometries, lambda coords: np.round(coords, digits))
+            world = self.world_paths.world
+            names = world['name'].tolist() if 'name' in world.columns else [None] * len(world)
+            names = [name if isinstance(name, str) else None for name in names]
+            features = [
+                f'{{"type":"Feature","id":{json.dumps(country_id)},'
+                f'"properties":{json.dumps({"name": name})},"geometry":{geometry or "null"}}}'
+                for country_id, name, geometry in zip(self.ids, names, shapely.to_geojson(geometries))
+            ]
+            self.geojson = '{"type":"FeatureCollection","features":[' + ','.join(features) + ']}'
+        return self.geojson